@@ -4,14 +4,57 @@ import torch.nn as nn
 from PIL import Image
 import numpy as np
 from torchvision import transforms
+import io
 import json
 import os
+import threading
 import time
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 from pathlib import Path
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from utils.model_loader import load_model, get_model_info
-from utils.image_processor import preprocess_image, get_top_predictions
+from utils.backends import AUTO, BACKENDS, InferenceBackend
+from utils.config import (
+    apply_image_limits,
+    apply_profile,
+    describe_profile,
+    get_config,
+    select_profile
+)
+from utils.degradation import DegradationController, default_modes
+from utils.image_processor import get_top_predictions
+from utils.profiling import (
+    FORWARD_LABEL,
+    POSTPROCESS_LABEL,
+    PREPROCESS_LABEL,
+    ProfileRun,
+    record_function
+)
+from utils.scheduler import InferenceScheduler, SchedulerBusy, Superseded, session_generations
+from utils.tiling import classify_tiled, heatmap_overlay
+from utils.frames import FrameClassifier, iter_frames
+from utils.shadow import ShadowComparison, compare_images
+from utils.archive_names import is_archive
+from utils.archives import ArchiveDecoder, classify_archive
+from utils.upload_buffer import UploadBuffer, as_rgb, open_upload, preview_image
+
+
+# config.yaml and the performance profile ($IMAGENET_PROFILE), validated at startup
+CONFIG = get_config()
+PROFILE = select_profile(CONFIG)
+# Downloaded by the Docker build; used when config.yaml sets no default_model_path
+DEFAULT_CHECKPOINT = "models/acc1=76.2100.ckpt"
+
+# Largest top-k offered in the sidebar (cached results are ranked this deep)
+MAX_TOP_K = 10
 
+# Compact results view (used for large uploads)
+COMPACT_VIEW_MIN_IMAGES = 9
+PAGE_SIZE = 12
+GRID_COLUMNS = 4
+PREVIEW_SIZE = 256
+# Longest side of images shown next to their predictions
+DISPLAY_SIZE = 800
 
 # Page configuration
 st.set_page_config(
@@ -165,9 +208,93 @@ st.markdown("""
 
 
 @st.cache_resource
-def initialize_model(model_path=None):
-    """Load and cache the model"""
-    return load_model(model_path)
+def initialize_runtime(profile):
+    """Apply the performance profile's thread count and decode limits once per process"""
+    apply_profile(profile)
+    return profile
+
+
+@st.cache_resource
+def initialize_model(model_path=None, backend="eager", precision="fp32"):
+    """Load and cache the model behind an inference backend ("auto" benchmarks them once)"""
+    return load_model(model_path, backend=backend, precision=precision)
+
+
+@st.cache_resource
+def initialize_scheduler(model_path=None, backend="eager", precision="fp32", max_batch_size=8,
+                         slo_p95_ms=None, slo_queue_depth=None):
+    """
+    Create the scheduler shared by all sessions in front of the cached model.
+
+    With a p95 latency SLO it degrades under load (see utils/degradation.py).
+    """
+    controller = None
+    if slo_p95_ms:
+        controller = DegradationController(
+            default_modes(max_batch_size, precision, resolution=CONFIG.img_size),
+            slo_p95_ms=slo_p95_ms,
+            slo_queue_depth=slo_queue_depth
+        )
+    return InferenceScheduler(
+        initialize_model(model_path, backend=backend, precision=precision),
+        max_concurrent=1,
+        max_batch_size=max_batch_size,
+        controller=controller
+    )
+
+
+@st.cache_resource
+def initialize_upload_buffer(crop_size=None, slots=8):
+    """Preallocated model-input slots that uploads are decoded into (one buffer per resolution)"""
+    return UploadBuffer(slots=slots, crop_size=crop_size)
+
+
+@st.cache_resource
+def initialize_archive_decoder(workers=4):
+    """Worker processes that decode uploaded archive members (shared by all sessions)"""
+    # spawn: forking the threaded Streamlit server is not safe. Spawned workers
+    # start with PIL's default pixel limit, so the profile's is applied to them
+    return ArchiveDecoder(workers=min(os.cpu_count() or 1, workers), start_method="spawn",
+                          initializer=apply_image_limits, initargs=(PROFILE.max_image_pixels,))
+
+
+def display_degradation_status(degradation):
+    """Show the scheduler's degradation mode, if it has a latency SLO."""
+    if degradation is None:
+        return
+    p95 = f"{degradation['p95_ms']:.0f}ms" if degradation["p95_ms"] is not None else "-"
+    text = (f"🚦 Inference mode: **{degradation['mode']}** "
+            f"(level {degradation['level']}/{degradation['levels'] - 1}) • "
+            f"p95 latency {p95} vs SLO {degradation['slo_p95_ms']:g}ms")
+    if degradation["level"]:
+        st.warning(text + " — degraded under load, predictions may be slightly less accurate")
+    else:
+        st.caption(text)
+
+
+def current_session_id():
+    """Identify the Streamlit session running this script (for fair queueing)."""
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else threading.get_ident()
+
+
+# Generation of the script run on this thread. With fast reruns Streamlit
+# starts each rerun on a new thread while the superseded run is still going
+_current_run = threading.local()
+
+
+def begin_run():
+    """
+    Start a new generation for this session.
+    
+    Inference still queued by older runs of the session is dropped and those
+    runs stop at their next batch (see utils/scheduler.py).
+    """
+    _current_run.generation = session_generations.begin(current_session_id())
+
+
+def current_generation():
+    return getattr(_current_run, "generation", None)
 
 
 def get_sample_images():
@@ -186,27 +313,450 @@ def get_sample_images():
     return sorted(sample_images)
 
 
-def process_single_image(image: Image.Image, model, top_k: int, threshold: float) -> Tuple[List, float]:
-    """Process a single image and return predictions with inference time."""
+def process_single_image(image: Image.Image, model, top_k: int, threshold: float,
+                         scheduler: InferenceScheduler = None, session_id=None,
+                         timings: dict = None, generation: int = None) -> Tuple[List, float]:
+    """
+    Process a single image and return predictions with inference time.
+    
+    When a scheduler is given the forward pass is queued behind it instead of
+    calling the model directly; queue wait, batch size and the degradation
+    mode (whose resolution is used for the center crop) are written to
+    `timings` if provided. The input is written into a reserved slot of the
+    shared upload buffer, which is released once the forward pass is done.
+    """
     start_time = time.time()
+    mode = scheduler.current_mode() if scheduler is not None else None
+    buffer = initialize_upload_buffer(mode.resolution if mode else CONFIG.img_size,
+                                      slots=max(8, PROFILE.batch_size))
+    
+    with buffer.reserve() as fill:
+        # Preprocess image
+        with record_function(PREPROCESS_LABEL):
+            input_tensor = fill(image)
+        output = forward_single_image(input_tensor, model, scheduler, session_id, timings,
+                                      generation)
     
-    # Preprocess image
-    input_tensor = preprocess_image(image)
+    with torch.no_grad():
+        with record_function(POSTPROCESS_LABEL):
+            probabilities = torch.nn.functional.softmax(output[0], dim=0)
+            
+            # Get top predictions
+            predictions = get_top_predictions(
+                probabilities,
+                top_k=top_k,
+                threshold=threshold
+            )
     
-    # Make prediction
+    inference_time = time.time() - start_time
+    return predictions, inference_time
+
+
+def forward_single_image(input_tensor, model, scheduler, session_id, timings, generation):
+    """Forward pass of process_single_image, through the scheduler if there is one."""
     with torch.no_grad():
-        output = model(input_tensor)
-        probabilities = torch.nn.functional.softmax(output[0], dim=0)
+        with record_function(FORWARD_LABEL):
+            if scheduler is not None:
+                result = scheduler.run(input_tensor, session_id=session_id, generation=generation)
+                output = result.output
+                if timings is not None:
+                    timings["queue_wait_ms"] = result.queue_wait_s * 1000
+                    timings["batch_size"] = result.batch_size
+                    if result.mode is not None:
+                        timings["mode"] = result.mode
+                        timings["resolution"] = input_tensor.shape[-1]
+            else:
+                output = model(input_tensor)
+    return output
+
+
+def run_inference(image: Image.Image, model, top_k: int, threshold: float,
+                  profile: bool = False, metadata: dict = None,
+                  scheduler: InferenceScheduler = None, timings: dict = None):
+    """
+    Run process_single_image, optionally under the PyTorch profiler.
+    
+    Profiled runs bypass the scheduler so the forward pass is recorded on
+    this thread.
+    
+    Returns:
+        tuple: (predictions, inference_time, ProfileRun or None)
+    """
+    if not profile:
+        predictions, inference_time = process_single_image(
+            image, model, top_k, threshold,
+            scheduler=scheduler, session_id=current_session_id(), timings=timings,
+            generation=current_generation()
+        )
+        return predictions, inference_time, None
     
-    # Get top predictions
-    predictions = get_top_predictions(
-        probabilities,
+    with ProfileRun(name="app", metadata=metadata) as run:
+        predictions, inference_time = process_single_image(image, model, top_k, threshold)
+    return predictions, inference_time, run
+
+
+def run_tiled_inference(image: Image.Image, scheduler: InferenceScheduler, top_k: int,
+                        threshold: float, scales: List[float]):
+    """
+    Classify overlapping 224px tiles of a large image through the scheduler.
+    
+    Returns:
+        tuple: (predictions, inference_time, tiled result dict)
+    """
+    session_id, generation = current_session_id(), current_generation()
+    tiled = classify_tiled(
+        lambda batch: scheduler.run(batch, session_id=session_id, generation=generation).output,
+        image,
         top_k=top_k,
-        threshold=threshold
+        threshold=threshold,
+        scales=tuple(scales),
+        batch_size=scheduler.max_batch_size
     )
+    return tiled["predictions"], tiled["inference_time"], tiled
+
+
+def run_frame_inference(source: Image.Image, scheduler: InferenceScheduler, top_k: int,
+                        threshold: float, stride: int = 1, max_frames: int = 300):
+    """
+    Classify every frame of an animated or multi-page upload through the scheduler.
     
-    inference_time = time.time() - start_time
-    return predictions, inference_time
+    Returns:
+        tuple: (predictions averaged over frames, inference_time, per-frame rows)
+    """
+    session_id, generation = current_session_id(), current_generation()
+    start_time = time.time()
+    classifier = FrameClassifier(
+        lambda batch: scheduler.run(batch, session_id=session_id, generation=generation).output,
+        top_k=top_k,
+        threshold=threshold,
+        batch_size=scheduler.max_batch_size
+    )
+    rows = []
+    for result in classifier.classify(iter_frames(source, stride=stride, max_frames=max_frames)):
+        top = result["predictions"][0] if result["predictions"] else ("-", 0.0)
+        smoothed = result["smoothed_predictions"][0] if result["smoothed_predictions"] else ("-", 0.0)
+        rows.append({
+            "frame": result["frame"],
+            "class": top[0],
+            "confidence": round(top[1], 4),
+            "smoothed class": smoothed[0],
+            "smoothed confidence": round(smoothed[1], 4)
+        })
+    return classifier.summary(), time.time() - start_time, rows
+
+
+def display_tiled_heatmap(image: Image.Image, tiled: dict, key: str):
+    """Show the heatmap of a selected top class over a downscaled preview."""
+    labels = [class_name for class_name, _ in tiled["predictions"]]
+    choice = st.selectbox("🔥 Heatmap for class", labels, key=key)
+    class_idx = tiled["class_indices"][labels.index(choice)]
+    
+    preview = preview_image(image, DISPLAY_SIZE)
+    st.image(heatmap_overlay(preview, tiled["heatmaps"][class_idx]), use_column_width=True)
+    st.caption(f"🧩 {tiled['num_tiles']} tiles • confidence is the best tile's probability")
+
+
+@st.cache_data(max_entries=PROFILE.preview_cache_entries, show_spinner=False)
+def make_preview(file_id: str, _uploaded_file, max_size: int = PREVIEW_SIZE,
+                 _image: Image.Image = None) -> bytes:
+    """
+    Downscaled JPEG preview of an upload, cached by upload id.
+    
+    Sending this instead of the full-resolution image keeps the page small.
+    analyze_upload passes the image it already decoded as `_image`, so the
+    upload is only decoded again if the preview was evicted from the cache.
+    """
+    if _image is None:
+        with open_upload(_uploaded_file) as source:
+            preview = preview_image(as_rgb(source), max_size)
+    else:
+        preview = preview_image(_image, max_size)
+    buffer = io.BytesIO()
+    preview.save(buffer, format="JPEG", quality=80)
+    return buffer.getvalue()
+
+
+def rank_predictions(ranked: List, top_k: int, threshold: float) -> List:
+    """Apply the top-k / threshold settings to predictions ranked at MAX_TOP_K."""
+    return [(class_name, confidence) for class_name, confidence in ranked[:top_k]
+            if confidence >= threshold]
+
+
+def analyze_upload(uploaded_file, model, scheduler: InferenceScheduler, top_k: int,
+                   threshold: float, tiled_mode: bool, tile_scales: List[float],
+                   source: Image.Image = None, image: Image.Image = None) -> dict:
+    """
+    Classify one upload.
+    
+    Results are kept in the session so paging through the grid, opening
+    details or a rerun that supersedes this one does not run the model
+    again. Center-crop and multi-frame results are ranked at MAX_TOP_K with
+    no threshold and cut down on the way out, so moving the top-k or
+    threshold sliders does not re-run them either.
+    
+    `source` and `image` are the opened upload and its decoded RGB image,
+    if the caller already has them. Otherwise the upload is decoded here
+    once, and its grid preview is made from the same decoded image.
+    
+    Raises:
+        Superseded: If a newer run of the session started (nothing is cached)
+    """
+    cache = st.session_state.setdefault("upload_results", {})
+    decoded_here = source is None
+    if decoded_here:
+        source = open_upload(uploaded_file)
+    multiframe = getattr(source, "n_frames", 1) > 1
+    if tiled_mode and not multiframe:
+        key = (uploaded_file.file_id, id(model), "tiled", tuple(tile_scales), top_k, threshold)
+    else:
+        key = (uploaded_file.file_id, id(model), "frames" if multiframe else "center")
+
+    result = cache.get(key)
+    if result is None:
+        result = {"image": uploaded_file.name, "file_id": uploaded_file.file_id,
+                  "bytes": uploaded_file.size, "ranked": [], "inference_time": 0.0,
+                  "timings": {}, "tiled": None, "frame_rows": None, "error": None}
+        try:
+            if image is None and not multiframe:
+                image = as_rgb(source)
+                if decoded_here:
+                    make_preview(uploaded_file.file_id, uploaded_file, _image=image)
+            if multiframe:
+                result["ranked"], result["inference_time"], result["frame_rows"] = run_frame_inference(
+                    source, scheduler, MAX_TOP_K, 0.0
+                )
+            elif tiled_mode:
+                result["ranked"], result["inference_time"], result["tiled"] = run_tiled_inference(
+                    image, scheduler, top_k, threshold, tile_scales
+                )
+            else:
+                result["ranked"], result["inference_time"], _ = run_inference(
+                    image, model, MAX_TOP_K, 0.0, scheduler=scheduler,
+                    timings=result["timings"]
+                )
+        except Superseded:
+            raise
+        except SchedulerBusy as e:
+            # Not cached: the next rerun tries again
+            result["error"] = f"Server busy: {str(e)}"
+            return {**result, "predictions": []}
+        except Exception as e:
+            result["error"] = str(e)
+        cache[key] = result
+
+    return {**result, "predictions": rank_predictions(result["ranked"], top_k, threshold)}
+
+
+def run_shadow_comparison(uploaded_files, scheduler: InferenceScheduler,
+                          shadow_scheduler: InferenceScheduler, shadow_path: str) -> Optional[dict]:
+    """
+    Compare the shadow checkpoint with the current model on the uploads.
+    
+    Each upload is decoded and preprocessed once for both models, and both
+    forward passes go through their schedulers; the outcome is kept in the
+    session until the uploads or checkpoint change. A run superseded by a
+    newer one stops at the next batch. Checkpoints whose class counts differ
+    are reported as an error and return None.
+    """
+    key = (tuple(f.file_id for f in uploaded_files), shadow_path, id(scheduler.model),
+           id(shadow_scheduler.model))
+    cached = st.session_state.get("shadow_comparison")
+    if cached is not None and cached["key"] == key:
+        return cached
+
+    session_id, generation = current_session_id(), current_generation()
+
+    def images():
+        for f in uploaded_files:
+            session_generations.check(session_id, generation)
+            yield f.name, io.BytesIO(f.getvalue())
+
+    def run(target):
+        return lambda batch: target.run(batch, session_id=session_id, generation=generation).output
+
+    comparison = ShadowComparison()
+    try:
+        rows = list(compare_images(run(scheduler), run(shadow_scheduler), images(), comparison,
+                                   batch_size=scheduler.max_batch_size,
+                                   device=next(scheduler.model.parameters()).device))
+    except ValueError as e:
+        # Checkpoints with different class counts cannot be compared
+        st.error(f"❌ Shadow comparison failed: {str(e)}")
+        return None
+    cached = {"key": key, "rows": rows, "summary": comparison.summary()}
+    st.session_state["shadow_comparison"] = cached
+    return cached
+
+
+def display_shadow_comparison(comparison: dict):
+    """Show agreement statistics, the flipped images and per-class disagreement."""
+    summary = comparison["summary"]
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Top-1 agreement", f"{summary['agreement_rate']:.1%}")
+    col2.metric("Top-1 flips", f"{summary['flips']} of {summary['images']}")
+    col3.metric("Current top-1 probability", f"{summary['mean_confidence_shift']:+.1%}",
+                help="Mean change in the probability of the current model's top-1 class")
+    
+    st.dataframe([
+        {
+            "Image": row["image"],
+            "Current": row["baseline"]["class"],
+            "Current conf.": f"{row['baseline']['confidence']:.1%}",
+            "Shadow": row["candidate"]["class"],
+            "Shadow conf.": f"{row['candidate']['confidence']:.1%}",
+            "Agree": "✅" if row["agree"] else "🔀"
+        }
+        for row in comparison["rows"] if "error" not in row
+    ], use_container_width=True, hide_index=True)
+    if summary["disagreement_by_class"]:
+        with st.expander("🔀 Disagreement by class"):
+            st.dataframe([
+                {"Class (current top-1)": entry["class"], "Images": entry["images"],
+                 "Flips": entry["disagreements"], "Flip rate": f"{entry['disagreement_rate']:.1%}"}
+                for entry in summary["disagreement_by_class"]
+            ], use_container_width=True, hide_index=True)
+
+
+def analyze_archive(uploaded_file, scheduler: InferenceScheduler, decoder: ArchiveDecoder,
+                    top_k: int, threshold: float, status=None) -> List[dict]:
+    """
+    Classify every image in an uploaded zip, member by member.
+    
+    Members are read from the upload in place (nothing is extracted), decoded
+    by the shared worker processes and batched through the scheduler. Results
+    use the analyze_upload layout and are kept in the session, ranked at
+    MAX_TOP_K without a threshold like center-crop uploads.
+    
+    Raises:
+        Superseded: If a newer run of the session started (nothing is cached)
+    """
+    cache = st.session_state.setdefault("archive_results", {})
+    key = (uploaded_file.file_id, id(scheduler.model))
+    if key in cache:
+        return [{**result, "predictions": rank_predictions(result["ranked"], top_k, threshold)}
+                for result in cache[key]]
+
+    session_id, generation = current_session_id(), current_generation()
+    uploaded_file.seek(0)
+    results = []
+    for entry in classify_archive(
+        lambda batch: scheduler.run(batch, session_id=session_id, generation=generation).output,
+        uploaded_file, decoder, top_k=MAX_TOP_K, threshold=0.0,
+        batch_size=scheduler.max_batch_size, name=uploaded_file.name
+    ):
+        results.append({
+            "image": entry["member"],
+            "ranked": [(pred["class"], pred["confidence"]) for pred in entry.get("predictions", [])],
+            "inference_time": entry.get("inference_time_ms", 0.0) / 1000,
+            "error": entry.get("error")
+        })
+        if status is not None and len(results) % scheduler.max_batch_size == 0:
+            status.caption(f"🗜️ {uploaded_file.name}: {len(results)} images classified...")
+    cache[key] = results
+    return [{**result, "predictions": rank_predictions(result["ranked"], top_k, threshold)}
+            for result in results]
+
+
+def display_summary_table(results: List[dict]) -> int:
+    """Show one table row per image; returns the approximate payload in bytes."""
+    rows = []
+    for idx, result in enumerate(results, 1):
+        top_class, top_confidence = result["predictions"][0] if result["predictions"] else ("-", 0.0)
+        rows.append({
+            "#": idx,
+            "image": result["image"],
+            "top class": top_class,
+            "confidence": round(float(top_confidence), 4),
+            "time (ms)": round(result["inference_time"] * 1000, 1),
+            "status": "❌ " + result["error"] if result["error"] else "✅"
+        })
+    st.dataframe(rows, use_container_width=True, hide_index=True)
+    return len(json.dumps(rows))
+
+
+def display_results_grid(uploaded_files, results: List[dict]) -> int:
+    """
+    Show one page of preview thumbnails with the top prediction each.
+    
+    Returns:
+        int: Bytes of preview images sent for this page
+    """
+    n_pages = (len(results) + PAGE_SIZE - 1) // PAGE_SIZE
+    page = st.number_input(f"Page (of {n_pages})", min_value=1, max_value=n_pages,
+                           value=1, key="results_page")
+    start = (page - 1) * PAGE_SIZE
+    
+    payload = 0
+    page_items = list(zip(uploaded_files, results))[start:start + PAGE_SIZE]
+    for row_start in range(0, len(page_items), GRID_COLUMNS):
+        cols = st.columns(GRID_COLUMNS)
+        for col, (uploaded_file, result) in zip(cols, page_items[row_start:row_start + GRID_COLUMNS]):
+            with col:
+                try:
+                    preview = make_preview(uploaded_file.file_id, uploaded_file)
+                    payload += len(preview)
+                    st.image(preview, use_column_width=True)
+                except Exception as e:
+                    st.error(f"❌ Error loading image: {str(e)}")
+                if result["predictions"]:
+                    class_name, confidence = result["predictions"][0]
+                    st.caption(f"**{class_name}** • {confidence:.1%}")
+                elif result["error"]:
+                    st.caption(f"❌ {result['error']}")
+                else:
+                    st.caption("No predictions above threshold")
+                if st.button("🔍 Details", key=f"details_{result['file_id']}"):
+                    st.session_state["detail_file_id"] = result["file_id"]
+    return payload
+
+
+def display_upload_details(uploaded_file, result: dict, show_inference_time: bool):
+    """Full image and prediction cards for one upload, rendered on demand."""
+    st.markdown(f"## 🖼️ {uploaded_file.name}")
+    img_col, pred_col = st.columns([1, 1])
+    with img_col:
+        with open_upload(uploaded_file) as source:
+            st.image(preview_image(as_rgb(source), DISPLAY_SIZE), use_column_width=True)
+            st.caption(f"📐 Dimensions: {source.size[0]} × {source.size[1]} pixels")
+    with pred_col:
+        if show_inference_time:
+            st.info(f"⚡ Inference time: {result['inference_time']*1000:.1f}ms")
+        if result["predictions"]:
+            st.markdown("### 🎯 Predictions")
+            for rank, (class_name, confidence) in enumerate(result["predictions"], 1):
+                display_prediction_card(rank, class_name, confidence)
+        elif result["error"]:
+            st.error(f"❌ Error during inference: {result['error']}")
+        else:
+            st.warning("No predictions above the confidence threshold")
+        if st.button("✖ Close details", key="close_details"):
+            del st.session_state["detail_file_id"]
+            st.rerun()
+
+
+def display_backend_selection(backend: InferenceBackend):
+    """Show which backend auto-selection picked and how the candidates measured."""
+    st.caption(f"⚙️ Auto-selected backend: **{backend.name}** ({backend.description})")
+    with st.expander("⚙️ Backend benchmark"):
+        st.dataframe([
+            {
+                "backend": entry["name"],
+                "ms / image": round(entry["per_image_ms"], 2) if "per_image_ms" in entry else None,
+                "logits match": ("✅" if entry["parity"]["ok"] else "❌") if "parity" in entry else "-",
+                "ready in (s)": round(entry["load_s"], 1) if "load_s" in entry else None,
+                "note": entry.get("error", "selected" if entry["name"] == backend.name else "")
+            }
+            for entry in backend.selection
+        ], use_container_width=True, hide_index=True)
+
+
+def display_profile_summary(run: ProfileRun):
+    """Show where a profiled run was saved and its hottest operators."""
+    st.caption(f"🧪 Profile saved to `{run.run_dir}` (open trace.json in ui.perfetto.dev)")
+    with st.expander("📊 Operators by self CPU time"):
+        st.code(run.cpu_table)
+    with st.expander("💾 Operators by memory"):
+        st.code(run.memory_table)
 
 
 def display_prediction_card(rank: int, class_name: str, confidence: float, is_top: bool = False):
@@ -256,12 +806,15 @@ def display_prediction_card(rank: int, class_name: str, confidence: float, is_to
 
 
 def main():
+    begin_run()
+    initialize_runtime(PROFILE)
+    
     # Header with gradient - using st.title for better visibility
     st.markdown('<h1 style="text-align: center;">🖼️ ImageNet Vision AI</h1>', unsafe_allow_html=True)
     st.markdown('<p class="subtitle">Powered by Deep Learning • Upload images and get instant predictions</p>', unsafe_allow_html=True)
     
-    # Hardcoded checkpoint path
-    checkpoint_path = "models/acc1=76.2100.ckpt"
+    # Checkpoint from config.yaml, else the bundled one (pretrained weights if missing)
+    checkpoint_path = CONFIG.default_model_path or DEFAULT_CHECKPOINT
     
     # Sidebar configuration
     with st.sidebar:
@@ -273,8 +826,8 @@ def main():
         top_k = st.slider(
             "Top predictions",
             min_value=1,
-            max_value=10,
-            value=5,
+            max_value=MAX_TOP_K,
+            value=min(CONFIG.default_top_k, MAX_TOP_K),
             help="Number of top predictions to display"
         )
         
@@ -282,7 +835,7 @@ def main():
             "Confidence threshold",
             min_value=0,
             max_value=100,
-            value=0,
+            value=round(CONFIG.default_confidence_threshold * 100),
             help="Filter predictions below this confidence"
         ) / 100.0
         
@@ -292,6 +845,51 @@ def main():
         with st.expander("🔧 Advanced Options"):
             show_model_info = st.checkbox("Show model information", value=False)
             show_inference_time = st.checkbox("Show inference time", value=True)
+            backend = st.selectbox(
+                "Inference backend",
+                options=list(BACKENDS) + [AUTO],
+                index=(list(BACKENDS) + [AUTO]).index(PROFILE.backend),
+                help="eager: fp32 reference; optimized_eager: BatchNorm folding and "
+                     "channels_last; torchscript: frozen TorchScript; compiled: torch.compile "
+                     "(slow first start, cached afterwards); auto: benchmark them at startup and "
+                     "use the fastest whose logits match eager. Unavailable or mismatching "
+                     "backends fall back to eager"
+            )
+            tiled_mode = st.checkbox(
+                "Tiled analysis (large images)",
+                value=False,
+                help="Classify overlapping 224px tiles instead of one center crop "
+                     "and show per-class heatmaps"
+            )
+            tile_scales = st.multiselect(
+                "Tile scales",
+                options=[1.0, 0.5, 0.25],
+                default=[1.0, 0.5],
+                disabled=not tiled_mode,
+                help="1.0 tiles the image at native resolution; smaller scales give each tile more context"
+            ) or [1.0]
+            results_view = st.radio(
+                "Results view",
+                options=["Auto", "Compact", "Detailed"],
+                horizontal=True,
+                help=f"Compact shows a summary table and a paginated preview grid; "
+                     f"Auto uses it for {COMPACT_VIEW_MIN_IMAGES} or more images"
+            )
+            shadow_checkpoint = st.text_input(
+                "Shadow checkpoint",
+                value="",
+                placeholder="models/candidate.ckpt",
+                help="Run this checkpoint on the same preprocessed images as the current model "
+                     "and show where their top-1 predictions disagree"
+            ).strip()
+            st.caption(f"⚡ Performance profile {describe_profile(PROFILE)}. "
+                       f"Set IMAGENET_PROFILE to switch.")
+            profile_inference = st.checkbox(
+                "Profile inference",
+                value=False,
+                help="Record preprocessing and the forward pass with torch.profiler; "
+                     "a Chrome trace and operator tables are saved per image"
+            )
         
         st.markdown("---")
         
@@ -323,11 +921,18 @@ def main():
     # Load model once
     with st.spinner("🔄 Loading model..."):
         try:
-            model = initialize_model(checkpoint_path)
+            model = initialize_model(checkpoint_path, backend=backend, precision=PROFILE.precision)
+            scheduler = initialize_scheduler(checkpoint_path, backend=backend,
+                                             precision=PROFILE.precision,
+                                             max_batch_size=PROFILE.batch_size,
+                                             slo_p95_ms=PROFILE.slo_p95_ms,
+                                             slo_queue_depth=PROFILE.slo_queue_depth)
             
             if show_model_info:
                 info = get_model_info(model)
                 st.success(f"✅ Model loaded: {info['model_type']} ({info['total_parameters']:,} parameters)")
+            if backend == AUTO:
+                display_backend_selection(model)
         except Exception as e:
             st.error(f"❌ Error loading model: {str(e)}")
             return
@@ -339,14 +944,23 @@ def main():
     
     uploaded_files = st.file_uploader(
         "Choose images",
-        type=["jpg", "jpeg", "png", "webp"],
+        type=["jpg", "jpeg", "png", "webp", "gif", "tif", "tiff", "zip"],
         accept_multiple_files=True,
         label_visibility="collapsed"
     )
+    uploaded_files = uploaded_files or []
+    max_upload_bytes = CONFIG.max_upload_size_mb * 1024 * 1024
+    too_large = [f.name for f in uploaded_files if f.size > max_upload_bytes]
+    if too_large:
+        st.warning(f"⚠️ Skipped {len(too_large)} file(s) over {CONFIG.max_upload_size_mb} MB: "
+                   f"{', '.join(too_large)}")
+    uploaded_files = [f for f in uploaded_files if f.size <= max_upload_bytes]
+    archive_files = [f for f in uploaded_files if is_archive(f.name)]
+    uploaded_files = [f for f in uploaded_files if not is_archive(f.name)]
     
     if uploaded_files:
         # Stats row
-        col1, col2, col3 = st.columns(3)
+        col1, col2, col3, col4 = st.columns(4)
         with col1:
             st.markdown(f"""
                 <div class="stat-box">
@@ -372,72 +986,198 @@ def main():
                 </div>
             """, unsafe_allow_html=True)
         
+        with col4:
+            queue_stats = scheduler.stats()
+            st.markdown(f"""
+                <div class="stat-box">
+                    <div class="stat-value">{queue_stats['queue_depth']}</div>
+                    <div class="stat-label">Queued • p95 wait {queue_stats['wait_p95_ms']:.0f}ms</div>
+                </div>
+            """, unsafe_allow_html=True)
+        display_degradation_status(queue_stats.get("degradation"))
+        
         st.markdown("---")
         
-        # Process each image
         all_results = []
+        compact_view = results_view == "Compact" or (
+            results_view == "Auto" and len(uploaded_files) >= COMPACT_VIEW_MIN_IMAGES
+        )
         
-        for idx, uploaded_file in enumerate(uploaded_files):
-            st.markdown(f"## 🖼️ Image {idx + 1}: {uploaded_file.name}")
+        if compact_view:
+            progress = st.progress(0.0, text="🔮 Analyzing images...")
+            results = []
+            for idx, uploaded_file in enumerate(uploaded_files):
+                results.append(analyze_upload(uploaded_file, model, scheduler, top_k,
+                                              confidence_threshold, tiled_mode, tile_scales))
+                progress.progress((idx + 1) / len(uploaded_files),
+                                  text=f"🔮 Analyzed {idx + 1}/{len(uploaded_files)} images")
+            progress.empty()
             
-            # Create two columns for image and predictions
-            img_col, pred_col = st.columns([1, 1])
+            render_start = time.perf_counter()
+            st.markdown("### 📋 Summary")
+            table_bytes = display_summary_table(results)
+            st.markdown("### 🖼️ Results")
+            preview_bytes = display_results_grid(uploaded_files, results)
             
-            with img_col:
-                # Load and display image
-                try:
-                    image = Image.open(uploaded_file).convert('RGB')
+            detail_id = st.session_state.get("detail_file_id")
+            for uploaded_file, result in zip(uploaded_files, results):
+                if uploaded_file.file_id == detail_id:
+                    st.markdown("---")
+                    display_upload_details(uploaded_file, result, show_inference_time)
+            render_ms = (time.perf_counter() - render_start) * 1000
+            
+            full_size_mb = sum(f.size for f in uploaded_files) / (1024 * 1024)
+            st.caption(f"🧾 Results rendered in {render_ms:.0f}ms • "
+                       f"{(table_bytes + preview_bytes) / 1024:.0f} KB of table and previews "
+                       f"(the uploads themselves are {full_size_mb:.1f} MB)")
+            
+            all_results = [
+                {
+                    "image": result["image"],
+                    "predictions": [
+                        {"rank": i+1, "class": c, "confidence": float(conf)}
+                        for i, (c, conf) in enumerate(result["predictions"])
+                    ],
+                    "inference_time_ms": result["inference_time"] * 1000
+                }
+                for result in results if result["predictions"]
+            ]
+        else:
+            # Process each image
+        
+            for idx, uploaded_file in enumerate(uploaded_files):
+                st.markdown(f"## 🖼️ Image {idx + 1}: {uploaded_file.name}")
+            
+                # Create two columns for image and predictions
+                img_col, pred_col = st.columns([1, 1])
+            
+                with img_col:
+                    # Load and display image
+                    try:
+                        # Decoded once: the preview, inference and tiles all use this image
+                        source = open_upload(uploaded_file)
+                        n_frames = getattr(source, "n_frames", 1)
+                        image = as_rgb(source)
                     
-                    # Display image in a nice container
-                    st.markdown('<div class="image-container">', unsafe_allow_html=True)
-                    st.image(image, use_column_width=True)
-                    st.markdown('</div>', unsafe_allow_html=True)
+                        # Display image in a nice container
+                        st.markdown('<div class="image-container">', unsafe_allow_html=True)
+                        st.image(preview_image(image, DISPLAY_SIZE), use_column_width=True)
+                        st.markdown('</div>', unsafe_allow_html=True)
                     
-                    # Image metadata
-                    st.caption(f"📐 Dimensions: {image.size[0]} × {image.size[1]} pixels")
-                    st.caption(f"📁 Format: {image.format if hasattr(image, 'format') else 'Unknown'}")
+                        # Image metadata
+                        st.caption(f"📐 Dimensions: {image.size[0]} × {image.size[1]} pixels")
+                        st.caption(f"📁 Format: {source.format or 'Unknown'}")
+                        if n_frames > 1:
+                            st.caption(f"🎞️ Frames: {n_frames}")
                     
-                except Exception as e:
-                    st.error(f"❌ Error loading image: {str(e)}")
-                    continue
+                    except Exception as e:
+                        st.error(f"❌ Error loading image: {str(e)}")
+                        continue
             
-            with pred_col:
-                # Run inference
-                with st.spinner("🔮 Analyzing image..."):
-                    try:
-                        predictions, inference_time = process_single_image(
-                            image, model, top_k, confidence_threshold
-                        )
+                with pred_col:
+                    # Run inference (completed results are reused across reruns)
+                    with st.spinner("🔮 Analyzing image..."):
+                        try:
+                            profile_run, error = None, None
+                            if profile_inference and n_frames == 1 and not tiled_mode:
+                                timings, tiled, frame_rows = {}, None, None
+                                predictions, inference_time, profile_run = run_inference(
+                                    image, model, top_k, confidence_threshold,
+                                    profile=True,
+                                    metadata={
+                                        "source": "app",
+                                        "checkpoint": checkpoint_path,
+                                        "image": uploaded_file.name,
+                                        "top_k": top_k,
+                                        "threshold": confidence_threshold
+                                    }
+                                )
+                            else:
+                                result = analyze_upload(uploaded_file, model, scheduler, top_k,
+                                                        confidence_threshold, tiled_mode,
+                                                        tile_scales, source=source, image=image)
+                                error = result["error"]
+                                predictions = result["predictions"]
+                                inference_time = result["inference_time"]
+                                timings = result["timings"]
+                                tiled = result["tiled"]
+                                frame_rows = result["frame_rows"]
                         
-                        if show_inference_time:
-                            st.info(f"⚡ Inference time: {inference_time*1000:.1f}ms")
+                            if error:
+                                st.error(f"❌ Error during inference: {error}")
+                            else:
+                                if show_inference_time:
+                                    queue_note = ""
+                                    if "queue_wait_ms" in timings:
+                                        queue_note = (f" (queue wait {timings['queue_wait_ms']:.1f}ms, "
+                                                      f"batch of {timings['batch_size']})")
+                                    if timings.get("mode", "full") != "full":
+                                        queue_note += (f" • 🚦 {timings['mode']} mode, "
+                                                       f"{timings['resolution']}px")
+                                    st.info(f"⚡ Inference time: {inference_time*1000:.1f}ms{queue_note}")
+                                if profile_run is not None:
+                                    display_profile_summary(profile_run)
                         
-                        if predictions:
-                            st.markdown("### 🎯 Predictions")
+                                if predictions:
+                                    st.markdown("### 🎯 Predictions")
+                            
+                                    # Display prediction cards
+                                    for rank, (class_name, confidence) in enumerate(predictions, 1):
+                                        display_prediction_card(rank, class_name, confidence)
                             
-                            # Display prediction cards
-                            for rank, (class_name, confidence) in enumerate(predictions, 1):
-                                display_prediction_card(rank, class_name, confidence)
+                                    if tiled is not None:
+                                        display_tiled_heatmap(image, tiled, key=f"heatmap_{idx}")
+                                    if frame_rows is not None:
+                                        st.caption(f"🎞️ Averaged over {len(frame_rows)} frames")
+                                        with st.expander("🎞️ Per-frame predictions"):
+                                            st.dataframe(frame_rows, use_container_width=True)
                             
-                            # Store results for batch export
-                            all_results.append({
-                                "image": uploaded_file.name,
-                                "predictions": [
-                                    {"rank": i+1, "class": c, "confidence": float(conf)}
-                                    for i, (c, conf) in enumerate(predictions)
-                                ],
-                                "inference_time_ms": inference_time * 1000
-                            })
-                        else:
-                            st.warning(f"⚠️ No predictions above {confidence_threshold:.0%} confidence threshold")
+                                    # Store results for batch export
+                                    all_results.append({
+                                        "image": uploaded_file.name,
+                                        "predictions": [
+                                            {"rank": i+1, "class": c, "confidence": float(conf)}
+                                            for i, (c, conf) in enumerate(predictions)
+                                        ],
+                                        "inference_time_ms": inference_time * 1000,
+                                        **({"frames": frame_rows} if frame_rows is not None else {})
+                                    })
+                                else:
+                                    st.warning(f"⚠️ No predictions above {confidence_threshold:.0%} confidence threshold")
                     
-                    except Exception as e:
-                        st.error(f"❌ Error during inference: {str(e)}")
-                        st.exception(e)
+                        except Superseded:
+                            raise
+                        except SchedulerBusy as e:
+                            st.error(f"⏳ Server busy: {str(e)}. Please try again shortly.")
+                        except Exception as e:
+                            st.error(f"❌ Error during inference: {str(e)}")
+                            st.exception(e)
             
-            # Separator between images
-            if idx < len(uploaded_files) - 1:
-                st.markdown("---")
+                # Separator between images
+                if idx < len(uploaded_files) - 1:
+                    st.markdown("---")
+        
+        if shadow_checkpoint:
+            st.markdown("---")
+            st.markdown(f"### 🔀 Shadow Comparison: `{shadow_checkpoint}`")
+            if not os.path.exists(shadow_checkpoint):
+                st.error(f"❌ Shadow checkpoint not found: {shadow_checkpoint}")
+            else:
+                try:
+                    with st.spinner("🔀 Running both checkpoints..."):
+                        shadow_scheduler = initialize_scheduler(shadow_checkpoint, backend=backend,
+                                                                precision=PROFILE.precision,
+                                                                max_batch_size=PROFILE.batch_size)
+                        comparison = run_shadow_comparison(uploaded_files, scheduler,
+                                                           shadow_scheduler, shadow_checkpoint)
+                    if comparison is not None:
+                        display_shadow_comparison(comparison)
+                except Superseded:
+                    raise
+                except SchedulerBusy as e:
+                    st.error(f"⏳ Server busy: {str(e)}. Please try again shortly.")
+                except Exception as e:
+                    st.error(f"❌ Shadow comparison failed: {str(e)}")
         
         # Batch download option
         if all_results:
@@ -454,16 +1194,59 @@ def main():
                     "model": checkpoint_path,
                     "total_images": len(uploaded_files),
                     "results": all_results
-                }, indent=2)
+                }, separators=(",", ":"))
                 
                 st.download_button(
                     label="📥 Download All Results",
                     data=results_json,
                     file_name=f"predictions_{len(uploaded_files)}_images.json",
                     mime="application/json",
-                    use_column_width=True
+                    use_container_width=True
                 )
     
+    for archive_file in archive_files:
+        st.markdown("---")
+        st.markdown(f"## 🗜️ Archive: {archive_file.name}")
+        status = st.empty()
+        try:
+            archive_results = analyze_archive(archive_file, scheduler, initialize_archive_decoder(PROFILE.decode_workers),
+                                              top_k, confidence_threshold, status=status)
+        except Superseded:
+            raise
+        except SchedulerBusy as e:
+            status.error(f"⏳ Server busy: {str(e)}. Please try again shortly.")
+            continue
+        except Exception as e:
+            status.error(f"❌ Error reading archive: {str(e)}")
+            continue
+        
+        errors = sum(1 for result in archive_results if result["error"])
+        total_ms = sum(result["inference_time"] for result in archive_results) * 1000
+        status.caption(f"🖼️ {len(archive_results)} images ({errors} unreadable) • "
+                       f"⚡ {total_ms:.0f}ms of inference • {archive_file.size / (1024 * 1024):.1f} MB archive")
+        display_summary_table(archive_results)
+        st.download_button(
+            label="📥 Download Archive Results",
+            data=json.dumps({
+                "model": checkpoint_path,
+                "archive": archive_file.name,
+                "total_images": len(archive_results),
+                "results": [
+                    {
+                        "image": result["image"],
+                        "predictions": [
+                            {"rank": i+1, "class": c, "confidence": float(conf)}
+                            for i, (c, conf) in enumerate(result["predictions"])
+                        ]
+                    }
+                    for result in archive_results if not result["error"]
+                ]
+            }, separators=(",", ":")),
+            file_name=f"predictions_{Path(archive_file.name).stem}.json",
+            mime="application/json",
+            key=f"archive_download_{archive_file.file_id}"
+        )
+    
     # Process selected sample image (outside the if/else to avoid rerun loop)
     if 'selected_sample' in st.session_state:
         sample_path = st.session_state['selected_sample']
@@ -488,10 +1271,22 @@ def main():
         with pred_col:
             with st.spinner("🔮 Analyzing image..."):
                 try:
-                    predictions, inference_time = process_single_image(
-                        image, model, top_k, confidence_threshold
+                    predictions, inference_time, profile_run = run_inference(
+                        image, model, top_k, confidence_threshold,
+                        profile=profile_inference,
+                        scheduler=scheduler,
+                        metadata={
+                            "source": "app",
+                            "checkpoint": checkpoint_path,
+                            "image": sample_path,
+                            "top_k": top_k,
+                            "threshold": confidence_threshold
+                        }
                     )
                     
+                    if profile_run is not None:
+                        display_profile_summary(profile_run)
+                    
                     if predictions:
                         st.success(f"✨ Analysis complete in {inference_time:.3f}s")
                         
@@ -499,7 +1294,11 @@ def main():
                             display_prediction_card(rank, class_name, confidence)
                     else:
                         st.warning("No predictions above the confidence threshold")
-                        
+                
+                except Superseded:
+                    raise
+                except SchedulerBusy as e:
+                    st.error(f"⏳ Server busy: {str(e)}. Please try again shortly.")
                 except Exception as e:
                     st.error(f"❌ Error during inference: {str(e)}")
     
@@ -581,4 +1380,8 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    except Superseded:
+        # A newer run of this session took over; drop this one quietly
+        st.stop()
@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Resumable, sharded batch classification.
+
+The image manifest is split into shards tracked in a SQLite work queue inside
+the job directory. Workers (local processes or the same command on other
+hosts sharing the job directory) claim shards, classify them with the
+load_model + preprocess_image pipeline and checkpoint each finished shard as
+its own file. Re-running a job only processes the shards that are not done,
+and merge writes the results in manifest order regardless of which worker
+handled what.
+
+Usage:
+    # Coordinator: split, run 4 local workers, merge
+    python batch_classify.py run --manifest images.txt --job_dir jobs/val --workers 4 \\
+        --checkpoint models/acc1=76.2100.ckpt --output val_predictions.jsonl
+
+    # Reuse decoded images across runs (see cache_images.py)
+    python batch_classify.py run --manifest images.txt --job_dir jobs/val_ckpt2 --workers 4 \
+        --checkpoint models/other.ckpt --tensor_cache cache/val --output val_ckpt2.jsonl
+
+    # Workers use a config.yaml performance profile; each gets CPU count / --workers
+    # torch threads unless --threads is given
+    python batch_classify.py run --manifest images.txt --job_dir jobs/val --workers 4 \
+        --perf_profile throughput --threads 2 --output val_predictions.jsonl
+
+    # Step by step / across hosts (job_dir on shared storage)
+    python batch_classify.py init --manifest images.txt --job_dir /shared/jobs/val --shard_size 500
+    python batch_classify.py worker --job_dir /shared/jobs/val      # on every host
+    python batch_classify.py status --job_dir /shared/jobs/val
+    python batch_classify.py merge --job_dir /shared/jobs/val --output val_predictions.jsonl
+
+The manifest is a text file with one image path per line, or a directory
+(searched recursively, sorted).
+"""
+import argparse
+import contextlib
+import glob
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from utils.config import ConfigError, apply_profile, get_config, select_profile
+from utils.work_queue import DONE, ShardQueue, default_worker_id
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp', '.gif', '.tif', '.tiff')
+
+
+class LostLease(Exception):
+    """Raised when another worker took over the shard being processed."""
+
+
+def read_manifest(manifest):
+    """Image paths from a manifest file or directory, in a stable order."""
+    if os.path.isdir(manifest):
+        paths = []
+        for root, _, files in os.walk(manifest):
+            paths.extend(os.path.join(root, name) for name in files
+                         if name.lower().endswith(IMAGE_EXTENSIONS))
+        return sorted(paths)
+    with open(manifest, "r") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def queue_path(job_dir):
+    return os.path.join(job_dir, "queue.db")
+
+
+def shard_output_path(job_dir, shard_id):
+    return os.path.join(job_dir, "shards", f"{shard_id:05d}.jsonl")
+
+
+def init_job(job_dir, paths, shard_size=500, settings=None):
+    """
+    Create a job (or reopen an existing one unchanged).
+
+    Args:
+        job_dir (str): Directory holding the queue and shard outputs
+        paths (list): Image paths in output order
+        shard_size (int): Images per shard
+        settings (dict, optional): checkpoint, top_k, threshold and batch_size
+                                   shared by every worker
+
+    Returns:
+        dict: Queue status
+    """
+    os.makedirs(os.path.join(job_dir, "shards"), exist_ok=True)
+    with ShardQueue.create(queue_path(job_dir), paths, shard_size, metadata=settings) as queue:
+        if not queue.created:
+            print(f"Resuming existing job in {job_dir}")
+        return queue.status()
+
+
+def make_classifier(settings):
+    """
+    Build classify(paths) -> results from the job settings.
+
+    Images found in the job's tensor cache are read from it instead of being
+    decoded. Decode errors are reported per image instead of failing the shard.
+    The model runs with the backend and precision of the worker's performance
+    profile (settings["perf_profile"]).
+    """
+    import torch
+    from PIL import Image
+    from utils.image_processor import get_top_predictions, preprocess_image
+    from utils.model_loader import load_model
+    from utils.tensor_cache import TensorCache
+
+    profile = select_profile(get_config(), settings.get("perf_profile"))
+    # Same rule as inference.py: the plain eager fp32 model needs no backend wrapper
+    backend = None if (profile.backend, profile.precision) == ("eager", "fp32") else profile.backend
+    with contextlib.redirect_stdout(io.StringIO()):
+        model = load_model(settings.get("checkpoint"), backend=backend,
+                           precision=profile.precision)
+    device = next(model.parameters()).device
+    top_k = settings.get("top_k", 5)
+    threshold = settings.get("threshold", 0.0)
+    cache = TensorCache(settings["tensor_cache"]) if settings.get("tensor_cache") else None
+
+    def classify(paths):
+        results, tensors, positions = [], [], []
+        rows = [cache.row(path) for path in paths] if cache is not None else [None] * len(paths)
+        cached = [row for row in rows if row is not None]
+        if cached:
+            cached_batch = iter(cache.batch(cached, device=device).split(1))
+
+        for path, row in zip(paths, rows):
+            try:
+                if row is not None:
+                    tensors.append(next(cached_batch))
+                else:
+                    with Image.open(path) as image:
+                        tensors.append(preprocess_image(image.convert('RGB')))
+                positions.append(len(results))
+                results.append({"image": path})
+            except Exception as e:
+                results.append({"image": path, "error": str(e)})
+
+        if tensors:
+            with torch.no_grad():
+                probabilities = torch.softmax(model(torch.cat(tensors)), dim=1)
+            for position, row in zip(positions, probabilities):
+                results[position]["predictions"] = [
+                    {"rank": i + 1, "class": class_name, "class_index": class_idx,
+                     "confidence": float(confidence)}
+                    for i, (class_idx, class_name, confidence) in enumerate(
+                        get_top_predictions(row, top_k=top_k, threshold=threshold,
+                                            return_indices=True)
+                    )
+                ]
+        return results
+
+    return classify
+
+
+def process_shard(queue, worker, shard_id, items, classify, output_path, batch_size):
+    """Classify one claimed shard into a temporary file and move it into place."""
+    # Leftovers of a worker that died while holding this shard
+    for stale_path in glob.glob(f"{glob.escape(output_path)}.*.part"):
+        os.remove(stale_path)
+
+    part_path = f"{output_path}.{os.getpid()}.part"
+    try:
+        with open(part_path, "w") as f:
+            for start in range(0, len(items), batch_size):
+                batch = items[start:start + batch_size]
+                for (idx, _), result in zip(batch, classify([path for _, path in batch])):
+                    f.write(json.dumps({"index": idx, **result}) + "\n")
+                if not queue.heartbeat(shard_id, worker):
+                    raise LostLease(f"shard {shard_id} was reassigned")
+        os.replace(part_path, output_path)
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
+
+def run_worker(job_dir, worker=None, classifier_factory=make_classifier, lease_s=300.0,
+               checkpoint=None, perf_profile=None, num_threads=None):
+    """
+    Claim and process shards until none are left.
+
+    Args:
+        job_dir (str): Job directory created by init_job()
+        worker (str, optional): Worker id (default host:pid)
+        classifier_factory (callable): settings -> classify(paths); the model
+                                       is only loaded once a shard is claimed
+        lease_s (float): Seconds without a heartbeat before a shard is reassigned
+        checkpoint (str, optional): Override the job's checkpoint path on this host
+        perf_profile (str, optional): Performance profile from config.yaml
+                                      (default: $IMAGENET_PROFILE, then the
+                                      config's default_profile)
+        num_threads (int, optional): Torch intra-op threads (default: the
+                                     profile's num_threads)
+
+    Returns:
+        int: Number of shards this worker completed
+    """
+    import torch
+
+    apply_profile(select_profile(get_config(), perf_profile))
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    worker = worker or default_worker_id()
+    completed = 0
+    classify = None
+
+    with ShardQueue(queue_path(job_dir), lease_s=lease_s) as queue:
+        settings = queue.metadata()
+        if checkpoint:
+            settings["checkpoint"] = checkpoint
+        settings["perf_profile"] = perf_profile
+        batch_size = settings.get("batch_size", 32)
+
+        while True:
+            claim = queue.claim(worker)
+            if claim is None:
+                break
+            shard_id, items = claim
+            if classify is None:
+                classify = classifier_factory(settings)
+
+            start_time = time.time()
+            try:
+                process_shard(queue, worker, shard_id, items, classify,
+                              shard_output_path(job_dir, shard_id), batch_size)
+            except LostLease as e:
+                print(f"[{worker}] {e}", file=sys.stderr)
+                continue
+            except Exception as e:
+                print(f"[{worker}] shard {shard_id} failed: {e}", file=sys.stderr)
+                queue.release(shard_id, worker, str(e))
+                continue
+
+            if queue.complete(shard_id, worker):
+                completed += 1
+                print(f"[{worker}] ✓ shard {shard_id} ({len(items)} images, "
+                      f"{time.time() - start_time:.1f}s)", file=sys.stderr)
+    return completed
+
+
+def merge_outputs(job_dir, output, sink=None):
+    """
+    Concatenate shard outputs in manifest order.
+
+    Args:
+        job_dir (str): Job directory
+        output (str): Merged JSONL path
+        sink (ResultSink, optional): Also store every result compactly and
+                                     aggregate per-class statistics
+
+    Raises:
+        RuntimeError: If any shard is not done yet
+
+    Returns:
+        int: Number of results written
+    """
+    with ShardQueue(queue_path(job_dir)) as queue:
+        shards = queue.shards()
+        unfinished = [(shard_id, status, error) for shard_id, status, error in shards
+                      if status != DONE]
+        if unfinished:
+            details = ", ".join(f"{shard_id} ({status}{': ' + error if error else ''})"
+                                for shard_id, status, error in unfinished[:10])
+            raise RuntimeError(f"{len(unfinished)} shards are not done: {details}")
+
+    count = 0
+    expected = 0
+    part_path = output + ".part"
+    with open(part_path, "w") as out:
+        for shard_id, _, _ in shards:
+            with open(shard_output_path(job_dir, shard_id), "r") as f:
+                for line in f:
+                    result = json.loads(line)
+                    if result["index"] != expected:
+                        raise RuntimeError(f"shard {shard_id} output is out of order or incomplete")
+                    out.write(line)
+                    if sink is not None:
+                        sink.add(result["image"], None if "error" in result else [
+                            (pred["class_index"], pred["confidence"])
+                            for pred in result["predictions"]
+                        ])
+                    expected += 1
+                    count += 1
+    os.replace(part_path, output)
+    return count
+
+
+def print_status(job_dir):
+    with ShardQueue(queue_path(job_dir)) as queue:
+        status = queue.status()
+    print(f"Job: {job_dir}")
+    print(f"  Images: {status['items']}  Shards: {status['shards']}")
+    print(f"  Done: {status['done']}  Running: {status['claimed']}  "
+          f"Pending: {status['pending']}  Failed: {status['failed']}")
+    return status
+
+
+def run_local(job_dir, workers=2, classifier_factory=make_classifier, lease_s=300.0,
+              perf_profile=None, num_threads=None):
+    """
+    Run worker processes on this host until the queue is drained.
+
+    Each worker gets num_threads torch threads, by default an equal share of
+    the CPUs, so that the workers together do not oversubscribe the host.
+    """
+    num_threads = num_threads or max(1, (os.cpu_count() or 1) // workers)
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=run_worker, args=(job_dir,),
+                        kwargs={"classifier_factory": classifier_factory, "lease_s": lease_s,
+                                "perf_profile": perf_profile, "num_threads": num_threads})
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    return [process.exitcode for process in processes]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resumable sharded batch classification")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_job_args(sub):
+        sub.add_argument("--manifest", type=str, required=True,
+                         help="Text file with one image path per line, or a directory")
+        sub.add_argument("--shard_size", type=int, default=500,
+                         help="Images per shard")
+        sub.add_argument("--checkpoint", type=str, default=None,
+                         help="Path to model checkpoint (optional, uses pretrained if not provided)")
+        sub.add_argument("--top_k", type=int, default=5,
+                         help="Number of top predictions to show")
+        sub.add_argument("--threshold", type=float, default=0.0,
+                         help="Minimum confidence threshold (0-1)")
+        sub.add_argument("--batch_size", type=int, default=32,
+                         help="Images per forward pass")
+        sub.add_argument("--tensor_cache", type=str, default=None,
+                         help="Read pre-decoded images from this cache (see cache_images.py)")
+
+    for name in ("init", "run", "worker", "status", "merge"):
+        sub = subparsers.add_parser(name)
+        sub.add_argument("--job_dir", type=str, required=True,
+                         help="Directory holding the work queue and shard outputs")
+        if name in ("init", "run"):
+            add_job_args(sub)
+        if name in ("run", "worker"):
+            sub.add_argument("--lease", type=float, default=300.0,
+                             help="Seconds without progress before a shard is reassigned")
+            sub.add_argument("--perf_profile", type=str, default=None,
+                             help="Performance profile from config.yaml for the workers "
+                                  "(default: $IMAGENET_PROFILE, then the config's default_profile)")
+            sub.add_argument("--threads", type=int, default=None,
+                             help="Torch threads per worker (default: CPU count / --workers "
+                                  "for run, the profile's for worker)")
+        if name == "run":
+            sub.add_argument("--workers", type=int, default=2,
+                             help="Local worker processes")
+        if name == "worker":
+            sub.add_argument("--checkpoint", type=str, default=None,
+                             help="Checkpoint path on this host (default: the job's)")
+        if name in ("run", "merge"):
+            sub.add_argument("--output", type=str, required=True,
+                             help="Merged JSONL output")
+            sub.add_argument("--results_dir", type=str, default=None,
+                             help="Also store compact top-k arrays and per-class aggregates here")
+    args = parser.parse_args()
+
+    if args.command in ("run", "worker"):
+        try:
+            select_profile(get_config(), args.perf_profile)
+        except ConfigError as e:
+            parser.error(str(e))
+
+    if args.command in ("init", "run"):
+        paths = read_manifest(args.manifest)
+        settings = {"checkpoint": args.checkpoint, "top_k": args.top_k,
+                    "threshold": args.threshold, "batch_size": args.batch_size,
+                    "tensor_cache": args.tensor_cache}
+        status = init_job(args.job_dir, paths, args.shard_size, settings)
+        print(f"Job has {status['items']} images in {status['shards']} shards "
+              f"({status['done']} already done)")
+        if args.command == "init":
+            return
+
+    if args.command == "run":
+        start_time = time.time()
+        run_local(args.job_dir, args.workers, lease_s=args.lease,
+                  perf_profile=args.perf_profile, num_threads=args.threads)
+        print(f"Workers finished in {time.time() - start_time:.1f}s")
+    elif args.command == "worker":
+        completed = run_worker(args.job_dir, lease_s=args.lease, checkpoint=args.checkpoint,
+                               perf_profile=args.perf_profile, num_threads=args.threads)
+        print(f"Completed {completed} shards")
+        return
+    elif args.command == "status":
+        print_status(args.job_dir)
+        return
+
+    sink = None
+    if args.results_dir:
+        from utils.result_sink import ResultSink
+        with ShardQueue(queue_path(args.job_dir)) as queue:
+            top_k = queue.metadata().get("top_k", 5)
+        sink = ResultSink(args.results_dir, top_k=top_k, num_classes=get_config().num_classes)
+    try:
+        count = merge_outputs(args.job_dir, args.output, sink=sink)
+    except RuntimeError as e:
+        print(f"❌ Cannot merge: {e}")
+        print_status(args.job_dir)
+        sys.exit(1)
+    print(f"✅ Merged {count} results into {args.output}")
+    if sink is not None:
+        from utils.result_sink import format_summary
+        print(f"Compact results and summary in {args.results_dir}/")
+        for line in format_summary(sink.close()):
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
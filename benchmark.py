@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Latency benchmark for the model's execution modes.
+
+Loads the checkpoint once, builds each execution mode from it (eager,
+optimized eager, TorchScript and torch.compile), checks that its logits
+match eager fp32 and reports per-batch latency and build time.
+
+Usage:
+    python benchmark.py --checkpoint models/acc1=76.2100.ckpt
+    python benchmark.py --batch_sizes 1,8,32 --iters 20 --output bench.json
+    python benchmark.py --modes eager,compiled --compile_cache_dir compile_cache
+
+Real images from a tensor cache (also compares decoding against the cache):
+    python benchmark.py --tensor_cache cache/val --batch_sizes 1,8,32
+
+Checkpoint loading (load time and peak RSS, each in a fresh process):
+    python benchmark.py --load_checkpoints models/acc1=76.2100.ckpt models/weights.pth
+
+Upload-to-tensor path (time and allocations per upload, previous vs single decode):
+    python benchmark.py --upload_sizes 640x480,1920x1080,4000x3000
+"""
+import argparse
+import contextlib
+import copy
+import io
+import json
+import multiprocessing
+import resource
+import sys
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+from torch.profiler import ProfilerActivity, profile
+
+from utils.image_processor import preprocess_image
+from utils.model_loader import checkpoint_format, load_checkpoint, load_model, supports_mmap_load
+from utils.optimization import (
+    CompiledModel,
+    compare_logits,
+    compile_for_inference,
+    logits_match,
+    measure_latency,
+    optimize_for_inference,
+    sample_inputs,
+    script_for_inference
+)
+from utils.tensor_cache import TensorCache
+from utils.upload_buffer import UploadBuffer, as_rgb, open_upload, preview_image
+
+MODES = ("eager", "optimized_eager", "torchscript", "compiled")
+
+
+def build_modes(model, names=MODES, batch_sizes=(1, 8), compile_cache_dir=None):
+    """
+    Build every requested execution mode.
+
+    Returns:
+        dict: {name: (model, build_s)}; modes that cannot be built on this
+              setup (e.g. torch.compile falling back to eager) are left out
+    """
+    builders = {
+        "eager": lambda: model,
+        "optimized_eager": lambda: optimize_for_inference(copy.deepcopy(model), verify=False),
+        "torchscript": lambda: script_for_inference(model),
+        "compiled": lambda: compile_for_inference(copy.deepcopy(model), batch_sizes=batch_sizes,
+                                                  cache_dir=compile_cache_dir)
+    }
+    modes = {}
+    for name in names:
+        start = time.perf_counter()
+        try:
+            mode_model = builders[name]()
+        except Exception as e:
+            print(f"Skipping {name}: {e}")
+            continue
+        if name == "compiled" and not isinstance(mode_model, CompiledModel):
+            print("Skipping compiled: torch.compile is not available")
+            continue
+        modes[name] = (mode_model, time.perf_counter() - start)
+    return modes
+
+
+def benchmark_input_pipeline(cache, limit=256, batch_size=32):
+    """
+    Images per second for decoding the cache's source files versus reading
+    and normalizing the same images from the cache.
+    """
+    rows = [row for row in range(len(cache)) if cache.ok[row]][:limit]
+    start = time.perf_counter()
+    for row in rows:
+        with Image.open(cache.paths[row]) as image:
+            preprocess_image(image.convert('RGB'))
+    decode_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for offset in range(0, len(rows), batch_size):
+        cache.batch(rows[offset:offset + batch_size])
+    cache_s = time.perf_counter() - start
+
+    return {
+        "images": len(rows),
+        "decode_images_per_s": len(rows) / decode_s,
+        "cache_images_per_s": len(rows) / cache_s
+    }
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def measure_load(model_path):
+    """
+    Load a checkpoint and report time and memory (run in a fresh process,
+    since peak RSS can only grow within a process).
+    """
+    baseline_mb = _peak_rss_mb()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        model = load_model(model_path)
+    load_s = time.perf_counter() - start
+    peak_mb = _peak_rss_mb()
+    params_mb = sum(t.numel() * t.element_size() for t in model.state_dict().values()) / (1024 * 1024)
+    del model
+
+    return {
+        "checkpoint": model_path,
+        "format": checkpoint_format(load_checkpoint(model_path)),
+        "mmap": supports_mmap_load(),
+        "load_s": load_s,
+        "baseline_rss_mb": baseline_mb,
+        "peak_rss_mb": peak_mb,
+        "peak_over_baseline_mb": peak_mb - baseline_mb,
+        "model_mb": params_mb
+    }
+
+
+def benchmark_loading(paths):
+    """Measure each checkpoint in its own spawned process."""
+    context = multiprocessing.get_context("spawn")
+    results = []
+    print(f"\n{'='*88}")
+    print(f"{'checkpoint':32s} {'format':17s} {'load s':>8s} {'peak RSS':>10s} {'over base':>10s} {'model':>8s}")
+    print(f"{'='*88}")
+    for path in paths:
+        with context.Pool(1) as pool:
+            result = pool.apply(measure_load, (path,))
+        results.append(result)
+        print(f"{path[-32:]:32s} {result['format']:17s} {result['load_s']:8.2f} "
+              f"{result['peak_rss_mb']:8.0f}MB {result['peak_over_baseline_mb']:8.0f}MB "
+              f"{result['model_mb']:6.0f}MB")
+    print(f"{'='*88}")
+    print(f"Memory-mapped loading: {'yes' if supports_mmap_load() else 'no (requires torch >= 2.1)'}")
+    return results
+
+
+def previous_upload_path(uploaded_file, preview_size=256):
+    """The app's upload handling before the single-decode buffer, for comparison."""
+    with Image.open(io.BytesIO(uploaded_file.getvalue())) as source:
+        source.convert('RGB')  # shown with st.image
+        input_tensor = preprocess_image(source.convert('RGB'))
+    with Image.open(io.BytesIO(uploaded_file.getvalue())) as image:  # grid preview
+        preview = image.convert('RGB')
+    preview.thumbnail((preview_size, preview_size))
+    preview.save(io.BytesIO(), format="JPEG", quality=80)
+    return input_tensor
+
+
+def single_decode_upload_path(uploaded_file, buffer, preview_size=256):
+    """The app's upload handling: one decode into a reserved UploadBuffer slot."""
+    with open_upload(uploaded_file) as source:
+        image = as_rgb(source)
+        with buffer.reserve() as fill:
+            input_tensor = fill(image)
+        preview_image(image, preview_size).save(io.BytesIO(), format="JPEG", quality=80)
+    return input_tensor
+
+
+def make_upload(width, height):
+    """JPEG bytes of a noisy gradient (compresses like a photo, unlike pure noise)."""
+    rng = np.random.default_rng(0)
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    pixels = np.clip(gradient + rng.normal(0, 20, (height, width, 3)), 0, 255).astype(np.uint8)
+    encoded = io.BytesIO()
+    Image.fromarray(pixels).save(encoded, format="JPEG", quality=90)
+    return encoded.getvalue()
+
+
+def measure_upload_path(name, data, size, count=20):
+    """
+    Time and allocations per upload of one path (run in a fresh process).
+
+    Pillow images are counted with Pillow's allocator statistics and torch
+    tensor memory with the profiler.
+    """
+    uploaded_file = io.BytesIO(data)
+    buffer = UploadBuffer(slots=1)
+    run = (lambda: previous_upload_path(uploaded_file)) if name == "previous" else \
+        (lambda: single_decode_upload_path(uploaded_file, buffer))
+
+    run()
+    start = time.perf_counter()
+    for _ in range(count):
+        run()
+    per_image_ms = (time.perf_counter() - start) / count * 1000
+
+    Image.core.reset_stats()
+    with profile(activities=[ProfilerActivity.CPU], profile_memory=True) as prof:
+        run()
+    pil_images = Image.core.get_stats()["new_count"]
+    torch_mb = sum(event.cpu_memory_usage for event in prof.events()
+                   if event.cpu_memory_usage > 0) / (1024 * 1024)
+
+    return {
+        "path": name,
+        "size": size,
+        "file_kb": len(data) / 1024,
+        "ms_per_image": per_image_ms,
+        "pil_images_per_upload": pil_images,
+        "torch_mb_per_upload": torch_mb
+    }
+
+
+def benchmark_upload_paths(sizes, count=20):
+    """Compare both upload paths per image size, each in its own spawned process."""
+    context = multiprocessing.get_context("spawn")
+    results = []
+    print(f"\n{'='*60}")
+    print(f"{'size':>10s} {'path':>14s} {'ms/image':>9s} {'PIL images':>11s} {'torch MB':>9s}")
+    print(f"{'='*60}")
+    for width, height in sizes:
+        data = make_upload(width, height)
+        for name in ("previous", "single_decode"):
+            with context.Pool(1) as pool:
+                result = pool.apply(measure_upload_path, (name, data, f"{width}x{height}", count))
+            results.append(result)
+            print(f"{result['size']:>10s} {name:>14s} {result['ms_per_image']:9.1f} "
+                  f"{result['pil_images_per_upload']:11d} {result['torch_mb_per_upload']:9.2f}")
+    print(f"{'='*60}")
+    print("Per upload: Pillow images allocated and torch tensor memory allocated.")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark model execution modes")
+    parser.add_argument("--checkpoint", type=str, default=None,
+                        help="Path to model checkpoint (optional, uses pretrained if not provided)")
+    parser.add_argument("--batch_sizes", type=str, default="1,8",
+                        help="Comma separated batch sizes")
+    parser.add_argument("--warmup", type=int, default=3,
+                        help="Warmup iterations per batch size")
+    parser.add_argument("--iters", type=int, default=10,
+                        help="Timed iterations per batch size")
+    parser.add_argument("--modes", type=str, default=",".join(MODES),
+                        help=f"Comma separated execution modes ({', '.join(MODES)})")
+    parser.add_argument("--compile_cache_dir", type=str, default=None,
+                        help="Persistent torch.compile cache (default: compile_cache/ "
+                             "or $TORCHINDUCTOR_CACHE_DIR)")
+    parser.add_argument("--tensor_cache", type=str, default=None,
+                        help="Use real images from this tensor cache (see cache_images.py)")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="torch.set_num_threads value (default: torch default)")
+    parser.add_argument("--load_checkpoints", type=str, nargs="+", default=None,
+                        help="Only measure load time and peak RSS of these checkpoints")
+    parser.add_argument("--upload_sizes", type=str, default=None,
+                        help="Only compare the upload-to-tensor paths at these comma "
+                             "separated WIDTHxHEIGHT sizes")
+    parser.add_argument("--output", type=str, default=None,
+                        help="Write results as JSON")
+    args = parser.parse_args()
+
+    if args.load_checkpoints or args.upload_sizes:
+        if args.load_checkpoints:
+            results = benchmark_loading(args.load_checkpoints)
+        else:
+            sizes = [tuple(int(v) for v in size.lower().split("x"))
+                     for size in args.upload_sizes.split(",")]
+            results = benchmark_upload_paths(sizes)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=2)
+            print(f"\nResults saved to: {args.output}")
+        return
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    model = load_model(args.checkpoint)
+    device = next(model.parameters()).device
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+    modes = build_modes(model, args.modes.split(","), batch_sizes, args.compile_cache_dir)
+
+    parity_inputs = sample_inputs(device=device)
+    with torch.no_grad():
+        reference = model(parity_inputs)
+
+    results = {"checkpoint": args.checkpoint or "pretrained",
+               "threads": torch.get_num_threads(), "modes": {}}
+
+    cache = TensorCache(args.tensor_cache) if args.tensor_cache else None
+    if cache is not None:
+        results["input_pipeline"] = benchmark_input_pipeline(cache)
+        pipeline = results["input_pipeline"]
+        print(f"\nInput pipeline over {pipeline['images']} images: "
+              f"decode {pipeline['decode_images_per_s']:.0f} img/s, "
+              f"tensor cache {pipeline['cache_images_per_s']:.0f} img/s")
+
+    print(f"\n{'='*72}")
+    print(f"{'mode':18s} {'batch':>5s} {'mean ms':>10s} {'p50 ms':>10s} {'img/s':>10s} {'speedup':>8s}")
+    print(f"{'='*72}")
+
+    for name, (mode_model, build_s) in modes.items():
+        with torch.no_grad():
+            parity = compare_logits(reference, mode_model(parity_inputs))
+        entry = {"parity": parity, "parity_ok": logits_match(parity), "build_s": build_s,
+                 "latency": {}}
+
+        for batch_size in batch_sizes:
+            if cache is not None and len(cache) >= batch_size:
+                inputs = cache.batch(range(batch_size), device=device)
+            else:
+                inputs = sample_inputs(batch_size, device=device, seed=batch_size)
+            latency = measure_latency(mode_model, inputs, warmup=args.warmup, iters=args.iters)
+            entry["latency"][batch_size] = latency
+
+            baseline = results["modes"].get("eager", entry)["latency"].get(batch_size, latency)
+            speedup = baseline["mean_ms"] / latency["mean_ms"]
+            print(f"{name:18s} {batch_size:5d} {latency['mean_ms']:10.1f} "
+                  f"{latency['p50_ms']:10.1f} {latency['images_per_s']:10.1f} {speedup:7.2f}x")
+
+        results["modes"][name] = entry
+
+    print(f"{'='*72}")
+    print("Logit parity vs eager fp32 (and time to build each mode):")
+    for name, entry in results["modes"].items():
+        parity = entry["parity"]
+        status = "✅" if entry["parity_ok"] else "❌"
+        print(f"  {status} {name:18s} max abs diff {parity['max_abs_diff']:.2e}  "
+              f"top-1 agreement {parity['top1_agreement']:.0%}  build {entry['build_s']:.1f}s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
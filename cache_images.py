@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Pre-decode an image set into a memory-mapped tensor cache.
+
+Every image is decoded, resized to 256 and center-cropped to 224 once and
+stored as uint8 (see utils/tensor_cache.py). Batch classification and the
+benchmark can then read the cache instead of decoding the images again.
+
+Usage:
+    python cache_images.py --images /data/imagenet/val --cache_dir cache/val --workers 8
+    python batch_classify.py run --manifest /data/imagenet/val --tensor_cache cache/val ...
+    python benchmark.py --tensor_cache cache/val
+"""
+import argparse
+import sys
+import time
+
+from batch_classify import read_manifest
+from utils.tensor_cache import build_tensor_cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a memory-mapped tensor cache")
+    parser.add_argument("--images", type=str, required=True,
+                        help="Text file with one image path per line, or a directory")
+    parser.add_argument("--cache_dir", type=str, required=True,
+                        help="Output directory for tensors.npy and index.json")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Decode processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true",
+                        help="Rebuild even if the cache is up to date")
+    args = parser.parse_args()
+
+    paths = read_manifest(args.images)
+    print(f"Caching {len(paths)} images into {args.cache_dir}/ ...")
+    start_time = time.time()
+    cache = build_tensor_cache(paths, args.cache_dir, workers=args.workers, force=args.force)
+    elapsed = time.time() - start_time
+
+    failed = [item for item in cache.items if not item["ok"]]
+    for item in failed[:10]:
+        print(f"✗ {item['path']}: {item.get('error', 'missing')}")
+    size_mb = cache.array.nbytes / (1024 * 1024)
+    print(f"{'='*60}")
+    print(f"Cached {len(cache) - len(failed)}/{len(cache)} images ({size_mb:.0f} MB) "
+          f"in {elapsed:.1f}s")
+    print(f"{'='*60}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
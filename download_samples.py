@@ -1,68 +1,93 @@
-#\!/usr/bin/env python3
-"""Download sample images from ImageNet sample repository"""
+#!/usr/bin/env python3
+"""Download sample images from ImageNet sample repository
 
+Downloads run concurrently over a pooled connection, resume partial files,
+skip files that are already up to date and verify each file against the
+checksums in the manifest (see utils/asset_fetcher.py). Assets without a
+recorded sha256 are refused; --update_manifest downloads them anyway (only
+checking that they decode) and records their digests in the manifest.
+
+Usage:
+    python download_samples.py
+    python download_samples.py --output /app/images --workers 8
+    python download_samples.py --update_manifest  # record checksums of new assets
+"""
+
+import argparse
 import os
-import requests
-from pathlib import Path
-
-# Sample images to download (10 diverse images)
-SAMPLE_IMAGES = [
-    "n01440764_tench.JPEG",
-    "n01443537_goldfish.JPEG", 
-    "n01484850_great_white_shark.JPEG",
-    "n01491361_tiger_shark.JPEG",
-    "n01494475_hammerhead.JPEG",
-    "n01496331_electric_ray.JPEG",
-    "n01498041_stingray.JPEG",
-    "n01514668_cock.JPEG",
-    "n01514859_hen.JPEG",
-    "n01518878_ostrich.JPEG"
-]
-
-BASE_URL = "https://raw.githubusercontent.com/EliSchwartz/imagenet-sample-images/master/"
+import sys
+
+from PIL import Image
+
+from utils.asset_fetcher import AssetFetcher, load_manifest, save_manifest
+
+MANIFEST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "images", "manifest.json")
 OUTPUT_DIR = "images"
 
-def download_sample_images():
-    """Download sample images from GitHub"""
-    
-    # Create output directory
-    Path(OUTPUT_DIR).mkdir(exist_ok=True)
-    
-    print(f"Downloading {len(SAMPLE_IMAGES)} sample images...")
-    print(f"Output directory: {OUTPUT_DIR}/")
+
+def validate_image(path):
+    """Reject files that are not decodable images (e.g. HTML error pages)."""
+    with Image.open(path) as image:
+        image.verify()
+
+
+def download_sample_images(manifest_path=MANIFEST_PATH, output_dir=OUTPUT_DIR, workers=8,
+                           update_manifest=False):
+    """Download sample images listed in the manifest
+
+    Returns:
+        bool: True if every asset is present and verified
+    """
+    manifest = load_manifest(manifest_path)
+    assets = manifest["assets"]
+
+    print(f"Downloading {len(assets)} sample images with {workers} workers...")
+    print(f"Output directory: {output_dir}/")
     print()
-    
-    success_count = 0
-    for filename in SAMPLE_IMAGES:
-        url = BASE_URL + filename
-        output_path = os.path.join(OUTPUT_DIR, filename)
-        
-        # Skip if already exists
-        if os.path.exists(output_path):
-            print(f"✓ {filename} (already exists)")
-            success_count += 1
-            continue
-        
-        try:
-            print(f"⬇ Downloading {filename}...", end=" ")
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            
-            with open(output_path, 'wb') as f:
-                f.write(response.content)
-            
-            file_size = os.path.getsize(output_path) / 1024  # KB
-            print(f"✓ ({file_size:.1f} KB)")
-            success_count += 1
-            
-        except Exception as e:
-            print(f"✗ Failed: {e}")
-    
+
+    def report(result):
+        if result.status == "skipped":
+            print(f"✓ {result.name} (already up to date)")
+        elif result.status == "downloaded":
+            print(f"✓ {result.name} ({result.bytes / 1024:.1f} KB)")
+        else:
+            print(f"✗ {result.name} failed: {result.error}")
+
+    fetcher = AssetFetcher(output_dir, workers=workers, validate=validate_image,
+                           require_checksum=not update_manifest)
+    results = fetcher.fetch_all(assets, progress=report)
+    success_count = sum(result.status != "failed" for result in results)
+
+    if update_manifest:
+        updated = 0
+        for asset, result in zip(assets, results):
+            if result.status == "downloaded" and not asset.get("sha256"):
+                asset["sha256"] = result.sha256
+                asset["size"] = result.bytes
+                updated += 1
+        save_manifest(manifest, manifest_path)
+        print(f"\nRecorded checksums for {updated} assets in {manifest_path}")
+
     print()
     print(f"{'='*60}")
-    print(f"Downloaded {success_count}/{len(SAMPLE_IMAGES)} images successfully")
-    print(f"Location: {os.path.abspath(OUTPUT_DIR)}/")
+    print(f"Downloaded {success_count}/{len(assets)} images successfully")
+    print(f"Location: {os.path.abspath(output_dir)}/")
     print(f"{'='*60}")
+    return success_count == len(assets)
+
 
 if __name__ == "__main__":
-    download_sample_images()
+    parser = argparse.ArgumentParser(description="Download sample images")
+    parser.add_argument("--manifest", type=str, default=MANIFEST_PATH,
+                        help="Asset manifest (JSON)")
+    parser.add_argument("--output", type=str, default=OUTPUT_DIR,
+                        help="Output directory")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="Concurrent downloads")
+    parser.add_argument("--update_manifest", action="store_true",
+                        help="Also download assets that have no sha256 yet (only checking that "
+                             "they decode) and record their sha256/size in the manifest")
+    args = parser.parse_args()
+
+    ok = download_sample_images(args.manifest, args.output, args.workers, args.update_manifest)
+    sys.exit(0 if ok else 1)
@@ -5,110 +5,726 @@ Can be used independently of the Streamlit app.
 
 Usage:
     python inference.py --image path/to/image.jpg --checkpoint path/to/checkpoint.ckpt
-    python inference.py --image path/to/image.jpg  # Uses pretrained model
+    python inference.py --image path/to/image.jpg  # config.yaml default_model_path, else pretrained
+
+Daemon mode (model stays loaded between calls):
+    python inference.py --serve --detach --checkpoint path/to/checkpoint.ckpt
+    python inference.py --image a.jpg b.jpg --checkpoint path/to/checkpoint.ckpt
+    find images -name '*.JPEG' | python inference.py --image - --jsonl
+    python inference.py --stop
+
+Inference backends ('auto' uses the fastest one whose logits match eager fp32):
+    python inference.py --image path/to/image.jpg --backend torchscript
+    python inference.py --serve --detach --backend auto
+
+Performance profiles from config.yaml (backend, precision, batch size, threads, ...):
+    python inference.py --image - --perf_profile throughput --jsonl < paths.txt
+    IMAGENET_PROFILE=latency python inference.py --serve --detach
+
+Multi-frame inputs (animated GIF/WebP, multi-page TIFF, directories of numbered frames):
+    python inference.py --image clip.gif --frames --frame_stride 2 --jsonl
+
+Shadow comparison of a candidate checkpoint against the current one:
+    python inference.py --image - --checkpoint "models/acc1=76.2100.ckpt" \
+        --shadow_checkpoint models/candidate.ckpt --jsonl < paths.txt
+
+Archives (tar, tar.gz, zip, WebDataset shards), read without extraction:
+    python inference.py --image val.tar.gz --jsonl > val.jsonl
+    python inference.py --image "shards/train-{000000..000099}.tar" --decode_workers 8 \
+        --results_dir results/train
+
+Watch a folder: classify only new or changed files, drop deleted ones
+(index and results in <folder>/.classify_index.db):
+    python inference.py --watch /shared/incoming --watch_interval 60 --output incoming.json
+
+Tiled mode for large images (overlapping 224px windows, per-class heatmaps):
+    python inference.py --image aerial.tif --tiled --tile_scales 1.0,0.5 --heatmap_dir heatmaps/
+
+When a daemon serving the same checkpoint is listening on --socket, requests
+are forwarded to it; otherwise the model is loaded in-process.
 """
 import argparse
-import torch
-from PIL import Image
+import contextlib
 import json
+import os
+import subprocess
+import sys
+import time
 
-from utils.model_loader import load_model, get_model_info
-from utils.image_processor import preprocess_image, get_top_predictions
+from utils.archive_names import is_archive
+from utils.config import BACKEND_NAMES, ConfigError, apply_profile, get_config, select_profile
+from utils.inference_client import (
+    DEFAULT_SOCKET_PATH,
+    DaemonUnavailable,
+    InferenceClient
+)
 
 
-def main():
-    parser = argparse.ArgumentParser(description="ImageNet Model Inference")
-    parser.add_argument("--image", type=str, required=True,
-                        help="Path to input image")
-    parser.add_argument("--checkpoint", type=str, default=None,
-                        help="Path to model checkpoint (optional, uses pretrained if not provided)")
-    parser.add_argument("--top_k", type=int, default=5,
-                        help="Number of top predictions to show")
-    parser.add_argument("--threshold", type=float, default=0.0,
-                        help="Confidence threshold (0-1)")
-    parser.add_argument("--output", type=str, default=None,
-                        help="Output JSON file path (optional)")
-    parser.add_argument("--verbose", action="store_true",
-                        help="Print model information")
-    
-    args = parser.parse_args()
-    
-    # Load model
-    print(f"\n{'='*60}")
-    print("Loading model...")
-    print(f"{'='*60}")
-    model = load_model(args.checkpoint)
-    
+def iter_image_paths(images):
+    """Yield image paths from the command line, reading stdin for '-'."""
+    for image in images:
+        if image == "-":
+            for line in sys.stdin:
+                line = line.strip()
+                if line:
+                    yield line
+        else:
+            yield image
+
+
+def model_options(args):
+    """load_model keyword arguments for the execution flags and performance profile."""
+    if args.optimize or args.compile:
+        return {"optimize": args.optimize, "compile_model": args.compile}
+    backend = args.backend or args.perf.backend
+    if not args.backend and backend == "eager" and args.perf.precision == "fp32":
+        # The plain eager model: wrapping it would only add a warmup to one-off runs
+        backend = None
+    return {"backend": backend, "precision": args.perf.precision}
+
+
+def classify_locally(args, image_paths):
+    """Load the model in-process and classify each image (or archive member)."""
+    from utils.model_loader import load_model, get_model_info
+    from utils.inference_server import classify_path
+    from utils.archive_names import expand_shards
+    from utils.archives import ArchiveDecoder, classify_archive
+
+    log = sys.stderr if args.jsonl else sys.stdout
+
+    print(f"\n{'='*60}", file=log)
+    print("Loading model...", file=log)
+    print(f"{'='*60}", file=log)
+    with contextlib.redirect_stdout(log):
+        apply_profile(args.perf)
+        model = load_model(args.checkpoint, **model_options(args))
+
     if args.verbose:
         info = get_model_info(model)
-        print(f"\nModel Information:")
-        print(f"  Type: {info['model_type']}")
-        print(f"  Total parameters: {info['total_parameters']:,}")
-        print(f"  Trainable parameters: {info['trainable_parameters']:,}")
-        print(f"  Device: {info['device']}")
-    
-    # Load and preprocess image
-    print(f"\n{'='*60}")
-    print(f"Processing image: {args.image}")
-    print(f"{'='*60}")
-    
+        print(f"\nModel Information:", file=log)
+        print(f"  Type: {info['model_type']}", file=log)
+        print(f"  Total parameters: {info['total_parameters']:,}", file=log)
+        print(f"  Trainable parameters: {info['trainable_parameters']:,}", file=log)
+        print(f"  Device: {info['device']}", file=log)
+
+    profile_run = None
+    if args.profile:
+        from utils.profiling import ProfileRun
+        profile_run = ProfileRun(
+            output_dir=args.profile_dir,
+            name="cli",
+            metadata={
+                "source": "inference.py",
+                "checkpoint": args.checkpoint if args.checkpoint else "pretrained",
+                "top_k": args.top_k,
+                "threshold": args.threshold,
+                "images": []
+            }
+        )
+        profile_run.__enter__()
+
+    decoder = None
+    try:
+        for image_path in image_paths:
+            if profile_run is not None:
+                profile_run.metadata["images"].append(image_path)
+            if is_archive(image_path):
+                if decoder is None:
+                    decoder = ArchiveDecoder(workers=args.decode_workers)
+                for shard in expand_shards(image_path):
+                    try:
+                        yield from classify_archive(
+                            model, shard, decoder, top_k=args.top_k, threshold=args.threshold,
+                            batch_size=args.batch_size, device=next(model.parameters()).device
+                        )
+                    except Exception as e:
+                        yield {"image": shard, "error": str(e)}
+                continue
+            try:
+                if args.frames:
+                    yield from classify_frames_path(model, image_path, args)
+                elif args.tiled:
+                    yield classify_tiled_path(model, image_path, args)
+                else:
+                    yield classify_path(model, image_path, top_k=args.top_k, threshold=args.threshold)
+            except Exception as e:
+                yield {"image": image_path, "error": str(e)}
+    finally:
+        if decoder is not None:
+            decoder.close()
+        if profile_run is not None:
+            profile_run.__exit__(None, None, None)
+            print(f"\nOperators by self CPU time:\n{profile_run.cpu_table}", file=log)
+            print(f"Profile saved to: {profile_run.run_dir}", file=log)
+
+
+def classify_tiled_path(model, image_path, args):
+    """Classify one image with tiled inference and optionally save heatmaps."""
+    from PIL import Image
+    from utils.tiling import classify_tiled, heatmap_overlay
+
+    image = Image.open(image_path).convert('RGB')
+    device = next(model.parameters()).device
+    tiled = classify_tiled(
+        model, image,
+        top_k=args.top_k,
+        threshold=args.threshold,
+        overlap=args.tile_overlap,
+        scales=tuple(float(s) for s in args.tile_scales.split(",")),
+        batch_size=args.batch_size,
+        device=device
+    )
+
+    result = {
+        "image": image_path,
+        "image_size": list(image.size),
+        "tiles": tiled["num_tiles"],
+        "predictions": [
+            {"rank": i + 1, "class": class_name, "class_index": class_idx,
+             "confidence": float(confidence), "mean_confidence": mean_confidence}
+            for i, ((class_name, confidence), class_idx, mean_confidence)
+            in enumerate(zip(tiled["predictions"], tiled["class_indices"], tiled["mean_confidences"]))
+        ],
+        "inference_time_ms": tiled["inference_time"] * 1000
+    }
+
+    if args.heatmap_dir:
+        os.makedirs(args.heatmap_dir, exist_ok=True)
+        stem = os.path.splitext(os.path.basename(image_path))[0]
+        result["heatmaps"] = []
+        for rank, class_idx in enumerate(tiled["class_indices"], 1):
+            path = os.path.join(args.heatmap_dir, f"{stem}_top{rank}_class{class_idx}.png")
+            heatmap_overlay(image, tiled["heatmaps"][class_idx]).save(path)
+            result["heatmaps"].append(path)
+
+    return result
+
+
+def ranked(predictions):
+    return [
+        {"rank": i + 1, "class": class_name, "confidence": float(confidence)}
+        for i, (class_name, confidence) in enumerate(predictions)
+    ]
+
+
+def classify_frames_path(model, source, args):
+    """Stream per-frame results for a multi-frame source, then a summary."""
+    import time
+    from utils.frames import FrameClassifier, count_frames, iter_frames
+
+    start_time = time.time()
+    classifier = FrameClassifier(
+        model,
+        top_k=args.top_k,
+        threshold=args.threshold,
+        batch_size=args.batch_size,
+        smoothing=args.smoothing,
+        device=next(model.parameters()).device
+    )
+    frames = iter_frames(source, stride=args.frame_stride, skip=args.frame_skip,
+                         max_frames=args.max_frames)
+
+    for frame_result in classifier.classify(frames):
+        yield {
+            "image": source,
+            "frame": frame_result["frame"],
+            "predictions": ranked(frame_result["predictions"]),
+            "smoothed_predictions": ranked(frame_result["smoothed_predictions"])
+        }
+
+    yield {
+        "image": source,
+        "total_frames": count_frames(source),
+        "frames_classified": classifier.frames_seen,
+        "predictions": ranked(classifier.summary()),
+        "inference_time_ms": (time.time() - start_time) * 1000
+    }
+
+
+def run_shadow(args, image_paths):
+    """Compare --shadow_checkpoint against --checkpoint on the same preprocessed batches."""
+    from utils.model_loader import load_model
+    from utils.shadow import ShadowComparison, compare_images, format_comparison
+
+    log = sys.stderr if args.jsonl else sys.stdout
+
+    print(f"\n{'='*60}", file=log)
+    print("Loading current and candidate models...", file=log)
+    print(f"{'='*60}", file=log)
+    with contextlib.redirect_stdout(log):
+        apply_profile(args.perf)
+        baseline = load_model(args.checkpoint, **model_options(args))
+        candidate = load_model(args.shadow_checkpoint, **model_options(args))
+
+    comparison = ShadowComparison()
+    images = ((path, path) for path in image_paths)
+    try:
+        for row in compare_images(baseline, candidate, images, comparison,
+                                  batch_size=args.batch_size):
+            if args.jsonl:
+                print(json.dumps(row), flush=True)
+            elif "error" in row:
+                print(f"❌ {row['image']}: {row['error']}")
+            elif args.verbose or not row["agree"]:
+                marker = "✅" if row["agree"] else "🔀"
+                print(f"{marker} {row['image']}: {row['baseline']['class']} "
+                      f"({row['baseline']['confidence']:.2%}) -> {row['candidate']['class']} "
+                      f"({row['candidate']['confidence']:.2%})"
+                      f"  [agreement so far {comparison.agreement_rate:.2%}]")
+    except ValueError as e:
+        # Checkpoints with different class counts cannot be compared
+        print(f"❌ Shadow comparison failed: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    summary = comparison.summary()
+    print(f"\n{'='*60}", file=log)
+    print(f"Shadow comparison: {args.shadow_checkpoint} vs "
+          f"{args.checkpoint if args.checkpoint else 'pretrained'}", file=log)
+    print(f"{'='*60}", file=log)
+    for line in format_comparison(summary):
+        print(line, file=log)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "checkpoint": args.checkpoint if args.checkpoint else "pretrained",
+                "shadow_checkpoint": args.shadow_checkpoint,
+                **summary
+            }, f, indent=2)
+        print(f"Comparison saved to: {args.output}\n", file=log)
+
+
+def run_watch(args):
+    """Classify --watch incrementally, once or every --watch_interval seconds."""
+    from utils.archives import ArchiveDecoder
+    from utils.folder_watch import FolderIndex, FolderWatcher, format_pass
+
+    log = sys.stderr if args.jsonl else sys.stdout
+    index_path = args.watch_index or os.path.join(args.watch, ".classify_index.db")
+
+    def load():
+        # torch is only imported once a pass has something to classify
+        from utils.model_loader import load_model
+
+        print(f"\n{'='*60}", file=log)
+        print("Loading model...", file=log)
+        print(f"{'='*60}", file=log)
+        with contextlib.redirect_stdout(log):
+            apply_profile(args.perf)
+            return load_model(args.checkpoint, **model_options(args))
+
+    with FolderIndex(index_path) as index, \
+            ArchiveDecoder(workers=args.decode_workers) as decoder:
+        watcher = FolderWatcher(
+            args.watch, index, load, decoder,
+            checkpoint=args.checkpoint,
+            top_k=args.top_k,
+            threshold=args.threshold,
+            batch_size=args.batch_size,
+            min_age_s=args.watch_settle
+        )
+        if watcher.invalidated:
+            print("top_k/threshold changed: every file will be classified again", file=log)
+        passes = 0
+        while True:
+            passes += 1
+            for result in watcher.run_pass():
+                if args.jsonl:
+                    print(json.dumps(result), flush=True)
+                elif result["status"] == "deleted":
+                    print(f"🗑️  Removed: {result['image']}")
+                else:
+                    print_result(result, args)
+            stats = watcher.last_pass
+            print(f"🔄 Pass {passes}: {format_pass(stats)}", file=log)
+
+            changed = stats["new"] + stats["changed"] + stats["reused"] + stats["deleted"]
+            if args.output and (changed or passes == 1):
+                part_path = args.output + ".part"
+                output = JsonOutput(part_path)
+                for result in index.results():
+                    output.add(result)
+                output.close()
+                os.replace(part_path, args.output)
+                print(f"Results saved to: {args.output} ({output.count} images)", file=log)
+
+            if args.watch_interval <= 0:
+                return
+            time.sleep(args.watch_interval)
+
+
+def classify_with_daemon(args, image_paths):
+    """Forward requests to a running daemon, or return None if there is none."""
+    if args.no_daemon or args.profile or args.tiled or args.frames:
+        return None
+    if any(is_archive(image) for image in args.image):
+        # Archive members are decoded in local worker processes
+        return None
+
+    client = InferenceClient(args.socket)
     try:
-        image = Image.open(args.image).convert('RGB')
-        print(f"Image size: {image.size[0]} x {image.size[1]} pixels")
-    except Exception as e:
-        print(f"Error loading image: {e}")
+        client.connect()
+        # Only use a daemon running the same execution mode as these flags
+        client.ping(args.checkpoint, model_options(args))
+    except DaemonUnavailable as e:
+        client.close()
+        if args.verbose:
+            print(f"Daemon not used: {e}", file=sys.stderr)
+        return None
+
+    def results():
+        try:
+            yield from client.classify_stream(
+                image_paths, top_k=args.top_k, threshold=args.threshold
+            )
+        finally:
+            client.close()
+
+    return results()
+
+
+# Per-frame, frame summary and tiled fields that --output keeps next to the predictions
+OUTPUT_DETAIL_FIELDS = ("frame", "smoothed_predictions", "total_frames", "frames_classified",
+                        "tiles", "heatmaps")
+
+
+def output_entry(result, checkpoint):
+    """The --output entry for a result."""
+    entry = {"image": result["image"], "checkpoint": checkpoint if checkpoint else "pretrained"}
+    entry.update((key, result[key]) for key in OUTPUT_DETAIL_FIELDS if key in result)
+    entry["predictions"] = result["predictions"]
+    return entry
+
+
+class JsonOutput:
+    """
+    Writes --output results as they arrive instead of collecting them.
+
+    A single result is written as one object and several as a list, as
+    before; only the first result is held back to decide which.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "w")
+        self.first = None
+        self.count = 0
+
+    def _write(self, entry):
+        self.file.write(json.dumps(entry, indent=2).replace("\n", "\n  "))
+
+    def add(self, entry):
+        self.count += 1
+        if self.count == 1:
+            self.first = entry
+            return
+        if self.count == 2:
+            self.file.write("[\n  ")
+            self._write(self.first)
+            self.first = None
+        self.file.write(",\n  ")
+        self._write(entry)
+
+    def close(self):
+        if self.count == 1:
+            json.dump(self.first, self.file, indent=2)
+        elif self.count == 0:
+            self.file.write("[]")
+        else:
+            self.file.write("\n]")
+        self.file.close()
+
+
+def print_result(result, args):
+    """Print one result in the human readable format."""
+    if "frame" in result:
+        top = result["predictions"][0] if result["predictions"] else None
+        smoothed = result["smoothed_predictions"][0] if result["smoothed_predictions"] else None
+        line = f"frame {result['frame']:5d}: "
+        line += f"{top['class']:30s} {top['confidence']:6.2%}" if top else f"{'-':37s}"
+        if smoothed:
+            line += f"  | smoothed: {smoothed['class']:30s} {smoothed['confidence']:6.2%}"
+        print(line)
         return
     
-    input_tensor = preprocess_image(image)
-    
-    # Run inference
     print(f"\n{'='*60}")
-    print("Running inference...")
+    print(f"Processing image: {result['image']}")
     print(f"{'='*60}")
-    
-    with torch.no_grad():
-        output = model(input_tensor)
-        probabilities = torch.nn.functional.softmax(output[0], dim=0)
-    
-    # Get predictions
-    predictions = get_top_predictions(
-        probabilities,
-        top_k=args.top_k,
-        threshold=args.threshold
-    )
-    
-    # Display results
+
+    if "error" in result:
+        print(f"Error loading image: {result['error']}")
+        return
+
+    if "image_size" in result:
+        width, height = result["image_size"]
+        print(f"Image size: {width} x {height} pixels")
+    if "frames_classified" in result:
+        print(f"Frames: {result['frames_classified']} of {result['total_frames']} classified "
+              f"(predictions averaged over frames)")
+    if "tiles" in result:
+        print(f"Tiles: {result['tiles']} (confidence = best tile, mean over all tiles in brackets)")
+
     print(f"\n{'='*60}")
     print(f"Top {args.top_k} Predictions:")
     print(f"{'='*60}")
-    
-    if predictions:
-        for idx, (class_name, confidence) in enumerate(predictions, 1):
-            print(f"{idx}. {class_name:40s} {confidence:6.2%}")
+
+    if result["predictions"]:
+        for pred in result["predictions"]:
+            line = f"{pred['rank']}. {pred['class']:40s} {pred['confidence']:6.2%}"
+            if "mean_confidence" in pred:
+                line += f"  ({pred['mean_confidence']:6.2%})"
+            print(line)
+        for path in result.get("heatmaps", []):
+            print(f"Heatmap: {path}")
     else:
         print(f"No predictions above {args.threshold:.0%} confidence threshold")
-    
+
     print(f"{'='*60}\n")
-    
+
+
+def start_daemon(args):
+    """Start the daemon in a detached background process."""
+    command = [sys.executable, os.path.abspath(__file__), "--serve", "--socket", args.socket]
+    if args.checkpoint:
+        command += ["--checkpoint", args.checkpoint]
+    if args.optimize:
+        command.append("--optimize")
+    if args.compile:
+        command.append("--compile")
+    if args.backend:
+        command += ["--backend", args.backend]
+    command += ["--perf_profile", args.perf.name]
+
+    log_path = args.socket + ".log"
+    with open(log_path, "ab") as log:
+        process = subprocess.Popen(
+            command,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            stdin=subprocess.DEVNULL,
+            start_new_session=True
+        )
+
+    # Wait until the model is loaded and the socket accepts connections
+    while process.poll() is None:
+        try:
+            with InferenceClient(args.socket) as client:
+                info = client.ping(args.checkpoint, model_options(args))
+            print(f"Inference daemon started (pid {info['pid']}) on {args.socket}")
+            print(f"Log file: {log_path}")
+            return
+        except DaemonUnavailable:
+            time.sleep(0.2)
+
+    print(f"Inference daemon failed to start, see {log_path}")
+    sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ImageNet Model Inference")
+    parser.add_argument("--image", type=str, nargs="+", default=None,
+                        help="Path(s) to input image(s); use '-' to read paths from stdin")
+    parser.add_argument("--checkpoint", type=str, default=None,
+                        help="Path to model checkpoint (default: config.yaml default_model_path, "
+                             "pretrained if unset or missing)")
+    parser.add_argument("--top_k", type=int, default=None,
+                        help="Number of top predictions to show (default: config.yaml default_top_k)")
+    parser.add_argument("--threshold", type=float, default=None,
+                        help="Confidence threshold (0-1, default: config.yaml "
+                             "default_confidence_threshold)")
+    parser.add_argument("--output", type=str, default=None,
+                        help="Output JSON file path (optional)")
+    parser.add_argument("--results_dir", type=str, default=None,
+                        help="Store results as compact int16/float16 top-k arrays with per-class "
+                             "aggregates in this directory (for very large runs)")
+    parser.add_argument("--jsonl", action="store_true",
+                        help="Write one JSON result per line to stdout")
+    parser.add_argument("--verbose", action="store_true",
+                        help="Print model information")
+    parser.add_argument("--optimize", action="store_true",
+                        help="Use the optimized eager model (BatchNorm folding, channels_last)")
+    parser.add_argument("--compile", action="store_true",
+                        help="Compile the model with torch.compile (cached on disk in compile_cache/, "
+                             "falls back to eager); best with --serve")
+    parser.add_argument("--backend", type=str, default=None, choices=BACKEND_NAMES,
+                        help="Inference backend (default: the performance profile's); 'auto' "
+                             "benchmarks the available backends at startup and uses the fastest "
+                             "whose logits match eager fp32")
+    parser.add_argument("--perf_profile", type=str, default=None,
+                        help="Performance profile from config.yaml, e.g. latency or throughput "
+                             "(default: $IMAGENET_PROFILE, then the config's default_profile)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Profile preprocessing and the forward pass with torch.profiler "
+                             "(always runs in-process)")
+    parser.add_argument("--profile_dir", type=str, default="profiles",
+                        help="Directory for profiler traces")
+
+    parser.add_argument("--batch_size", type=int, default=None,
+                        help="Tiles, frames or archive members per forward pass "
+                             "(default: the performance profile's)")
+    parser.add_argument("--decode_workers", type=int, default=None,
+                        help="Processes decoding archive members (default: the performance "
+                             "profile's; 0 decodes in-process)")
+
+    frames_group = parser.add_argument_group("multi-frame inputs")
+    frames_group.add_argument("--frames", action="store_true",
+                              help="Classify every frame of animated GIF/WebP, multi-page TIFF "
+                                   "or a directory of numbered frames")
+    frames_group.add_argument("--frame_stride", type=int, default=1,
+                              help="Classify every N-th frame")
+    frames_group.add_argument("--frame_skip", type=int, default=0,
+                              help="Skip this many leading frames")
+    frames_group.add_argument("--max_frames", type=int, default=None,
+                              help="Stop after this many classified frames")
+    frames_group.add_argument("--smoothing", type=float, default=0.7,
+                              help="Temporal smoothing (EMA weight of previous frames, 0 disables)")
+
+    shadow_group = parser.add_argument_group("shadow comparison")
+    shadow_group.add_argument("--shadow_checkpoint", type=str, default=None,
+                              help="Also run this candidate checkpoint on the same preprocessed "
+                                   "batches and report where it disagrees with --checkpoint "
+                                   "(flips are printed; --verbose prints every image)")
+
+    watch_group = parser.add_argument_group("watch folder")
+    watch_group.add_argument("--watch", type=str, default=None,
+                             help="Classify the images in this folder (recursively), keeping a "
+                                  "persistent index so later passes only classify new or changed "
+                                  "files and drop deleted ones")
+    watch_group.add_argument("--watch_index", type=str, default=None,
+                             help="Index and results database (default: <folder>/.classify_index.db)")
+    watch_group.add_argument("--watch_interval", type=float, default=0,
+                             help="Seconds between passes (default: 0, a single pass)")
+    watch_group.add_argument("--watch_settle", type=float, default=2.0,
+                             help="Leave files modified less than this many seconds ago for the "
+                                  "next pass (they may still be being copied)")
+
+    tiled_group = parser.add_argument_group("tiled inference")
+    tiled_group.add_argument("--tiled", action="store_true",
+                             help="Classify overlapping 224px tiles instead of one center crop")
+    tiled_group.add_argument("--tile_scales", type=str, default="1.0",
+                             help="Comma separated resize factors to tile at (e.g. 1.0,0.5)")
+    tiled_group.add_argument("--tile_overlap", type=float, default=0.25,
+                             help="Overlap between neighbouring tiles (0-1)")
+    tiled_group.add_argument("--heatmap_dir", type=str, default=None,
+                             help="Save heatmap overlays of the top classes to this directory")
+
+    daemon_group = parser.add_argument_group("daemon")
+    daemon_group.add_argument("--serve", action="store_true",
+                              help="Run the inference daemon in the foreground")
+    daemon_group.add_argument("--detach", action="store_true",
+                              help="With --serve, start the daemon in the background")
+    daemon_group.add_argument("--stop", action="store_true",
+                              help="Stop a running daemon")
+    daemon_group.add_argument("--socket", type=str, default=DEFAULT_SOCKET_PATH,
+                              help="Unix socket of the daemon")
+    daemon_group.add_argument("--no_daemon", action="store_true",
+                              help="Always load the model in-process")
+
+    args = parser.parse_args()
+    if args.backend and (args.optimize or args.compile):
+        parser.error("--backend replaces --optimize and --compile; use one or the other")
+
+    try:
+        config = get_config()
+        args.perf = select_profile(config, args.perf_profile)
+    except ConfigError as e:
+        parser.error(str(e))
+    if args.checkpoint is None and config.default_model_path and \
+            os.path.exists(config.default_model_path):
+        args.checkpoint = config.default_model_path
+    if args.top_k is None:
+        args.top_k = config.default_top_k
+    if args.threshold is None:
+        args.threshold = config.default_confidence_threshold
+    if args.batch_size is None:
+        args.batch_size = args.perf.batch_size
+    if args.decode_workers is None:
+        args.decode_workers = args.perf.decode_workers
+
+    if args.stop:
+        try:
+            with InferenceClient(args.socket) as client:
+                client.shutdown()
+            print(f"Inference daemon on {args.socket} stopped")
+        except DaemonUnavailable as e:
+            print(f"No daemon running: {e}")
+        return
+
+    if args.serve:
+        if args.detach:
+            start_daemon(args)
+            return
+        from utils.inference_server import InferenceDaemon
+        apply_profile(args.perf)
+        InferenceDaemon(args.checkpoint, args.socket, **model_options(args)).serve_forever()
+        return
+
+    if args.watch:
+        if args.image or args.frames or args.tiled or args.results_dir or args.profile or \
+                args.shadow_checkpoint:
+            parser.error("--watch classifies a folder's center crops and cannot be used with "
+                         "--image, --frames, --tiled, --results_dir, --profile or "
+                         "--shadow_checkpoint")
+        if not os.path.isdir(args.watch):
+            parser.error(f"--watch is not a directory: {args.watch}")
+        try:
+            run_watch(args)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if not args.image:
+        parser.error("--image is required unless --serve, --stop or --watch is given")
+    if args.results_dir and args.frames:
+        parser.error("--results_dir stores one result per image and cannot be used with --frames")
+
+    if args.shadow_checkpoint:
+        if args.frames or args.tiled or args.results_dir or args.profile:
+            parser.error("--shadow_checkpoint compares single center-crop predictions and cannot "
+                         "be used with --frames, --tiled, --results_dir or --profile")
+        if not os.path.exists(args.shadow_checkpoint):
+            parser.error(f"--shadow_checkpoint not found: {args.shadow_checkpoint}")
+        run_shadow(args, iter_image_paths(args.image))
+        return
+
+    image_paths = iter_image_paths(args.image)
+    results = classify_with_daemon(args, image_paths)
+    if results is None:
+        results = classify_locally(args, image_paths)
+
+    log = sys.stderr if args.jsonl else sys.stdout
+    output = JsonOutput(args.output) if args.output else None
+    sink = None
+    if args.results_dir:
+        from utils.result_sink import ResultSink
+        sink = ResultSink(args.results_dir, top_k=args.top_k,
+                          num_classes=get_config().num_classes)
+
+    for result in results:
+        if args.jsonl:
+            print(json.dumps(result), flush=True)
+        else:
+            print_result(result, args)
+        if output is not None and "error" not in result:
+            output.add(output_entry(result, args.checkpoint))
+        if sink is not None:
+            sink.add(result["image"], None if "error" in result else [
+                (pred["class_index"], pred["confidence"]) for pred in result["predictions"]
+            ])
+
     # Save to JSON if requested
-    if args.output:
-        output_data = {
-            "image": args.image,
-            "checkpoint": args.checkpoint if args.checkpoint else "pretrained",
-            "predictions": [
-                {
-                    "rank": i + 1,
-                    "class": class_name,
-                    "confidence": float(confidence)
-                }
-                for i, (class_name, confidence) in enumerate(predictions)
-            ]
-        }
-        
-        with open(args.output, 'w') as f:
-            json.dump(output_data, f, indent=2)
-        
-        print(f"Results saved to: {args.output}\n")
+    if output is not None:
+        output.close()
+        print(f"Results saved to: {args.output}\n", file=log)
+
+    if sink is not None:
+        from utils.result_sink import format_summary
+        summary = sink.close()
+        print(f"\n{'='*60}", file=log)
+        print(f"Run summary (results in {args.results_dir}/):", file=log)
+        print(f"{'='*60}", file=log)
+        for line in format_summary(summary):
+            print(line, file=log)
 
 
 if __name__ == "__main__":
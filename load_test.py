@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Concurrent-session load test for the app's inference path.
+
+Simulates N Streamlit sessions sharing the cached model: each user thread
+decodes an uploaded image of a random size and calls `process_single_image`
+through the shared inference scheduler (or directly with --no_scheduler)
+in a loop for a fixed duration. Throughput, latency percentiles, RSS and
+tracemalloc usage are sampled over time, and the run fails (exit code 1)
+when memory grows by more than the configured threshold after warmup.
+
+Usage:
+    python load_test.py --users 8 --duration 120 --checkpoint models/acc1=76.2100.ckpt
+    python load_test.py --users 4 --duration 60 --sizes 224x224,1920x1080 --output report.json
+    python load_test.py --users 16 --duration 120 --slo_p95_ms 500   # load-adaptive degradation
+"""
+import argparse
+import io
+import json
+import os
+import random
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        # Not Linux: fall back to the peak RSS (KB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def parse_sizes(value):
+    """Parse '224x224,640x480' into [(224, 224), (640, 480)]."""
+    sizes = []
+    for item in value.split(","):
+        width, height = item.lower().split("x")
+        sizes.append((int(width), int(height)))
+    return sizes
+
+
+def make_uploads(sizes, seed=0):
+    """Encode one random JPEG per size, standing in for uploaded files."""
+    rng = np.random.default_rng(seed)
+    uploads = []
+    for width, height in sizes:
+        pixels = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, format="JPEG", quality=90)
+        uploads.append((f"{width}x{height}", buffer.getvalue()))
+    return uploads
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    arr = np.asarray(values) * 1000
+    return {
+        "p50_ms": float(np.percentile(arr, 50)),
+        "p90_ms": float(np.percentile(arr, 90)),
+        "p95_ms": float(np.percentile(arr, 95)),
+        "p99_ms": float(np.percentile(arr, 99)),
+        "max_ms": float(arr.max())
+    }
+
+
+def growth_slope(samples, key):
+    """Least-squares growth rate of a sampled metric, in units per minute."""
+    if len(samples) < 2:
+        return 0.0
+    t = np.array([s["elapsed_s"] for s in samples])
+    y = np.array([s[key] for s in samples])
+    if np.ptp(t) == 0:
+        return 0.0
+    return float(np.polyfit(t, y, 1)[0] * 60)
+
+
+class LoadTest:
+    """
+    Runs the load and collects metrics.
+
+    Args:
+        infer: Callable(image, session_id) -> predictions, the inference path under test
+        uploads (list): (label, jpeg_bytes) pairs to pick from
+        users (int): Number of concurrent sessions
+        duration (float): Measured duration in seconds (after warmup)
+        warmup (float): Warmup duration in seconds, excluded from baselines
+        sample_interval (float): Seconds between memory samples
+        think_time (float): Pause between requests of one user, in seconds
+        trace_memory (bool): Track Python allocations with tracemalloc
+    """
+
+    def __init__(self, infer, uploads, users=4, duration=60.0, warmup=10.0,
+                 sample_interval=2.0, think_time=0.0, trace_memory=True):
+        self.infer = infer
+        self.uploads = uploads
+        self.users = users
+        self.duration = duration
+        self.warmup = warmup
+        self.sample_interval = sample_interval
+        self.think_time = think_time
+        self.trace_memory = trace_memory
+
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.latencies_by_size = {label: [] for label, _ in uploads}
+        self.errors = 0
+        self.completed = 0
+        self.samples = []
+        self.baseline_snapshot = None
+        self.final_snapshot = None
+        self._measuring = False
+        self._stop = threading.Event()
+
+    def _user(self, user_id):
+        rng = random.Random(user_id)
+        while not self._stop.is_set():
+            label, data = rng.choice(self.uploads)
+            start = time.perf_counter()
+            try:
+                # Same path as an upload in app.main: decode, then infer
+                image = Image.open(io.BytesIO(data)).convert('RGB')
+                self.infer(image, user_id)
+                failed = False
+            except Exception:
+                failed = True
+            latency = time.perf_counter() - start
+
+            with self.lock:
+                if failed:
+                    self.errors += 1
+                elif self._measuring:
+                    self.completed += 1
+                    self.latencies.append(latency)
+                    self.latencies_by_size[label].append(latency)
+
+            if self.think_time:
+                time.sleep(self.think_time)
+
+    def _sample(self, start, last_completed):
+        traced = tracemalloc.get_traced_memory()[0] / (1024 * 1024) if self.trace_memory else 0.0
+        with self.lock:
+            completed = self.completed
+        elapsed = time.perf_counter() - start
+        sample = {
+            "elapsed_s": elapsed,
+            "rss_mb": current_rss_mb(),
+            "tracemalloc_mb": traced,
+            "completed": completed,
+            "throughput_ips": (completed - last_completed) / self.sample_interval
+        }
+        self.samples.append(sample)
+        return sample
+
+    def run(self, progress=print):
+        if self.trace_memory:
+            tracemalloc.start(10)
+
+        threads = [
+            threading.Thread(target=self._user, args=(i,), daemon=True)
+            for i in range(self.users)
+        ]
+        for thread in threads:
+            thread.start()
+
+        progress(f"Warming up for {self.warmup:.0f}s with {self.users} users...")
+        time.sleep(self.warmup)
+
+        with self.lock:
+            self._measuring = True
+        if self.trace_memory:
+            self.baseline_snapshot = tracemalloc.take_snapshot()
+
+        start = time.perf_counter()
+        last_completed = 0
+        progress(f"Measuring for {self.duration:.0f}s...")
+        while time.perf_counter() - start < self.duration:
+            time.sleep(self.sample_interval)
+            sample = self._sample(start, last_completed)
+            last_completed = sample["completed"]
+            progress(
+                f"  t={sample['elapsed_s']:6.1f}s  done={sample['completed']:6d}  "
+                f"{sample['throughput_ips']:6.1f} img/s  rss={sample['rss_mb']:8.1f}MB  "
+                f"traced={sample['tracemalloc_mb']:7.2f}MB"
+            )
+        elapsed = time.perf_counter() - start
+
+        self._stop.set()
+        for thread in threads:
+            thread.join()
+
+        if self.trace_memory:
+            self.final_snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+
+        return self.report(elapsed)
+
+    def report(self, elapsed):
+        first, last = (self.samples[0], self.samples[-1]) if self.samples else ({}, {})
+        report = {
+            "users": self.users,
+            "duration_s": elapsed,
+            "completed": self.completed,
+            "errors": self.errors,
+            "throughput_ips": self.completed / elapsed if elapsed else 0.0,
+            "latency": percentiles(self.latencies),
+            "latency_by_size": {
+                label: percentiles(values) for label, values in self.latencies_by_size.items()
+            },
+            "memory": {
+                "rss_start_mb": first.get("rss_mb", 0.0),
+                "rss_end_mb": last.get("rss_mb", 0.0),
+                "rss_growth_mb": last.get("rss_mb", 0.0) - first.get("rss_mb", 0.0),
+                "rss_slope_mb_per_min": growth_slope(self.samples, "rss_mb"),
+                "tracemalloc_growth_mb": (
+                    last.get("tracemalloc_mb", 0.0) - first.get("tracemalloc_mb", 0.0)
+                ),
+                "tracemalloc_slope_mb_per_min": growth_slope(self.samples, "tracemalloc_mb")
+            },
+            "samples": self.samples
+        }
+
+        if self.baseline_snapshot is not None and self.final_snapshot is not None:
+            stats = self.final_snapshot.compare_to(self.baseline_snapshot, "lineno")
+            report["memory"]["top_allocation_growth"] = [
+                {"location": str(stat.traceback), "size_diff_kb": stat.size_diff / 1024,
+                 "count_diff": stat.count_diff}
+                for stat in stats[:10] if stat.size_diff > 0
+            ]
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent-session load test")
+    parser.add_argument("--checkpoint", type=str, default="models/acc1=76.2100.ckpt",
+                        help="Model checkpoint (pretrained if the path does not exist)")
+    parser.add_argument("--users", type=int, default=4,
+                        help="Number of concurrent simulated sessions")
+    parser.add_argument("--duration", type=float, default=60.0,
+                        help="Measured duration in seconds")
+    parser.add_argument("--warmup", type=float, default=10.0,
+                        help="Warmup in seconds, excluded from memory baselines")
+    parser.add_argument("--sizes", type=str, default="224x224,640x480,1280x960,1920x1080",
+                        help="Comma separated WIDTHxHEIGHT image sizes to mix")
+    parser.add_argument("--top_k", type=int, default=5,
+                        help="Top predictions per request")
+    parser.add_argument("--think_time", type=float, default=0.0,
+                        help="Seconds each user waits between requests")
+    parser.add_argument("--sample_interval", type=float, default=2.0,
+                        help="Seconds between memory samples")
+    parser.add_argument("--max_rss_growth_mb", type=float, default=100.0,
+                        help="Fail if RSS grows more than this after warmup")
+    parser.add_argument("--max_tracemalloc_growth_mb", type=float, default=20.0,
+                        help="Fail if traced Python allocations grow more than this after warmup")
+    parser.add_argument("--no_tracemalloc", action="store_true",
+                        help="Disable tracemalloc (lower overhead, RSS only)")
+    parser.add_argument("--no_scheduler", action="store_true",
+                        help="Call the model directly instead of through the shared scheduler")
+    parser.add_argument("--slo_p95_ms", type=float, default=None,
+                        help="p95 latency SLO; the scheduler degrades under load to meet it")
+    parser.add_argument("--slo_queue_depth", type=int, default=None,
+                        help="Queue depth that also triggers degradation (with --slo_p95_ms)")
+    parser.add_argument("--output", type=str, default=None,
+                        help="Write the full report as JSON")
+    args = parser.parse_args()
+
+    # Importing the app gives us the exact cached model and inference path
+    # used by every Streamlit session
+    from app import initialize_model, initialize_scheduler, process_single_image
+
+    model = initialize_model(args.checkpoint)
+    scheduler = None if args.no_scheduler else initialize_scheduler(
+        args.checkpoint, slo_p95_ms=args.slo_p95_ms, slo_queue_depth=args.slo_queue_depth
+    )
+
+    def infer(image, session_id):
+        return process_single_image(
+            image, model, args.top_k, 0.0, scheduler=scheduler, session_id=session_id
+        )
+
+    test = LoadTest(
+        infer,
+        make_uploads(parse_sizes(args.sizes)),
+        users=args.users,
+        duration=args.duration,
+        warmup=args.warmup,
+        sample_interval=args.sample_interval,
+        think_time=args.think_time,
+        trace_memory=not args.no_tracemalloc
+    )
+    report = test.run()
+    if scheduler is not None:
+        report["scheduler"] = scheduler.stats()
+
+    latency = report["latency"]
+    memory = report["memory"]
+    print(f"\n{'='*60}")
+    print("Load Test Summary")
+    print(f"{'='*60}")
+    print(f"Users: {report['users']}  Completed: {report['completed']}  Errors: {report['errors']}")
+    print(f"Throughput: {report['throughput_ips']:.2f} images/s")
+    if latency:
+        print(f"Latency: p50 {latency['p50_ms']:.1f}ms  p95 {latency['p95_ms']:.1f}ms  "
+              f"p99 {latency['p99_ms']:.1f}ms  max {latency['max_ms']:.1f}ms")
+    if "scheduler" in report:
+        queue = report["scheduler"]
+        print(f"Scheduler: mean batch {queue['mean_batch_size']:.1f}  "
+              f"queue wait p50 {queue['wait_p50_ms']:.1f}ms  p95 {queue['wait_p95_ms']:.1f}ms")
+        degradation = queue.get("degradation")
+        if degradation is not None:
+            print(f"Degradation: final mode {degradation['mode']} "
+                  f"(level {degradation['level']}/{degradation['levels'] - 1}), "
+                  f"{len(degradation['transitions'])} transitions")
+            for transition in degradation["transitions"]:
+                print(f"  {transition['from']} -> {transition['to']} ({transition['reason']})")
+    print(f"RSS: {memory['rss_start_mb']:.1f}MB -> {memory['rss_end_mb']:.1f}MB "
+          f"({memory['rss_growth_mb']:+.1f}MB, {memory['rss_slope_mb_per_min']:+.2f}MB/min)")
+    if not args.no_tracemalloc:
+        print(f"tracemalloc: {memory['tracemalloc_growth_mb']:+.2f}MB "
+              f"({memory['tracemalloc_slope_mb_per_min']:+.2f}MB/min)")
+        for stat in memory.get("top_allocation_growth", [])[:5]:
+            print(f"  {stat['size_diff_kb']:+9.1f}KB  {stat['location']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to: {args.output}")
+
+    failures = []
+    if report["completed"] == 0:
+        failures.append("no requests completed")
+    if memory["rss_growth_mb"] > args.max_rss_growth_mb:
+        failures.append(f"RSS grew {memory['rss_growth_mb']:.1f}MB > {args.max_rss_growth_mb}MB")
+    if not args.no_tracemalloc and memory["tracemalloc_growth_mb"] > args.max_tracemalloc_growth_mb:
+        failures.append(
+            f"tracemalloc grew {memory['tracemalloc_growth_mb']:.2f}MB "
+            f"> {args.max_tracemalloc_growth_mb}MB"
+        )
+
+    print(f"{'='*60}")
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        sys.exit(1)
+    print("✅ Memory growth within limits")
+
+
+if __name__ == "__main__":
+    main()
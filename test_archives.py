@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Tests for archive sources: tar, tar.gz, zip and sharded tars are read in
+member order without extraction and match classifying the files directly.
+"""
+import io
+import os
+import tarfile
+import tempfile
+import zipfile
+
+import numpy as np
+import torch
+from PIL import Image
+
+from utils.archive_names import expand_shards
+from utils.archives import ArchiveDecoder, classify_archive, iter_archive_members
+from utils.config import apply_image_limits
+from utils.image_processor import preprocess_image
+from testing_helpers import tiny_model, run_tests
+
+
+def make_members(count=7):
+    members = []
+    for i in range(count):
+        pixels = np.random.default_rng(i).integers(0, 255, (230 + 13 * i, 250, 3), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, format="PNG")
+        members.append((f"images/{i:03d}.png", buffer.getvalue()))
+    return members
+
+
+def write_tar(path, members, mode="w"):
+    with tarfile.open(path, mode) as archive:
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+
+
+def test_archive_formats_and_shards():
+    """All formats yield the same image members in order; brace ranges expand to shards."""
+    members = make_members() + [("notes.txt", b"not an image")]
+    with tempfile.TemporaryDirectory() as directory:
+        write_tar(os.path.join(directory, "a.tar"), members)
+        write_tar(os.path.join(directory, "a.tar.gz"), members, mode="w:gz")
+        with zipfile.ZipFile(os.path.join(directory, "a.zip"), "w") as archive:
+            for name, data in members:
+                archive.writestr(name, data)
+
+        expected = [name for name, _ in members[:-1]]
+        for name in ("a.tar", "a.tar.gz", "a.zip"):
+            assert [member for member, _ in iter_archive_members(os.path.join(directory, name))] == expected
+        with open(os.path.join(directory, "a.zip"), "rb") as f:
+            assert len(list(iter_archive_members(f, name="upload.zip"))) == len(expected)
+
+    assert expand_shards("train-{008..011}.tar") == [
+        "train-008.tar", "train-009.tar", "train-010.tar", "train-011.tar"
+    ]
+    assert expand_shards("plain.tar") == ["plain.tar"]
+    print("✅ Archive formats test PASSED")
+
+
+def test_classification_matches_files():
+    """Worker-decoded, batched archive results equal per-file inference, in member order."""
+    model = tiny_model()
+    members = make_members()
+    members.insert(3, ("images/broken.jpg", b"not an image"))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "set.tar")
+        write_tar(path, members)
+
+        with torch.no_grad():
+            expected = [
+                model(preprocess_image(Image.open(io.BytesIO(data)).convert('RGB'))).argmax().item()
+                for _, data in members if not data.startswith(b"not")
+            ]
+        for workers in (0, 2):
+            with ArchiveDecoder(workers=workers, chunk_size=2, max_pending=2) as decoder:
+                results = list(classify_archive(model, path, decoder, top_k=3, batch_size=3))
+            assert [result["member"] for result in results] == [name for name, _ in members]
+            assert results[3]["image"] == f"{path}:images/broken.jpg" and "error" in results[3]
+            ok = [result for result in results if "error" not in result]
+            assert [result["predictions"][0]["class_index"] for result in ok] == expected
+            assert ok[0]["image_size"] == [250, 230]
+    print("✅ Archive classification test PASSED")
+
+
+def test_spawned_workers_apply_pixel_limit():
+    """The initializer sets the pixel limit in spawned workers, which do not inherit it."""
+    members = []
+    for size in (100, 400):
+        buffer = io.BytesIO()
+        Image.new("RGB", (size, size)).save(buffer, format="PNG")
+        members.append((f"{size}.png", buffer.getvalue()))
+    # 400 x 400 pixels is more than twice this limit, so PIL refuses to decode it
+    with ArchiveDecoder(workers=1, start_method="spawn", initializer=apply_image_limits,
+                        initargs=(60000,)) as decoder:
+        decoded = list(decoder.decode(members))
+    assert decoded[0][3] is None and decoded[1][3] and "decompression bomb" in decoded[1][3]
+    with ArchiveDecoder(workers=1, start_method="spawn") as decoder:
+        assert all(error is None for _, _, _, error in decoder.decode(members))
+    print("✅ Decode worker pixel limit test PASSED")
+
+
+def main():
+    run_tests([
+        test_archive_formats_and_shards,
+        test_classification_matches_files,
+        test_spawned_workers_apply_pixel_limit
+    ])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Tests for the asset fetcher against a local HTTP stand-in server.
+The server supports Range requests and can serve HTML error pages and 404s.
+"""
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from PIL import Image
+
+from utils.asset_fetcher import AssetFetcher, FetchResult
+from download_samples import validate_image
+from testing_helpers import run_tests
+
+
+def make_jpeg(seed):
+    """Create a small random JPEG and return its bytes."""
+    pixels = np.random.default_rng(seed).integers(0, 255, (64, 64, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+FILES = {f"img{i}.JPEG": make_jpeg(i) for i in range(6)}
+HTML_PAGE = b"<html><body>429 Too Many Requests</body></html>"
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Serves FILES with Range support; /html/* returns an HTML page with 200."""
+    requests_seen = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        name = self.path.rsplit("/", 1)[-1]
+        StandInHandler.requests_seen.append((self.path, self.headers.get("Range")))
+
+        if self.path.startswith("/html/"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(HTML_PAGE)))
+            self.end_headers()
+            self.wfile.write(HTML_PAGE)
+            return
+        if name not in FILES:
+            self.send_error(404)
+            return
+
+        data = FILES[name]
+        range_header = self.headers.get("Range")
+        if range_header:
+            start = int(range_header.split("=")[1].split("-")[0])
+            if start >= len(data):
+                self.send_response(416)
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+            data = data[start:]
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+def manifest_assets(base_url, names=None, with_checksums=True):
+    assets = []
+    for name in names or FILES:
+        asset = {"name": name, "url": base_url + name}
+        if with_checksums:
+            asset["sha256"] = hashlib.sha256(FILES[name]).hexdigest()
+            asset["size"] = len(FILES[name])
+        assets.append(asset)
+    return assets
+
+
+def test_parallel_download_and_skip():
+    """All files download concurrently, then a second run skips them."""
+    server, base_url = start_server()
+    try:
+        with tempfile.TemporaryDirectory() as output_dir:
+            fetcher = AssetFetcher(output_dir, workers=4, validate=validate_image)
+            assets = manifest_assets(base_url)
+
+            results = fetcher.fetch_all(assets)
+            assert [r.status for r in results] == ["downloaded"] * len(FILES)
+            for name, data in FILES.items():
+                with open(os.path.join(output_dir, name), "rb") as f:
+                    assert f.read() == data
+
+            StandInHandler.requests_seen.clear()
+            results = fetcher.fetch_all(assets)
+            assert [r.status for r in results] == ["skipped"] * len(FILES)
+            assert StandInHandler.requests_seen == []
+    finally:
+        server.shutdown()
+    print("✅ Parallel download and skip test PASSED")
+
+
+def test_resume_partial_file():
+    """A partial .part file is resumed with a Range request."""
+    server, base_url = start_server()
+    try:
+        with tempfile.TemporaryDirectory() as output_dir:
+            name = "img0.JPEG"
+            with open(os.path.join(output_dir, name + ".part"), "wb") as f:
+                f.write(FILES[name][:500])
+
+            StandInHandler.requests_seen.clear()
+            fetcher = AssetFetcher(output_dir, workers=2)
+            result = fetcher.fetch(manifest_assets(base_url, [name])[0])
+
+            assert result.status == "downloaded", result.error
+            assert StandInHandler.requests_seen == [(f"/{name}", "bytes=500-")]
+            with open(os.path.join(output_dir, name), "rb") as f:
+                assert f.read() == FILES[name]
+            assert not os.path.exists(os.path.join(output_dir, name + ".part"))
+    finally:
+        server.shutdown()
+    print("✅ Resume partial file test PASSED")
+
+
+def test_corrupt_partial_file_restarts():
+    """A partial file with wrong bytes fails the checksum and is re-downloaded from scratch."""
+    server, base_url = start_server()
+    try:
+        with tempfile.TemporaryDirectory() as output_dir:
+            name = "img1.JPEG"
+            with open(os.path.join(output_dir, name + ".part"), "wb") as f:
+                f.write(b"\0" * 300)
+
+            result = AssetFetcher(output_dir).fetch(manifest_assets(base_url, [name])[0])
+            assert result.status == "downloaded", result.error
+            with open(os.path.join(output_dir, name), "rb") as f:
+                assert f.read() == FILES[name]
+    finally:
+        server.shutdown()
+    print("✅ Corrupt partial file test PASSED")
+
+
+def test_rejects_error_pages():
+    """HTML error pages, checksum mismatches and 404s never land under the real name."""
+    server, base_url = start_server()
+    try:
+        with tempfile.TemporaryDirectory() as output_dir:
+            fetcher = AssetFetcher(output_dir, validate=validate_image, require_checksum=False)
+            bad_checksum = manifest_assets(base_url, ["img2.JPEG"])[0]
+            bad_checksum["sha256"] = "0" * 64
+            assets = [
+                {"name": "img3.JPEG", "url": base_url + "html/img3.JPEG"},
+                {"name": "missing.JPEG", "url": base_url + "missing.JPEG"},
+                bad_checksum
+            ]
+
+            results = fetcher.fetch_all(assets)
+            assert all(isinstance(r, FetchResult) for r in results)
+            assert [r.status for r in results] == ["failed"] * 3
+            assert "HTML" in results[0].error
+            assert "404" in results[1].error
+            assert "sha256" in results[2].error
+            assert os.listdir(output_dir) == []
+    finally:
+        server.shutdown()
+    print("✅ Error page rejection test PASSED")
+
+
+def test_requires_checksum():
+    """Assets without a sha256 are refused unless checksums are optional."""
+    server, base_url = start_server()
+    try:
+        with tempfile.TemporaryDirectory() as output_dir:
+            assets = manifest_assets(base_url, ["img4.JPEG", "img5.JPEG"], with_checksums=False)
+            StandInHandler.requests_seen.clear()
+            results = AssetFetcher(output_dir, validate=validate_image).fetch_all(assets)
+            assert [r.status for r in results] == ["failed"] * 2
+            assert all("sha256" in r.error for r in results)
+            assert StandInHandler.requests_seen == [] and os.listdir(output_dir) == []
+
+            results = AssetFetcher(output_dir, validate=validate_image,
+                                   require_checksum=False).fetch_all(assets)
+            assert [r.status for r in results] == ["downloaded"] * 2
+            assert results[0].sha256 == hashlib.sha256(FILES["img4.JPEG"]).hexdigest()
+    finally:
+        server.shutdown()
+    print("✅ Required checksum test PASSED")
+
+
+def main():
+    run_tests([
+        test_parallel_download_and_skip,
+        test_resume_partial_file,
+        test_corrupt_partial_file_restarts,
+        test_rejects_error_pages,
+        test_requires_checksum
+    ])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Tests for pluggable inference backends: every available backend matches
+eager fp32, a diverging backend falls back to eager, and auto-selection only
+picks backends that pass the parity check.
+"""
+
+import torch
+
+from utils.backends import (
+    AUTO,
+    BACKENDS,
+    BackendUnavailable,
+    EagerBackend,
+    InferenceBackend,
+    create_backend,
+    select_backend
+)
+from utils.optimization import sample_inputs
+from testing_helpers import run_tests
+
+
+def tiny_model():
+    torch.manual_seed(0)
+    return torch.nn.Sequential(
+        torch.nn.Conv2d(3, 8, 3, stride=4),
+        torch.nn.BatchNorm2d(8),
+        torch.nn.ReLU(),
+        torch.nn.AdaptiveAvgPool2d(1),
+        torch.nn.Flatten(),
+        torch.nn.Linear(8, 1000)
+    ).eval()
+
+
+class NoisyBackend(InferenceBackend):
+    """Fast but wrong: must never be selected."""
+
+    name = "noisy"
+
+    def build(self, model):
+        return lambda batch: model(batch) * 0
+
+
+def test_backends_match_eager():
+    """Every backend that builds here reproduces the eager logits."""
+    model = tiny_model()
+    inputs = sample_inputs(2)
+    with torch.no_grad():
+        expected = model(inputs)
+    for name, cls in BACKENDS.items():
+        try:
+            backend = cls().load(model).warmup((1, 2))
+        except BackendUnavailable:
+            continue
+        assert torch.allclose(backend.run_batch(inputs), expected, atol=1e-4), name
+        assert backend.describe()["name"] == name and backend.describe()["warmed_up"] == [1, 2]
+    print("✅ Backend parity test PASSED")
+
+
+def test_fallback_and_auto_selection():
+    """Diverging backends fall back to eager and are never auto-selected."""
+    model = tiny_model()
+    BACKENDS[NoisyBackend.name] = NoisyBackend
+    try:
+        assert isinstance(create_backend("noisy", model, batch_sizes=(1,)), EagerBackend)
+
+        chosen = select_backend(model, names=["eager", "noisy"], batch_sizes=(1, 2), iters=1)
+        assert chosen.name == "eager"
+        report = {entry["name"]: entry for entry in chosen.selection}
+        assert not report["noisy"]["parity"]["ok"] and report["eager"]["parity"]["ok"]
+    finally:
+        del BACKENDS[NoisyBackend.name]
+
+    chosen = create_backend(AUTO, model, batch_sizes=(1,))
+    report = {entry["name"]: entry for entry in chosen.selection}
+    assert report[chosen.name]["parity"]["ok"]
+    print("✅ Backend fallback and auto-selection test PASSED")
+
+
+def test_reduced_precision():
+    """bf16 runs under autocast, returns fp32 logits and passes the looser parity check."""
+    model = tiny_model()
+    backend = create_backend("eager", model, batch_sizes=(1,), precision="bf16")
+    assert backend.precision == "bf16" and backend.describe()["precision"] == "bf16"
+    logits = backend.run_batch(sample_inputs(2))
+    assert logits.dtype == torch.float32 and logits.shape == (2, 1000)
+    if not torch.cuda.is_available():
+        # fp16 autocast is GPU-only: falls back to eager fp32
+        assert create_backend("eager", model, batch_sizes=(1,), precision="fp16").precision == "fp32"
+    print("✅ Reduced precision test PASSED")
+
+
+def main():
+    run_tests([
+        test_backends_match_eager,
+        test_fallback_and_auto_selection,
+        test_reduced_precision
+    ])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Tests for sharded batch classification with several local worker processes.
+A stand-in classifier replaces the model so the queue, resume and merge logic
+can be checked quickly.
+"""
+import json
+import os
+import tempfile
+
+from batch_classify import init_job, merge_outputs, run_local, shard_output_path
+from utils.work_queue import ShardQueue
+from testing_helpers import run_tests
+
+PATHS = [f"/data/img_{i:04d}.JPEG" for i in range(50)]
+CRASH_PATH = PATHS[23]
+
+
+def fake_classifier(settings):
+    """Deterministic predictions; logs every path it classifies."""
+    def classify(paths):
+        with open(settings["log"], "a") as f:
+            f.write("".join(path + "\n" for path in paths))
+        return [
+            {"image": path, "predictions": [{"rank": 1, "class": f"class_{len(path) + i}",
+                                             "confidence": 1.0}]}
+            for i, path in enumerate(paths)
+        ]
+    return classify
+
+
+def crashing_classifier(settings):
+    """Like fake_classifier, but the worker process dies on CRASH_PATH."""
+    classify = fake_classifier(settings)
+
+    def crash(paths):
+        if CRASH_PATH in paths:
+            os._exit(1)
+        return classify(paths)
+    return crash
+
+
+def threads_classifier(settings):
+    """Like fake_classifier, but also logs the worker's torch thread count and profile."""
+    import torch
+
+    with open(settings["threads_log"], "a") as f:
+        f.write(f"{torch.get_num_threads()} {settings['perf_profile']}\n")
+    return fake_classifier(settings)
+
+
+def expected_lines():
+    lines = []
+    for start in range(0, len(PATHS), 4):
+        batch = PATHS[start:start + 4]
+        for i, path in enumerate(batch):
+            lines.append({"index": start + i, "image": path,
+                          "predictions": [{"rank": 1, "class": f"class_{len(path) + i}",
+                                           "confidence": 1.0}]})
+    return lines
+
+
+def read_log(path):
+    with open(path) as f:
+        return f.read().split()
+
+
+def test_parallel_workers_merge_in_order():
+    """Three workers drain the queue; the merged output is in manifest order."""
+    with tempfile.TemporaryDirectory() as job_dir:
+        log = os.path.join(job_dir, "classified.log")
+        init_job(job_dir, PATHS, shard_size=8, settings={"batch_size": 4, "log": log})
+
+        assert run_local(job_dir, workers=3, classifier_factory=fake_classifier) == [0, 0, 0]
+
+        output = os.path.join(job_dir, "merged.jsonl")
+        assert merge_outputs(job_dir, output) == len(PATHS)
+        with open(output) as f:
+            assert [json.loads(line) for line in f] == expected_lines()
+        assert sorted(read_log(log)) == PATHS
+    print("✅ Parallel workers test PASSED")
+
+
+def test_resume_after_worker_crash():
+    """A crashed worker's shard is redone on restart; finished shards are not."""
+    with tempfile.TemporaryDirectory() as job_dir:
+        log = os.path.join(job_dir, "classified.log")
+        init_job(job_dir, PATHS, shard_size=8, settings={"batch_size": 4, "log": log})
+
+        exit_codes = run_local(job_dir, workers=2, classifier_factory=crashing_classifier)
+        assert 1 in exit_codes
+        with ShardQueue(os.path.join(job_dir, "queue.db")) as queue:
+            status = queue.status()
+        assert status["claimed"] == 1 and status["done"] >= 1
+
+        output = os.path.join(job_dir, "merged.jsonl")
+        try:
+            merge_outputs(job_dir, output)
+            assert False, "merge must refuse an unfinished job"
+        except RuntimeError:
+            pass
+
+        first_run = read_log(log)
+        # Reopening the job does not reset it
+        init_job(job_dir, PATHS, shard_size=8, settings={"batch_size": 4, "log": log})
+        assert run_local(job_dir, workers=2, classifier_factory=fake_classifier) == [0, 0]
+
+        assert merge_outputs(job_dir, output) == len(PATHS)
+        with open(output) as f:
+            assert [json.loads(line) for line in f] == expected_lines()
+
+        # Only the shard that was running at the crash is classified twice
+        second_run = read_log(log)[len(first_run):]
+        assert set(first_run) & set(second_run) <= set(PATHS[16:24])
+        assert sorted(set(first_run) | set(second_run)) == PATHS
+        assert os.path.exists(shard_output_path(job_dir, 2))
+        assert not [name for name in os.listdir(os.path.join(job_dir, "shards"))
+                    if name.endswith(".part")]
+    print("✅ Resume after crash test PASSED")
+
+
+def test_worker_threads():
+    """Workers split the CPUs between them unless a thread count is given."""
+    with tempfile.TemporaryDirectory() as job_dir:
+        threads_log = os.path.join(job_dir, "threads.log")
+        settings = {"batch_size": 4, "log": os.path.join(job_dir, "classified.log"),
+                    "threads_log": threads_log}
+        init_job(os.path.join(job_dir, "a"), PATHS, shard_size=8, settings=settings)
+        init_job(os.path.join(job_dir, "b"), PATHS, shard_size=8, settings=settings)
+
+        assert run_local(os.path.join(job_dir, "a"), workers=2,
+                         classifier_factory=threads_classifier) == [0, 0]
+        # A worker that claimed no shard never builds a classifier, so one or two lines
+        with open(threads_log) as f:
+            assert set(f.read().splitlines()) == {f"{max(1, os.cpu_count() // 2)} None"}
+        os.remove(threads_log)
+
+        assert run_local(os.path.join(job_dir, "b"), workers=2, classifier_factory=threads_classifier,
+                         perf_profile="throughput", num_threads=1) == [0, 0]
+        with open(threads_log) as f:
+            assert set(f.read().splitlines()) == {"1 throughput"}
+    print("✅ Worker threads test PASSED")
+
+
+def main():
+    run_tests([
+        test_parallel_workers_merge_in_order,
+        test_resume_after_worker_crash,
+        test_worker_threads
+    ])
+
+
+if __name__ == "__main__":
+    main()
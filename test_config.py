@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Tests for the config.yaml layer: validation errors name the bad setting,
+profiles inherit the defaults, and the active profile follows the CLI
+argument, then $IMAGENET_PROFILE, then default_profile.
+"""
+import os
+import tempfile
+
+from utils.config import (
+    PROFILE_ENV,
+    ConfigError,
+    load_config,
+    parse_config,
+    select_profile
+)
+from testing_helpers import run_tests
+
+
+def expect_error(data, fragment):
+    try:
+        parse_config(data, "config.yaml")
+    except ConfigError as e:
+        assert fragment in str(e), str(e)
+        return
+    assert False, f"no error for {data}"
+
+
+def test_validation():
+    """Invalid settings, unknown keys and undefined profiles are rejected."""
+    config = parse_config(None)
+    assert config.img_size == 224 and config.default_profile == "default"
+    assert list(config.profiles) == ["default"]
+
+    expect_error({"img_size": "224"}, "img_size='224'")
+    expect_error({"default_top_k": 0}, "default_top_k=0")
+    expect_error({"default_confidence_threshold": 1.5}, "default_confidence_threshold")
+    expect_error({"mean": [0.5, 0.5]}, "mean=")
+    expect_error({"resize_size": 200}, "resize_size (200) is smaller than img_size (224)")
+    expect_error({"defualt_top_k": 3}, "unknown setting(s) defualt_top_k")
+    expect_error({"profiles": {"fast": {"batch": 4}}}, "profile 'fast': unknown setting(s) batch")
+    expect_error({"profiles": {"fast": {"precision": "int8"}}}, "precision='int8'")
+    expect_error({"profiles": {"fast": {"num_threads": 0}}}, "num_threads=0")
+    expect_error({"default_profile": "fast"}, "default_profile 'fast' is not defined")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "config.yaml")
+        with open(path, "w") as f:
+            f.write("img_size: [unclosed\n")
+        try:
+            load_config(path)
+            assert False, "unparsable YAML accepted"
+        except ConfigError as e:
+            assert path in str(e)
+    print("✅ Config validation test PASSED")
+
+
+def test_profile_selection():
+    """Profiles fill unset keys from the defaults; CLI beats env beats default_profile."""
+    config = parse_config({
+        "default_profile": "latency",
+        "profiles": {
+            "latency": {"backend": "torchscript", "batch_size": 1},
+            "throughput": {"batch_size": 32, "num_threads": 4}
+        }
+    })
+    latency = config.profiles["latency"]
+    assert latency.batch_size == 1 and latency.precision == "fp32" and latency.decode_workers == 4
+    # Load-adaptive degradation is opt-in
+    assert latency.slo_p95_ms is None and config.profiles["default"].slo_p95_ms is None
+
+    saved = os.environ.pop(PROFILE_ENV, None)
+    try:
+        assert select_profile(config).name == "latency"
+        os.environ[PROFILE_ENV] = "throughput"
+        assert select_profile(config).num_threads == 4
+        assert select_profile(config, "default").batch_size == 8
+        os.environ[PROFILE_ENV] = "missing"
+        try:
+            select_profile(config)
+            assert False, "unknown profile accepted"
+        except ConfigError as e:
+            assert "default, latency, throughput" in str(e)
+    finally:
+        os.environ.pop(PROFILE_ENV, None)
+        if saved is not None:
+            os.environ[PROFILE_ENV] = saved
+
+    # The shipped config.yaml is valid
+    shipped = load_config("config.yaml").profiles
+    assert {"latency", "throughput"} <= set(shipped)
+    assert shipped["default"].slo_p95_ms is None and shipped["latency"].slo_p95_ms == 500
+    print("✅ Profile selection test PASSED")
+
+
+def main():
+    run_tests([
+        test_validation,
+        test_profile_selection
+    ])
+
+
+if __name__ == "__main__":
+    main()
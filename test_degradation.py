@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Tests for load-adaptive degradation: the controller steps down when p95
+latency or queue depth breach the SLO and back up once load subsides, and
+the scheduler applies the mode's batch size and precision and never merges
+inputs of different resolutions.
+"""
+import threading
+import time
+
+import torch
+
+from utils.degradation import DegradationController, Mode
+from utils.scheduler import InferenceScheduler
+from testing_helpers import run_tests
+
+
+MODES = [
+    Mode("full", 2, 0, 224, "fp32"),
+    Mode("batched", 8, 0, 224, "fp32"),
+    Mode("reduced_resolution", 8, 0, 192, "fp32"),
+    Mode("reduced_precision", 8, 0, 192, "bf16")
+]
+
+
+def feed(controller, latency_ms, now, count=10):
+    for _ in range(count):
+        controller.record(latency_ms, now=now)
+
+
+def test_controller_steps():
+    """Breaches step down one level per cooldown; recovery needs calm p95 and queue."""
+    controller = DegradationController(MODES, slo_p95_ms=100, slo_queue_depth=8, window_s=5,
+                                       down_cooldown_s=2, up_cooldown_s=10)
+    now = time.monotonic() + 100
+    feed(controller, 50, now)
+    assert controller.update(0, now=now).name == "full"
+
+    feed(controller, 200, now)
+    assert controller.update(0, now=now).name == "batched"
+    # Samples are reset on a change, and steps down respect the cooldown
+    feed(controller, 200, now + 1)
+    assert controller.update(0, now=now + 1).name == "batched"
+    assert controller.update(20, now=now + 3).name == "reduced_resolution"
+    feed(controller, 500, now + 6)
+    assert controller.update(0, now=now + 6).name == "reduced_precision"
+    assert controller.update(50, now=now + 9).name == "reduced_precision"  # already cheapest
+
+    # Fast again, but not for long enough
+    feed(controller, 20, now + 12)
+    assert controller.update(0, now=now + 12).name == "reduced_precision"
+    # Still a long queue
+    assert controller.update(5, now=now + 17).name == "reduced_precision"
+    assert controller.update(0, now=now + 17).name == "reduced_resolution"
+    # Between the recovery and breach thresholds: stay put
+    feed(controller, 70, now + 30)
+    assert controller.update(0, now=now + 30).name == "reduced_resolution"
+    # Old samples expire from the window; with too few samples only the queue counts
+    assert controller.update(0, now=now + 70).name == "batched"
+
+    stats = controller.stats()
+    assert stats["level"] == 1 and stats["levels"] == 4
+    assert [t["to"] for t in stats["transitions"]] == [
+        "batched", "reduced_resolution", "reduced_precision", "reduced_resolution", "batched"
+    ]
+    assert stats["transitions"][1]["reason"] == "queue depth"
+    print("✅ Degradation controller test PASSED")
+
+
+class RecordingModel(torch.nn.Module):
+    """Records input shapes and autocast state; blocks the first pass until released."""
+
+    def __init__(self):
+        super().__init__()
+        self.linear = torch.nn.Linear(3, 4)
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.calls = []
+
+    def forward(self, x):
+        self.started.set()
+        self.release.wait(5)
+        self.calls.append((tuple(x.shape), torch.is_autocast_cpu_enabled()))
+        return self.linear(x.mean(dim=(2, 3)))
+
+
+def test_scheduler_follows_mode():
+    """Batch limit and precision follow the mode; resolutions are batched separately."""
+    controller = DegradationController(MODES, slo_p95_ms=1e9)
+    model = RecordingModel().eval()
+    scheduler = InferenceScheduler(model, max_batch_size=2, controller=controller)
+    try:
+        first = scheduler.submit(torch.zeros(1, 3, 8, 8), "a")
+        model.started.wait(5)
+        futures = [scheduler.submit(torch.zeros(1, 3, 8, 8), f"s{i}") for i in range(3)]
+        futures += [scheduler.submit(torch.zeros(1, 3, 6, 6), f"t{i}") for i in range(2)]
+        model.release.set()
+        for future in [first] + futures:
+            future.result(timeout=5)
+        assert [shape for shape, _ in model.calls] == [
+            (1, 3, 8, 8), (2, 3, 8, 8), (1, 3, 8, 8), (2, 3, 6, 6)
+        ], model.calls
+        assert first.result().mode == "full"
+
+        controller._change(3, time.monotonic(), None, 0, "test")
+        model.calls.clear()
+        futures = [scheduler.submit(torch.zeros(1, 3, 6, 6), f"u{i}") for i in range(3)]
+        outputs = [future.result(timeout=5) for future in futures]
+        assert all(autocast for _, autocast in model.calls)
+        assert all(o.output.dtype == torch.float32 and o.mode == "reduced_precision"
+                   for o in outputs)
+        assert scheduler.stats()["degradation"]["mode"] == "reduced_precision"
+    finally:
+        model.release.set()
+        scheduler.close()
+    print("✅ Scheduler degradation mode test PASSED")
+
+
+def main():
+    run_tests([
+        test_controller_steps,
+        test_scheduler_follows_mode
+    ])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Tests for incremental watch-folder classification: a pass only classifies
+new or changed files, reuses results for moved or duplicated content (but
+not decode errors), drops deleted files, and reclassifies everything when the checkpoint changes.
+"""
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+from utils.archives import ArchiveDecoder
+from utils.folder_watch import FolderIndex, FolderWatcher
+from testing_helpers import tiny_model, run_tests
+
+
+def write_image(path, seed):
+    pixels = np.random.default_rng(seed).integers(0, 255, (240, 260, 3), dtype=np.uint8)
+    Image.fromarray(pixels).save(path, format="PNG")
+
+
+def run(watcher):
+    results = {}
+    for result in watcher.run_pass():
+        results[os.path.basename(result["image"])] = result["status"]
+    return results, watcher.last_pass
+
+
+def test_incremental_passes():
+    """Unchanged folders cost no inference; each change is handled by its kind."""
+    loads = []
+
+    def load_model():
+        loads.append(1)
+        return tiny_model()
+
+    with tempfile.TemporaryDirectory() as folder, \
+            tempfile.TemporaryDirectory() as state, \
+            ArchiveDecoder(workers=0) as decoder:
+        os.makedirs(os.path.join(folder, "sub"))
+        for i in range(5):
+            write_image(os.path.join(folder, f"{i}.png"), i)
+        with open(os.path.join(folder, "notes.txt"), "w") as f:
+            f.write("not an image")
+
+        checkpoint = os.path.join(state, "model.ckpt")
+        with open(checkpoint, "w") as f:
+            f.write("v1")
+        with FolderIndex(os.path.join(state, "index.db")) as index:
+            watcher = FolderWatcher(folder, index, load_model, decoder, checkpoint=checkpoint,
+                                    top_k=3, batch_size=2, min_age_s=0)
+            results, stats = run(watcher)
+            assert set(results.values()) == {"new"} and len(results) == 5
+            assert stats["classified"] == 5 and stats["indexed"] == 5
+
+            results, stats = run(watcher)
+            assert results == {} and stats["unchanged"] == 5 and stats["classified"] == 0
+
+            write_image(os.path.join(folder, "0.png"), 100)                # new content
+            os.utime(os.path.join(folder, "1.png"), ns=(1, 10 ** 9))        # touched only
+            os.rename(os.path.join(folder, "2.png"), os.path.join(folder, "sub", "moved.png"))
+            shutil.copy(os.path.join(folder, "3.png"), os.path.join(folder, "copy.png"))
+            os.remove(os.path.join(folder, "4.png"))
+            with open(os.path.join(folder, "broken.png"), "wb") as f:
+                f.write(b"not a png")
+            write_image(os.path.join(folder, "5.png"), 5)
+
+            results, stats = run(watcher)
+            assert results == {"0.png": "changed", "moved.png": "reused", "copy.png": "reused",
+                               "broken.png": "new", "5.png": "new", "2.png": "deleted",
+                               "4.png": "deleted"}, results
+            assert stats["touched"] == 1 and stats["classified"] == 3 and stats["indexed"] == 7
+            stored = {os.path.basename(r["image"]): r for r in index.results()}
+            assert "error" in stored["broken.png"]
+            assert stored["copy.png"]["predictions"] == stored["3.png"]["predictions"]
+            assert len(loads) == 1
+
+            results, _ = run(watcher)
+            assert results == {}
+
+            # Decode errors are not reused: copies and renames are retried
+            shutil.copy(os.path.join(folder, "broken.png"), os.path.join(folder, "broken_copy.png"))
+            os.rename(os.path.join(folder, "broken.png"), os.path.join(folder, "renamed.png"))
+            results, stats = run(watcher)
+            assert results == {"broken_copy.png": "new", "renamed.png": "new",
+                               "broken.png": "deleted"}, results
+            assert stats["reused"] == 0 and stats["classified"] == 2 and stats["indexed"] == 8, stats
+
+            # A rewritten checkpoint reclassifies everything once
+            with open(checkpoint, "w") as f:
+                f.write("v2")
+            os.utime(checkpoint, ns=(1, 2 * 10 ** 9))
+            results, stats = run(watcher)
+            assert stats["classified"] == 8 and set(results.values()) == {"changed"}
+
+        # Different settings invalidate the stored results
+        with FolderIndex(os.path.join(state, "index.db")) as index:
+            watcher = FolderWatcher(folder, index, load_model, decoder, checkpoint=checkpoint,
+                                    top_k=5, min_age_s=0)
+            assert watcher.invalidated
+            _, stats = run(watcher)
+            assert stats["classified"] == 8
+            assert all(len(r.get("predictions", [])) in (0, 5) for r in index.results())
+    print("✅ Watch folder incremental pass test PASSED")
+
+
+def main():
+    run_tests([
+        test_incremental_passes
+    ])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Tests for multi-frame inputs: frames of generated GIF, TIFF and frame
+directory sequences are counted and yielded in order with stride, skip and
+max_frames, and FrameClassifier smooths probabilities with an exponential
+moving average across batches.
+"""
+import json
+import os
+import tempfile
+
+import numpy as np
+import torch
+from PIL import Image
+
+from utils.frames import FrameClassifier, count_frames, is_multiframe, iter_frames
+from testing_helpers import run_cli, run_tests, tiny_model
+
+COLORS = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0), (0, 255, 255),
+          (255, 0, 255), (255, 255, 255)]
+
+
+def make_frames():
+    return [Image.new("RGB", (64, 48), color) for color in COLORS]
+
+
+def frame_color(frame):
+    return tuple(int(c) for c in np.asarray(frame)[10, 10])
+
+
+def test_iter_frames():
+    """GIF, TIFF and frame directories yield the right frames in order."""
+    with tempfile.TemporaryDirectory() as directory:
+        frames = make_frames()
+        sources = []
+        for name in ("sequence.gif", "sequence.tiff"):
+            path = os.path.join(directory, name)
+            frames[0].save(path, save_all=True, append_images=frames[1:], duration=40)
+            sources.append(path)
+        frame_dir = os.path.join(directory, "frames")
+        os.makedirs(frame_dir)
+        for i, frame in enumerate(frames):
+            # Natural order: frame_2 comes before frame_10
+            frame.save(os.path.join(frame_dir, f"frame_{i * 4}.png"))
+        sources.append(frame_dir)
+        single = os.path.join(directory, "single.png")
+        frames[0].save(single)
+
+        for source in sources:
+            assert count_frames(source) == len(COLORS) and is_multiframe(source), source
+            yielded = list(iter_frames(source))
+            assert [index for index, _ in yielded] == list(range(len(COLORS)))
+            assert all(frame.mode == "RGB" and frame.size == (64, 48) for _, frame in yielded)
+            assert [frame_color(frame) for _, frame in yielded] == COLORS, source
+
+            yielded = list(iter_frames(source, stride=2, skip=1, max_frames=2))
+            assert [index for index, _ in yielded] == [1, 3]
+            assert [frame_color(frame) for _, frame in yielded] == [COLORS[1], COLORS[3]]
+
+        assert count_frames(single) == 1 and not is_multiframe(single)
+        assert [index for index, _ in iter_frames(single)] == [0]
+    print("✅ Frame iteration test PASSED")
+
+
+class ScriptedModel:
+    """Returns the next rows of fixed logits on every call, whatever the input."""
+
+    def __init__(self, logits):
+        self.logits = logits
+        self.position = 0
+        self.batch_sizes = []
+
+    def __call__(self, batch):
+        rows = self.logits[self.position:self.position + len(batch)]
+        self.position += len(batch)
+        self.batch_sizes.append(len(batch))
+        return rows
+
+
+def test_smoothing():
+    """Smoothed predictions are the EMA of the frame probabilities across batches."""
+    logits = torch.tensor([[0.0, 4.0, 0.0, 0.0], [0.0, 4.0, 0.0, 0.0], [0.0, 4.0, 0.0, 0.0],
+                           [0.0, 0.0, 4.0, 0.0], [0.0, 4.0, 0.0, 0.0]])
+    model = ScriptedModel(logits)
+    classifier = FrameClassifier(model, top_k=2, batch_size=2, smoothing=0.6)
+    frames = [(i * 3, frame) for i, frame in enumerate(make_frames()[:5])]
+    results = list(classifier.classify(frames))
+    assert model.batch_sizes == [2, 2, 1]
+    assert [result["frame"] for result in results] == [0, 3, 6, 9, 12]
+
+    probabilities = torch.softmax(logits, dim=1).numpy()
+    smoothed = probabilities[0].copy()
+    labels = classifier.class_labels
+    for i, result in enumerate(results):
+        if i:
+            smoothed = 0.6 * smoothed + 0.4 * probabilities[i]
+        for key, expected in (("predictions", probabilities[i]), ("smoothed_predictions", smoothed)):
+            top = np.argsort(-expected)[:2]
+            assert [name for name, _ in result[key]] == [labels[int(idx)] for idx in top]
+            assert np.allclose([c for _, c in result[key]], expected[top], atol=1e-6)
+
+    # The blip at frame 9 changes the frame's prediction but not the smoothed one
+    assert results[3]["predictions"][0][0] == labels[2]
+    assert results[3]["smoothed_predictions"][0][0] == labels[1]
+    mean = probabilities.mean(axis=0)
+    assert np.allclose([c for _, c in classifier.summary()], np.sort(mean)[::-1][:2], atol=1e-6)
+
+    # Without smoothing the smoothed predictions follow the frames
+    unsmoothed = FrameClassifier(ScriptedModel(logits), top_k=1, batch_size=4, smoothing=0)
+    for result in unsmoothed.classify(frames):
+        assert result["smoothed_predictions"] == result["predictions"]
+    print("✅ Frame smoothing test PASSED")
+
+
+def test_cli_output():
+    """--frames --output keeps each frame index and the summary's frame counts."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "sequence.gif")
+        frames = make_frames()
+        frames[0].save(path, save_all=True, append_images=frames[1:], duration=40)
+        output = os.path.join(directory, "results.json")
+        run_cli(["--image", path, "--frames", "--frame_stride", "2", "--output", output],
+                tiny_model())
+        with open(output) as f:
+            entries = json.load(f)
+
+    assert [entry.get("frame") for entry in entries] == [0, 2, 4, 6, None]
+    assert all(len(entry["smoothed_predictions"]) == len(entry["predictions"]) > 0
+               for entry in entries[:-1])
+    assert entries[-1]["total_frames"] == len(COLORS) and entries[-1]["frames_classified"] == 4
+    assert all(entry["image"] == path and entry["predictions"] for entry in entries)
+    print("✅ Frames CLI output test PASSED")
+
+
+def main():
+    run_tests([
+        test_iter_frames,
+        test_smoothing,
+        test_cli_output
+    ])
+
+
+if __name__ == "__main__":
+    main()
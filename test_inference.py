@@ -14,6 +14,20 @@ from utils.model_loader import load_model, get_model_info
 from utils.image_processor import preprocess_image, get_top_predictions
 
 
+CHECKPOINT_PATHS = [
+    "/home/ubuntu/imagenet/checkpoints/last.ckpt",
+    "models/resnet50-epoch=89.ckpt",
+]
+
+
+def find_checkpoint():
+    """Return the first checkpoint in CHECKPOINT_PATHS that exists, or None."""
+    for ckpt_path in CHECKPOINT_PATHS:
+        if os.path.exists(ckpt_path):
+            return ckpt_path
+    return None
+
+
 def create_dummy_image():
     """Create a dummy RGB image for testing."""
     # Create a random 224x224 RGB image
@@ -73,12 +87,19 @@ def test_pretrained_model():
         return False
 
 
-def test_checkpoint_loading(checkpoint_path):
-    """Test loading a Lightning checkpoint."""
+def test_checkpoint_loading(checkpoint_path=None):
+    """Test loading a Lightning checkpoint (the first available one by default)."""
     print("\n" + "="*60)
     print("TEST 2: Lightning Checkpoint Loading")
     print("="*60)
     
+    if checkpoint_path is None:
+        checkpoint_path = find_checkpoint()
+        if checkpoint_path is None:
+            print("⚠️  No checkpoint found")
+            print("Skipping checkpoint test...")
+            return None
+    
     if not os.path.exists(checkpoint_path):
         print(f"⚠️  Checkpoint not found: {checkpoint_path}")
         print("Skipping checkpoint test...")
@@ -136,16 +157,7 @@ def main():
     test1_passed = test_pretrained_model()
     
     # Test 2: Checkpoint loading (if available)
-    checkpoint_paths = [
-        "/home/ubuntu/imagenet/checkpoints/last.ckpt",
-        "models/resnet50-epoch=89.ckpt",
-    ]
-    
-    test2_result = None
-    for ckpt_path in checkpoint_paths:
-        if os.path.exists(ckpt_path):
-            test2_result = test_checkpoint_loading(ckpt_path)
-            break
+    test2_result = test_checkpoint_loading()
     
     # Summary
     print("\n" + "="*60)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Tests for the inference daemon protocol: ping, streamed classification in
+request order, and the CLI falling back to local inference when the daemon
+is missing or serves another checkpoint or execution mode.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from PIL import Image
+
+from inference import classify_with_daemon
+from utils.config import get_config, select_profile
+from utils.inference_client import DaemonUnavailable, InferenceClient
+from utils.inference_server import InferenceDaemon
+from testing_helpers import run_tests, tiny_model
+
+
+def start_daemon(socket_path, checkpoint=None):
+    daemon = InferenceDaemon(checkpoint, socket_path, model=tiny_model())
+    thread = threading.Thread(target=daemon.serve_forever, daemon=True)
+    thread.start()
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            with InferenceClient(socket_path) as client:
+                client.ping(checkpoint)
+            return thread
+        except DaemonUnavailable:
+            time.sleep(0.05)
+    raise AssertionError("daemon did not start")
+
+
+def cli_args(socket_path, **overrides):
+    args = SimpleNamespace(no_daemon=False, profile=False, tiled=False, frames=False, image=[],
+                           socket=socket_path, checkpoint=None, verbose=False, optimize=False,
+                           compile=False, backend=None, perf=select_profile(get_config(), "default"),
+                           top_k=3, threshold=0.0)
+    for key, value in overrides.items():
+        setattr(args, key, value)
+    return args
+
+
+def test_daemon_protocol():
+    """Ping reports the daemon; classify_stream answers every path in order."""
+    with tempfile.TemporaryDirectory() as directory:
+        socket_path = os.path.join(directory, "daemon.sock")
+        paths = []
+        for i in range(3):
+            path = os.path.join(directory, f"{i}.png")
+            pixels = np.random.default_rng(i).integers(0, 255, (64, 80, 3), dtype=np.uint8)
+            Image.fromarray(pixels).save(path)
+            paths.append(path)
+        broken = os.path.join(directory, "broken.png")
+        with open(broken, "wb") as f:
+            f.write(b"not a png")
+        paths.insert(1, broken)
+
+        thread = start_daemon(socket_path)
+        try:
+            with InferenceClient(socket_path) as client:
+                info = client.ping(None, {"backend": None, "precision": "fp32"})
+                assert info["pid"] == os.getpid() and info["checkpoint"] is None
+                for checkpoint, options in [("other.ckpt", None), (None, {"backend": "torchscript"}),
+                                            (None, {"precision": "bf16"}), (None, {"optimize": True})]:
+                    try:
+                        client.ping(checkpoint, options)
+                        assert False, f"mismatch accepted: {checkpoint} {options}"
+                    except DaemonUnavailable:
+                        pass
+
+                results = list(client.classify_stream(iter(paths), top_k=3))
+                assert [r["image"] for r in results] == [os.path.abspath(p) for p in paths]
+                assert "error" in results[1]
+                assert all(len(r["predictions"]) == 3 for i, r in enumerate(results) if i != 1)
+                assert results[0]["image_size"] == [80, 64]
+                assert client.ping()["requests_served"] == 4
+        finally:
+            with InferenceClient(socket_path) as client:
+                client.shutdown()
+            thread.join(5)
+        assert not os.path.exists(socket_path)
+    print("✅ Daemon protocol test PASSED")
+
+
+def test_cli_falls_back_to_local():
+    """The CLI only forwards to a running daemon with the same checkpoint and mode."""
+    with tempfile.TemporaryDirectory() as directory:
+        socket_path = os.path.join(directory, "daemon.sock")
+        assert classify_with_daemon(cli_args(socket_path), []) is None  # no daemon
+
+        thread = start_daemon(socket_path)
+        try:
+            forwarded = classify_with_daemon(cli_args(socket_path), [])
+            assert forwarded is not None and list(forwarded) == []
+            assert classify_with_daemon(cli_args(socket_path, backend="torchscript"), []) is None
+            assert classify_with_daemon(cli_args(socket_path, optimize=True), []) is None
+            assert classify_with_daemon(cli_args(socket_path, checkpoint="x.ckpt"), []) is None
+            latency = select_profile(get_config(), "latency")
+            assert classify_with_daemon(cli_args(socket_path, perf=latency), []) is None
+        finally:
+            with InferenceClient(socket_path) as client:
+                client.shutdown()
+            thread.join(5)
+    print("✅ Daemon fallback test PASSED")
+
+
+def test_requests_served_count():
+    """Requests handled on concurrent connection threads are all counted."""
+    daemon = InferenceDaemon(None, "unused.sock", model=tiny_model())
+    request = {"op": "classify", "image": "/nonexistent/image.png"}
+
+    def hammer():
+        for _ in range(50):
+            assert "error" in daemon.handle_request(request)
+
+    threads = [threading.Thread(target=hammer) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert daemon.handle_request({"op": "ping"})["requests_served"] == 400
+    print("✅ Daemon request count test PASSED")
+
+
+def test_client_startup_imports():
+    """Importing inference.py (the daemon client path) loads no numpy, PIL or torch."""
+    code = ("import sys, inference; "
+            "print(sorted(m for m in ('numpy', 'PIL', 'torch') if m in sys.modules))")
+    loaded = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                            check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert loaded.stdout.strip() == "[]", loaded.stdout
+    print("✅ Client startup imports test PASSED")
+
+
+def main():
+    run_tests([
+        test_daemon_protocol,
+        test_cli_falls_back_to_local,
+        test_requests_served_count,
+        test_client_startup_imports
+    ])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Tests for checkpoint loading: Lightning checkpoints and raw state dicts are
+streamed into a meta-device ResNet50 and give the same logits as the model
+they were saved from, and key mismatches raise instead of leaving
+uninitialized (meta) tensors in the model.
+"""
+import contextlib
+import io
+import os
+import tempfile
+
+import torch
+from torchvision import models
+
+from utils.model_loader import build_resnet50, load_model, stream_state_dict
+from testing_helpers import run_tests
+
+
+def reference_model(num_classes=1000):
+    torch.manual_seed(0)
+    model = models.resnet50(weights=None, num_classes=num_classes).eval()
+    # Non-trivial running statistics, so buffers are checked too
+    with torch.no_grad():
+        model.train()(torch.randn(4, 3, 64, 64))
+    return model.eval()
+
+
+def load_quietly(path):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return load_model(path)
+
+
+def assert_loaded(model, reference):
+    assert not any(t.is_meta for t in list(model.parameters()) + list(model.buffers()))
+    inputs = torch.randn(2, 3, 64, 64)
+    with torch.no_grad():
+        assert torch.allclose(model(inputs), reference(inputs), atol=1e-5)
+
+
+def test_lightning_checkpoint():
+    """Prefixes and EMA weights are handled; num_classes comes from hyper_parameters."""
+    reference = reference_model(num_classes=10)
+    state_dict = {}
+    for i, (key, tensor) in enumerate(reference.state_dict().items()):
+        # Keys of a compiled and a plain Lightning module
+        state_dict[("model._orig_mod." if i % 2 else "model.") + key] = tensor.clone()
+        state_dict["ema_model." + key] = torch.zeros_like(tensor)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "lightning.ckpt")
+        torch.save({"state_dict": state_dict, "hyper_parameters": {"num_classes": 10},
+                    "optimizer_states": [{}], "epoch": 3}, path)
+        model = load_quietly(path)
+    assert model.fc.out_features == 10
+    assert_loaded(model, reference)
+    print("✅ Lightning checkpoint test PASSED")
+
+
+def test_raw_state_dict():
+    """Direct and model_state_dict checkpoints load the same weights."""
+    reference = reference_model()
+    with tempfile.TemporaryDirectory() as directory:
+        raw = os.path.join(directory, "raw.pth")
+        torch.save(reference.state_dict(), raw)
+        assert_loaded(load_quietly(raw), reference)
+
+        wrapped = os.path.join(directory, "wrapped.pth")
+        torch.save({"model_state_dict": reference.state_dict(), "epoch": 1}, wrapped)
+        assert_loaded(load_quietly(wrapped), reference)
+    print("✅ Raw state dict test PASSED")
+
+
+def test_key_mismatch():
+    """Strict loads raise on mismatches; non-strict loads fill in missing tensors."""
+    reference = reference_model()
+
+    def raises(state_dict):
+        try:
+            stream_state_dict(build_resnet50(), state_dict)
+        except RuntimeError:
+            return True
+        return False
+
+    missing = reference.state_dict()
+    del missing["layer1.0.conv1.weight"]
+    assert raises(missing)
+    renamed = reference.state_dict()
+    renamed["head.weight"] = renamed.pop("fc.weight")
+    assert raises(renamed)
+    resized = reference.state_dict()
+    resized["fc.weight"] = resized["fc.weight"][:10]
+    assert raises(resized)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "missing.pth")
+        missing = reference.state_dict()
+        del missing["fc.bias"]
+        torch.save(missing, path)
+        try:
+            load_quietly(path)
+            assert False, "a state dict with a missing key must not load"
+        except RuntimeError as e:
+            assert "fc.bias" in str(e)
+
+    model = build_resnet50()
+    partial = reference.state_dict()
+    del partial["layer4.2.bn3.running_mean"]
+    missing_keys, unexpected_keys = stream_state_dict(model, partial, strict=False)
+    assert missing_keys == ["layer4.2.bn3.running_mean"] and unexpected_keys == []
+    assert not any(t.is_meta for t in model.state_dict().values())
+    assert torch.equal(model.layer4[2].bn3.running_mean, torch.zeros(2048))
+    print("✅ Key mismatch test PASSED")
+
+
+def main():
+    run_tests([
+        test_lightning_checkpoint,
+        test_raw_state_dict,
+        test_key_mismatch
+    ])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Tests for the optimized eager and compiled modes: BatchNorm layers that
+follow a convolution are folded into it and the optimized model reproduces
+the eager logits; the compiled wrapper pads batches up to a warmed-up size
+and splits larger ones without changing the results.
+"""
+import copy
+
+import torch
+
+from utils.optimization import (
+    CompiledModel,
+    OptimizedModel,
+    compare_logits,
+    fold_batchnorm,
+    logits_match,
+    optimize_for_inference,
+    sample_inputs
+)
+from testing_helpers import run_tests
+
+
+def conv_bn_model():
+    """Conv/BN pairs at two nesting levels plus a BatchNorm that must not be folded."""
+    torch.manual_seed(0)
+    model = torch.nn.Sequential(
+        torch.nn.Conv2d(3, 8, 3, stride=4),
+        torch.nn.BatchNorm2d(8),
+        torch.nn.ReLU(),
+        torch.nn.Sequential(torch.nn.Conv2d(8, 8, 3, padding=1, bias=False), torch.nn.BatchNorm2d(8)),
+        torch.nn.ReLU(),
+        torch.nn.BatchNorm2d(8),
+        torch.nn.AdaptiveAvgPool2d(1),
+        torch.nn.Flatten(),
+        torch.nn.Linear(8, 10)
+    )
+    # Non-trivial running statistics and affine parameters
+    with torch.no_grad():
+        model.train()(sample_inputs(8, seed=1) * 3 + 1)
+        for module in model.modules():
+            if isinstance(module, torch.nn.BatchNorm2d):
+                module.weight.uniform_(0.5, 1.5)
+                module.bias.uniform_(-0.5, 0.5)
+    return model.eval()
+
+
+def test_fold_batchnorm():
+    """Conv/BN pairs are folded, other BatchNorms kept, and the logits are unchanged."""
+    model = conv_bn_model()
+    inputs = sample_inputs(4)
+    with torch.no_grad():
+        expected = model(inputs)
+
+    folded = copy.deepcopy(model)
+    assert fold_batchnorm(folded) == 2
+    batchnorms = [m for m in folded.modules() if isinstance(m, torch.nn.BatchNorm2d)]
+    assert len(batchnorms) == 1 and folded[5] is batchnorms[0]
+    assert isinstance(folded[1], torch.nn.Identity) and isinstance(folded[3][1], torch.nn.Identity)
+    with torch.no_grad():
+        assert logits_match(compare_logits(expected, folded(inputs)))
+
+    optimized = optimize_for_inference(copy.deepcopy(model))
+    assert isinstance(optimized, OptimizedModel)
+    stats = compare_logits(expected, optimized(inputs))
+    assert logits_match(stats), stats
+    assert optimized(inputs).shape == (4, 10)
+    print("✅ BatchNorm folding parity test PASSED")
+
+
+class RecordingRunner:
+    """Stands in for the torch.compile'd callable: runs the eager model, records batch sizes."""
+
+    def __init__(self, model):
+        self.model = model
+        self.batch_sizes = []
+
+    def __call__(self, x):
+        self.batch_sizes.append(x.shape[0])
+        return self.model(x)
+
+
+def test_compiled_batch_padding():
+    """Batches are padded to a warmed-up size or split, with eager results."""
+    model = conv_bn_model()
+    runner = RecordingRunner(model)
+    compiled = CompiledModel(model, runner, batch_sizes=(8, 1, 4, 2))
+    assert compiled.batch_sizes == (1, 2, 4, 8)
+
+    for batch_size, calls in [(3, [4]), (9, [8, 1]), (4, [4]), (17, [8, 8, 1])]:
+        runner.batch_sizes.clear()
+        inputs = sample_inputs(batch_size, seed=batch_size)
+        with torch.no_grad():
+            expected = model(inputs)
+        outputs = compiled(inputs)
+        assert runner.batch_sizes == calls, (batch_size, runner.batch_sizes)
+        assert outputs.shape == (batch_size, 10)
+        assert torch.allclose(outputs, expected, atol=1e-5), batch_size
+    print("✅ Compiled batch padding test PASSED")
+
+
+def main():
+    run_tests([
+        test_fold_batchnorm,
+        test_compiled_batch_padding
+    ])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Tests for profiler runs: a profiled forward pass writes a Chrome trace, the
+operator tables and the run metadata into its own directory.
+"""
+import json
+import os
+import tempfile
+
+import torch
+from torch.profiler import record_function
+
+from utils.profiling import FORWARD_LABEL, ProfileRun
+from testing_helpers import run_tests, tiny_model
+
+
+def test_profile_run_writes_artifacts():
+    """trace.json, both op tables and metadata.json are written; failed runs write nothing."""
+    model = tiny_model()
+    with tempfile.TemporaryDirectory() as directory:
+        with ProfileRun(output_dir=directory, name="test", metadata={"checkpoint": "x.ckpt"}) as run:
+            with torch.no_grad(), record_function(FORWARD_LABEL):
+                model(torch.randn(2, 3, 32, 32))
+
+        assert os.path.dirname(run.run_dir) == directory and run.run_dir.endswith("-test")
+        assert sorted(os.listdir(run.run_dir)) == [
+            "metadata.json", "ops_by_memory.txt", "ops_by_self_cpu.txt", "trace.json"
+        ]
+        with open(os.path.join(run.run_dir, "trace.json")) as f:
+            events = json.load(f)["traceEvents"]
+        assert any(event.get("name") == FORWARD_LABEL for event in events)
+        with open(os.path.join(run.run_dir, "ops_by_self_cpu.txt")) as f:
+            assert "aten::addmm" in f.read() and "aten::addmm" in run.cpu_table
+        with open(os.path.join(run.run_dir, "metadata.json")) as f:
+            metadata = json.load(f)
+        assert metadata["checkpoint"] == "x.ckpt" and metadata["device"] == "cpu"
+        assert metadata["wall_time_s"] > 0 and metadata["torch_version"] == torch.__version__
+
+        try:
+            with ProfileRun(output_dir=directory, name="failed") as failed:
+                raise ValueError("boom")
+        except ValueError:
+            pass
+        assert failed.run_dir is None and len(os.listdir(directory)) == 1
+    print("✅ Profile run artifacts test PASSED")
+
+
+def main():
+    run_tests([
+        test_profile_run_writes_artifacts
+    ])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Tests for the compact result sink: stored rows read back correctly and the
+streaming aggregates match a direct computation.
+"""
+import tempfile
+
+import numpy as np
+
+from utils.result_sink import ResultSink, ResultStore
+from testing_helpers import run_tests
+
+
+def test_roundtrip_and_aggregates():
+    """Chunked writes, errors and thresholded rows round-trip; aggregates are exact."""
+    rng = np.random.default_rng(0)
+    indices = rng.integers(0, 1000, (250, 3))
+    confidences = np.sort(rng.random((250, 3)), axis=1)[:, ::-1]
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        with ResultSink(output_dir, top_k=3, chunk_size=64, low_confidence=0.5, bins=10) as sink:
+            sink.add_batch([f"img{i}.jpg" for i in range(200)], indices[:200], confidences[:200])
+            for i in range(200, 250):
+                sink.add(f"img{i}.jpg", list(zip(indices[i].tolist(), confidences[i].tolist())))
+            sink.add("broken.jpg", None)
+            sink.add("below_threshold.jpg", [])
+
+        store = ResultStore(output_dir)
+        assert len(store) == 252
+        results = list(store.iter_results())
+        assert results[10]["image"] == "img10.jpg"
+        assert [p["class_index"] for p in results[10]["predictions"]] == indices[10].tolist()
+        assert abs(results[10]["predictions"][0]["confidence"] - confidences[10, 0]) < 1e-3
+        assert results[250]["predictions"] == [] and results[251]["predictions"] == []
+
+        summary = store.summary()
+        top1 = confidences[:, 0]
+        assert summary["images"] == 252 and summary["errors"] == 1
+        assert summary["low_confidence"] == int((top1 < 0.5).sum())
+        assert summary["class_counts"] == np.bincount(indices[:, 0], minlength=1000).tolist()
+        expected_histogram = np.bincount(np.minimum((top1 * 10).astype(int), 9), minlength=10)
+        assert summary["histogram"] == expected_histogram.tolist()
+    print("✅ Result sink round-trip test PASSED")
+
+
+def test_num_classes():
+    """Aggregates follow the model's class count; out-of-range indices are rejected."""
+    with tempfile.TemporaryDirectory() as output_dir:
+        with ResultSink(output_dir, top_k=2, num_classes=10) as sink:
+            sink.add("a.jpg", [(9, 0.9), (3, 0.1)])
+            try:
+                sink.add_batch(["b.jpg"], [[10, 0]], [[0.8, 0.2]])
+                assert False, "index beyond num_classes accepted"
+            except ValueError as e:
+                assert "num_classes=10" in str(e)
+        assert len(ResultStore(output_dir).summary()["class_counts"]) == 10
+
+        try:
+            ResultSink(output_dir, num_classes=40000)
+            assert False, "num_classes beyond int16 accepted"
+        except ValueError as e:
+            assert "int16" in str(e)
+    print("✅ Result sink class count test PASSED")
+
+
+def main():
+    run_tests([
+        test_roundtrip_and_aggregates,
+        test_num_classes
+    ])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Tests for the inference scheduler: round-robin service across sessions,
+requests of different sessions merged into one batch, rejection when the
+queue is full, the max_concurrent limit, and session generations (requests
+of a superseded run are dropped instead of being run).
+"""
+import threading
+import time
+from concurrent.futures import wait
+
+import torch
+
+from utils.scheduler import InferenceScheduler, SchedulerBusy, SessionGenerations, Superseded
+from testing_helpers import run_tests
+
+
+class GatedModel(torch.nn.Module):
+    """Identity model that blocks each forward pass until released."""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Semaphore(0)
+        self.started = threading.Event()
+        self.calls = 0
+        self.batches = []
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def forward(self, x):
+        with self._lock:
+            self.calls += 1
+            self.batches.append(x[:, 0].tolist())
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        self.started.set()
+        self.release.acquire()
+        with self._lock:
+            self.running -= 1
+        return x
+
+
+def release_all(model, scheduler, count=64):
+    for _ in range(count):
+        model.release.release()
+    scheduler.close()
+
+
+def block_worker(model, scheduler):
+    """Occupy the (single) worker so that later requests stay queued."""
+    future = scheduler.submit(torch.full((1, 1), -1.0), "blocker")
+    model.started.wait(5)
+    return future
+
+
+def test_round_robin_across_sessions():
+    """Queued requests are served one per session per round, not in arrival order."""
+    model = GatedModel()
+    scheduler = InferenceScheduler(model, max_batch_size=1)
+    try:
+        blocker = block_worker(model, scheduler)
+        futures = [scheduler.submit(torch.full((1, 1), 10.0 + i), "a") for i in range(3)]
+        futures += [scheduler.submit(torch.full((1, 1), 20.0 + i), "b") for i in range(2)]
+        futures += [scheduler.submit(torch.full((1, 1), 30.0), "c")]
+        for _ in range(7):
+            model.release.release()
+        wait([blocker] + futures, timeout=5)
+        assert [batch[0] for batch in model.batches] == [-1.0, 10.0, 20.0, 30.0, 11.0, 21.0, 12.0]
+        assert all(future.result().batch_size == 1 for future in futures)
+    finally:
+        release_all(model, scheduler)
+    print("✅ Scheduler round-robin test PASSED")
+
+
+def test_sessions_merged_into_one_batch():
+    """Requests of different sessions share a forward pass up to max_batch_size images."""
+    model = GatedModel()
+    scheduler = InferenceScheduler(model, max_batch_size=4)
+    try:
+        blocker = block_worker(model, scheduler)
+        first = scheduler.submit(torch.tensor([[1.0], [2.0]]), "a")
+        second = scheduler.submit(torch.tensor([[3.0]]), "b")
+        third = scheduler.submit(torch.tensor([[4.0], [5.0]]), "c")
+        for _ in range(3):
+            model.release.release()
+        wait([blocker, first, second, third], timeout=5)
+        # c's two images would exceed the limit of 4, so they form the next batch
+        assert model.batches[1:] == [[1.0, 2.0, 3.0], [4.0, 5.0]]
+        assert first.result().output[:, 0].tolist() == [1.0, 2.0]
+        assert second.result().output[:, 0].tolist() == [3.0]
+        assert first.result().batch_size == 3 and third.result().batch_size == 2
+        assert scheduler.stats()["batches"] == 3
+    finally:
+        release_all(model, scheduler)
+    print("✅ Scheduler cross-session batching test PASSED")
+
+
+def test_full_queue_rejects():
+    """Requests beyond max_queue_depth raise SchedulerBusy; queued ones still finish."""
+    model = GatedModel()
+    scheduler = InferenceScheduler(model, max_batch_size=1, max_queue_depth=2)
+    try:
+        blocker = block_worker(model, scheduler)
+        queued = [scheduler.submit(torch.zeros(1, 1), f"s{i}") for i in range(2)]
+        try:
+            scheduler.submit(torch.zeros(1, 1), "late")
+            assert False, "request accepted beyond max_queue_depth"
+        except SchedulerBusy:
+            pass
+        assert scheduler.stats()["queue_depth"] == 2
+        for _ in range(3):
+            model.release.release()
+        wait([blocker] + queued, timeout=5)
+        assert all(future.done() and not future.exception() for future in queued)
+    finally:
+        release_all(model, scheduler)
+    print("✅ Scheduler full queue test PASSED")
+
+
+def test_max_concurrent():
+    """No more than max_concurrent forward passes run at once."""
+    model = GatedModel()
+    scheduler = InferenceScheduler(model, max_concurrent=2, max_batch_size=1)
+    try:
+        futures = [scheduler.submit(torch.zeros(1, 1), f"s{i}") for i in range(5)]
+        deadline = time.time() + 5
+        while model.running < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.1)
+        assert model.running == 2 and scheduler.stats()["active"] == 2
+        assert scheduler.stats()["queue_depth"] == 3
+        for _ in range(5):
+            model.release.release()
+        wait(futures, timeout=5)
+        assert all(future.done() for future in futures)
+        assert model.max_running == 2 and model.calls == 5
+    finally:
+        release_all(model, scheduler)
+    print("✅ Scheduler max_concurrent test PASSED")
+
+
+def test_generations_are_bounded():
+    """Only the most recently active sessions are tracked."""
+    generations = SessionGenerations(max_sessions=3)
+    for session in ["a", "b", "c", "a", "d"]:
+        generations.begin(session)
+    assert list(generations._current) == ["c", "a", "d"]
+    assert generations.begin("a") == 3
+    # A forgotten session starts over and its old requests are not stale
+    assert generations.is_current("b", 1) and generations.begin("b") == 1
+    generations.end("b")
+    assert "b" not in generations._current
+    print("✅ Session generations bound test PASSED")
+
+
+def test_superseded_requests_are_dropped():
+    """Queued requests of an older generation fail with Superseded; the newest run is served."""
+    model = GatedModel()
+    generations = SessionGenerations()
+    scheduler = InferenceScheduler(model, max_batch_size=1, generations=generations)
+    try:
+        old = generations.begin("session")
+        running = scheduler.submit(torch.zeros(1, 1), "session", old)
+        model.started.wait(5)
+        queued = [scheduler.submit(torch.zeros(1, 1), "session", old) for _ in range(3)]
+        other = scheduler.submit(torch.ones(1, 1), "other")
+
+        new = generations.begin("session")
+        try:
+            scheduler.submit(torch.zeros(1, 1), "session", old)
+            assert False, "stale generation accepted"
+        except Superseded:
+            pass
+        current = scheduler.submit(torch.full((1, 1), 2.0), "session", new)
+
+        for _ in range(3):
+            model.release.release()
+        wait([running, other, current], timeout=5)
+        assert running.result().output.shape == (1, 1)
+        assert float(other.result().output) == 1.0
+        assert float(current.result().output) == 2.0
+        for future in queued:
+            assert isinstance(future.exception(timeout=5), Superseded)
+        assert model.calls == 3
+        assert scheduler.stats()["superseded"] == 3
+    finally:
+        for _ in range(8):
+            model.release.release()
+        scheduler.close()
+    print("✅ Scheduler superseded-run test PASSED")
+
+
+def main():
+    run_tests([
+        test_round_robin_across_sessions,
+        test_sessions_merged_into_one_batch,
+        test_full_queue_rejects,
+        test_max_concurrent,
+        test_generations_are_bounded,
+        test_superseded_requests_are_dropped
+    ])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Tests for shadow comparison: statistics match a direct per-model computation
+and each image is decoded once for both models.
+"""
+import contextlib
+import io
+import os
+import tempfile
+from unittest import mock
+
+import numpy as np
+import torch
+from PIL import Image
+
+import utils.shadow
+from utils.image_processor import preprocess_image
+from utils.shadow import ShadowComparison, compare_images
+from testing_helpers import run_cli, run_tests, tiny_model
+
+
+def test_comparison_matches_direct_predictions():
+    """Agreement, flips and per-class counts equal separate runs of each model."""
+    baseline, candidate = tiny_model(0), tiny_model(1)
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for i in range(10):
+            pixels = np.random.default_rng(i).integers(0, 255, (240 + 9 * i, 260, 3), dtype=np.uint8)
+            paths.append(os.path.join(directory, f"img{i}.jpg"))
+            Image.fromarray(pixels).save(paths[-1])
+        broken = os.path.join(directory, "broken.jpg")
+        with open(broken, "wb") as f:
+            f.write(b"not an image")
+
+        comparison = ShadowComparison()
+        images = [(path, path) for path in paths[:4] + [broken] + paths[4:]]
+        with mock.patch.object(utils.shadow, "decode_uint8", wraps=utils.shadow.decode_uint8) as decode:
+            rows = list(compare_images(baseline, candidate, images, comparison, batch_size=4))
+            assert decode.call_count == len(paths)
+
+        assert [row["image"] for row in rows if "error" in row] == [broken]
+        rows = [row for row in rows if "error" not in row]
+        assert [row["image"] for row in rows] == paths
+
+        with torch.no_grad():
+            batch = torch.cat([preprocess_image(Image.open(path).convert('RGB')) for path in paths])
+            expected_baseline = baseline(batch).argmax(dim=1).tolist()
+            expected_candidate = candidate(batch).argmax(dim=1).tolist()
+        assert [row["baseline"]["class_index"] for row in rows] == expected_baseline
+        assert [row["candidate"]["class_index"] for row in rows] == expected_candidate
+
+        agree = [b == c for b, c in zip(expected_baseline, expected_candidate)]
+        summary = comparison.summary()
+        assert summary["images"] == len(paths)
+        assert summary["flips"] == agree.count(False)
+        assert abs(summary["agreement_rate"] - agree.count(True) / len(paths)) < 1e-9
+        flipped = [b for b, same in zip(expected_baseline, agree) if not same]
+        for entry in summary["disagreement_by_class"]:
+            assert entry["disagreements"] == flipped.count(entry["class_index"])
+            assert entry["images"] == expected_baseline.count(entry["class_index"])
+    print("✅ Shadow comparison test PASSED")
+
+
+def test_identical_models_agree():
+    """A checkpoint compared with itself agrees everywhere."""
+    model = tiny_model(0)
+    comparison = ShadowComparison()
+    images = [(f"img{i}", Image.new("RGB", (300, 250), (40 * i, 90, 200))) for i in range(5)]
+    rows = list(compare_images(model, model, images, comparison, batch_size=2))
+    assert all(row["agree"] for row in rows)
+    summary = comparison.summary()
+    assert summary["agreement_rate"] == 1.0 and summary["flips"] == 0
+    assert summary["disagreement_by_class"] == [] and abs(summary["mean_confidence_shift"]) < 1e-6
+    print("✅ Shadow self-comparison test PASSED")
+
+
+def test_class_count_from_logits():
+    """Statistics are sized by the models' outputs; mismatched heads are rejected."""
+    images = [(f"img{i}", Image.new("RGB", (240, 240), (60 * i, 30, 90))) for i in range(3)]
+    comparison = ShadowComparison()
+    assert comparison.summary()["images"] == 0
+    list(compare_images(tiny_model(0, num_classes=5000), tiny_model(1, num_classes=5000),
+                        images, comparison))
+    assert comparison.num_classes == 5000 and comparison.summary()["images"] == 3
+    try:
+        list(compare_images(tiny_model(0, num_classes=10), tiny_model(1), images,
+                            ShadowComparison()))
+        assert False, "models with different class counts compared"
+    except ValueError as e:
+        assert "10 and 1000 classes" in str(e)
+    print("✅ Shadow class count test PASSED")
+
+
+def test_callables_and_top_flips():
+    """Models can be callables (the app's schedulers); top_flips has its own limit."""
+    baseline, candidate = tiny_model(0, num_classes=3), tiny_model(1, num_classes=3)
+    images = [(f"img{i}", Image.new("RGB", (240, 240), (25 * i, 255 - 20 * i, 90)))
+              for i in range(12)]
+    expected = list(compare_images(baseline, candidate, images, ShadowComparison()))
+
+    comparison = ShadowComparison()
+    rows = list(compare_images(lambda batch: baseline(batch), lambda batch: candidate(batch),
+                               images, comparison, batch_size=5))
+    assert [(row["baseline"]["class_index"], row["candidate"]["class_index"]) for row in rows] == \
+        [(row["baseline"]["class_index"], row["candidate"]["class_index"]) for row in expected]
+    flips = comparison.summary()["flips"]
+    assert flips > 2
+    assert len(comparison.summary(top_classes=1)["top_flips"]) == flips
+    summary = comparison.summary(top_classes=1, top_flips=2)
+    assert len(summary["top_flips"]) == 2 and len(summary["disagreement_by_class"]) == 1
+    print("✅ Shadow callables and top flips test PASSED")
+
+
+def test_cli_class_count_mismatch():
+    """--shadow_checkpoint with a different head exits with an error, not a traceback."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "img.png")
+        Image.new("RGB", (240, 240), (10, 200, 30)).save(path)
+        shadow = os.path.join(directory, "shadow.ckpt")
+        open(shadow, "wb").close()
+        stderr = io.StringIO()
+        try:
+            with contextlib.redirect_stderr(stderr):
+                run_cli(["--image", path, "--shadow_checkpoint", shadow],
+                        [tiny_model(0, num_classes=10), tiny_model(1)])
+            assert False, "mismatched checkpoints compared"
+        except SystemExit as e:
+            assert e.code == 1
+    assert "❌ Shadow comparison failed" in stderr.getvalue()
+    assert "10 and 1000 classes" in stderr.getvalue()
+    print("✅ Shadow CLI class count test PASSED")
+
+
+def main():
+    run_tests([
+        test_comparison_matches_direct_predictions,
+        test_identical_models_agree,
+        test_class_count_from_logits,
+        test_callables_and_top_flips,
+        test_cli_class_count_mismatch
+    ])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Tests for the memory-mapped tensor cache: cached batches must match the
+regular preprocess_image pipeline exactly.
+"""
+import json
+import os
+import tempfile
+
+import numpy as np
+import torch
+from PIL import Image
+
+from utils.image_processor import preprocess_image
+from utils.tensor_cache import build_tensor_cache
+from testing_helpers import run_tests
+
+
+def make_images(directory, count=6):
+    paths = []
+    for i in range(count):
+        size = (300 + 37 * i, 260 + 11 * i)
+        pixels = np.random.default_rng(i).integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+        path = os.path.join(directory, f"img{i}.jpg")
+        Image.fromarray(pixels).save(path)
+        paths.append(path)
+    return paths
+
+
+def test_cache_matches_preprocessing():
+    """Cached batches equal preprocess_image output; broken files are flagged."""
+    with tempfile.TemporaryDirectory() as directory:
+        paths = make_images(directory)
+        broken = os.path.join(directory, "broken.jpg")
+        with open(broken, "wb") as f:
+            f.write(b"not an image")
+
+        cache = build_tensor_cache(paths + [broken], os.path.join(directory, "cache"), workers=2)
+        assert len(cache) == len(paths) + 1
+        assert cache.row(broken) is None and cache.row(paths[2]) == 2
+
+        expected = torch.cat([preprocess_image(Image.open(path).convert('RGB')) for path in paths])
+        batches = [batch for _, batch in cache.iter_batches(batch_size=4)]
+        assert torch.equal(torch.cat(batches)[:len(paths)], expected)
+        assert torch.equal(cache.batch([4, 1]), expected[[4, 1]])
+        # Consecutive rows are read straight from the mapped file
+        assert cache.uint8_batch(range(1, 3)).data_ptr() == cache.array[1:3].ctypes.data
+    print("✅ Tensor cache parity test PASSED")
+
+
+def test_cache_is_reused_until_sources_change():
+    """An up-to-date cache is reopened; a modified source or crop triggers a rebuild."""
+    with tempfile.TemporaryDirectory() as directory:
+        paths = make_images(directory, count=3)
+        cache_dir = os.path.join(directory, "cache")
+        build_tensor_cache(paths, cache_dir, workers=1)
+        tensors_path = os.path.join(cache_dir, "tensors.npy")
+        built_at = os.stat(tensors_path).st_mtime_ns
+
+        build_tensor_cache(paths, cache_dir, workers=1)
+        assert os.stat(tensors_path).st_mtime_ns == built_at
+
+        Image.new("RGB", (256, 256), (255, 0, 0)).save(paths[1])
+        cache = build_tensor_cache(paths, cache_dir, workers=1)
+        assert (cache.uint8_batch([1])[0, 0] > 240).all()
+
+        # A cache cropped with another resize_size/img_size is stale
+        built_at = os.stat(tensors_path).st_mtime_ns
+        index_path = os.path.join(cache_dir, "index.json")
+        with open(index_path, "r") as f:
+            index = json.load(f)
+        with open(index_path, "w") as f:
+            json.dump({**index, "resize": index["resize"] + 32}, f)
+        build_tensor_cache(paths, cache_dir, workers=1)
+        assert os.stat(tensors_path).st_mtime_ns != built_at
+    print("✅ Tensor cache reuse test PASSED")
+
+
+def main():
+    run_tests([
+        test_cache_matches_preprocessing,
+        test_cache_is_reused_until_sources_change
+    ])
+
+
+if __name__ == "__main__":
+    main()
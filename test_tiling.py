@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Tests for tiled inference: the tiles cover the whole image, edge tiles
+included, at every scale, and a single-tile image gets the same predictions
+as classifying it directly.
+"""
+import json
+import os
+import tempfile
+
+import numpy as np
+import torch
+from PIL import Image
+from torchvision import transforms
+
+from utils.image_processor import IMAGENET_MEAN, IMAGENET_STD, get_top_predictions
+from utils.tiling import classify_tiled, iter_tiles
+from testing_helpers import run_cli, run_tests, tiny_model
+
+
+def make_image(width, height, seed=0):
+    pixels = np.random.default_rng(seed).integers(0, 255, (height, width, 3), dtype=np.uint8)
+    return Image.fromarray(pixels)
+
+
+def test_tiles_cover_image():
+    """Every pixel is in some tile; edge tiles end flush with the image."""
+    image = make_image(500, 300)
+    pixels = np.asarray(image)
+    for scales in [(1.0,), (0.5,), (1.0, 0.6)]:
+        covered = np.zeros((300, 500), dtype=bool)
+        for (left, top, right, bottom), tile in iter_tiles(image, overlap=0.25, scales=scales):
+            assert tile.shape == (224, 224, 3)
+            assert left >= 0 and top >= 0 and right <= 500 + 1e-6 and bottom <= 300 + 1e-6
+            covered[round(top):round(bottom), round(left):round(right)] = True
+            if scales == (1.0,):
+                box = (int(left), int(top), int(right), int(bottom))
+                assert np.array_equal(tile, pixels[box[1]:box[3], box[0]:box[2]])
+        assert covered.all(), scales
+
+    boxes = [box for box, _ in iter_tiles(image, overlap=0.25)]
+    # 500 = 0, 168, 276 (flush); 300 = 0, 76 (flush)
+    assert sorted({box[0] for box in boxes}) == [0, 168, 276]
+    assert sorted({box[1] for box in boxes}) == [0, 76]
+    assert len(boxes) == 6
+
+    # Smaller than a tile: upscaled into a single tile spanning the image
+    small = list(iter_tiles(make_image(100, 150)))
+    assert len(small) == 1 and small[0][0] == (0, 0, 100, 150)
+    print("✅ Tile coverage test PASSED")
+
+
+def test_single_tile_matches_plain_prediction():
+    """A tile-sized image gives the same top-k as one direct forward pass."""
+    model = tiny_model()
+    image = make_image(224, 224, seed=1)
+    result = classify_tiled(model, image, top_k=5)
+    assert result["num_tiles"] == 1
+
+    normalize = transforms.Compose([transforms.ToTensor(),
+                                    transforms.Normalize(IMAGENET_MEAN, IMAGENET_STD)])
+    with torch.no_grad():
+        probabilities = torch.softmax(model(normalize(image).unsqueeze(0))[0], dim=0)
+    expected = get_top_predictions(probabilities, top_k=5)
+
+    assert [name for name, _ in result["predictions"]] == [name for name, _ in expected]
+    assert np.allclose([c for _, c in result["predictions"]], [c for _, c in expected], atol=1e-5)
+    # With one tile the mean is the maximum and every heatmap cell holds it
+    assert np.allclose(result["mean_confidences"], [c for _, c in expected], atol=1e-5)
+    top = result["class_indices"][0]
+    assert np.allclose(result["heatmaps"][top], expected[0][1], atol=1e-5)
+    print("✅ Single tile parity test PASSED")
+
+
+def test_cli_output():
+    """--tiled --output keeps the tile count and heatmap paths."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "large.png")
+        make_image(500, 300).save(path)
+        output = os.path.join(directory, "results.json")
+        heatmap_dir = os.path.join(directory, "heatmaps")
+        run_cli(["--image", path, "--tiled", "--top_k", "2", "--heatmap_dir", heatmap_dir,
+                 "--output", output], tiny_model())
+        with open(output) as f:
+            entry = json.load(f)
+        assert entry["tiles"] == 6 and len(entry["predictions"]) == 2
+        assert "mean_confidence" in entry["predictions"][0]
+        assert len(entry["heatmaps"]) == 2 and all(os.path.exists(p) for p in entry["heatmaps"])
+    print("✅ Tiled CLI output test PASSED")
+
+
+def main():
+    run_tests([
+        test_tiles_cover_image,
+        test_single_tile_matches_plain_prediction,
+        test_cli_output
+    ])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Tests for the single-decode upload path: inputs written into the shared
+buffer match preprocess_image, slots are reused and never shared between
+in-flight uploads, and previews come from the decoded image.
+"""
+import io
+
+import numpy as np
+import torch
+from PIL import Image
+
+from utils.image_processor import preprocess_image
+from utils.upload_buffer import UploadBuffer, as_rgb, open_upload, preview_image
+from testing_helpers import run_tests
+
+
+def make_upload(width, height, mode="RGB", format="PNG"):
+    pixels = np.random.default_rng(width).integers(0, 255, (height, width, 3), dtype=np.uint8)
+    data = io.BytesIO()
+    Image.fromarray(pixels).convert(mode).save(data, format=format)
+    return io.BytesIO(data.getvalue())
+
+
+def test_matches_preprocess_image():
+    """Buffer inputs equal preprocess_image to within one intensity level."""
+    buffer = UploadBuffer(slots=2, device=torch.device("cpu"))
+    for width, height, mode in [(640, 480, "RGB"), (300, 777, "L"), (256, 256, "P")]:
+        with open_upload(make_upload(width, height, mode)) as source:
+            image = as_rgb(source)
+            assert image.mode == "RGB" and (mode != "RGB" or image is source)
+            expected = preprocess_image(image)
+            with buffer.reserve() as fill:
+                inputs = fill(image)
+                assert inputs.shape == expected.shape and inputs.is_contiguous()
+                # 1/255 divided by the smallest std
+                assert (inputs - expected).abs().max() <= 1 / 255 / 0.224 + 1e-5
+    print("✅ Upload buffer parity test PASSED")
+
+
+def test_slots_are_reused():
+    """Released slots are reused; concurrent reservations never share memory."""
+    buffer = UploadBuffer(slots=2, crop_size=160, device=torch.device("cpu"))
+    image = as_rgb(open_upload(make_upload(400, 300)))
+    with buffer.reserve() as fill:
+        first = fill(image).data_ptr()
+    with buffer.reserve() as fill:
+        assert fill(image).data_ptr() == first
+        with buffer.reserve() as fill_b, buffer.reserve() as fill_c:
+            pointers = {first, fill_b(image).data_ptr(), fill_c(image).data_ptr()}
+            assert len(pointers) == 3
+            assert fill_c(image).shape == (1, 3, 160, 160)
+    assert buffer.overflows == 1 and sorted(buffer._free) == [0, 1]
+    print("✅ Upload buffer slot reuse test PASSED")
+
+
+def test_preview_image():
+    """Previews keep the aspect ratio; small images are not copied."""
+    image = as_rgb(open_upload(make_upload(1000, 500, format="JPEG")))
+    assert preview_image(image, 256).size == (256, 128)
+    small = as_rgb(open_upload(make_upload(200, 100)))
+    assert preview_image(small, 256) is small
+    print("✅ Upload preview test PASSED")
+
+
+def main():
+    run_tests([
+        test_matches_preprocess_image,
+        test_slots_are_reused,
+        test_preview_image
+    ])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Shared fixtures and runner for the test_*.py scripts.
+
+Each script runs standalone (`python test_archives.py`) through run_tests
+and is also collected by pytest.
+"""
+import contextlib
+import io
+import sys
+import traceback
+from unittest import mock
+
+import torch
+
+
+def tiny_model(seed=0, num_classes=1000):
+    """A small deterministic classifier that accepts any 3-channel image size."""
+    torch.manual_seed(seed)
+    return torch.nn.Sequential(
+        torch.nn.AdaptiveAvgPool2d(4),
+        torch.nn.Flatten(),
+        torch.nn.Linear(48, num_classes)
+    ).eval()
+
+
+def run_cli(argv, model):
+    """
+    Run inference.py's main() in-process with load_model returning `model`.
+
+    Args:
+        argv (list): Command-line arguments after the script name
+        model (torch.nn.Module or list): Model to classify with, or the models
+            returned by successive loads
+
+    Returns:
+        str: What the command printed to stdout
+    """
+    import inference
+
+    stdout = io.StringIO()
+    loaded = {"side_effect": model} if isinstance(model, list) else {"return_value": model}
+    with mock.patch("utils.model_loader.load_model", **loaded), \
+            mock.patch.object(sys, "argv", ["inference.py", "--no_daemon"] + list(argv)), \
+            contextlib.redirect_stdout(stdout):
+        inference.main()
+    return stdout.getvalue()
+
+
+def run_tests(tests):
+    """
+    Run test functions in order and exit with 1 if any of them failed.
+
+    Failed assertions and unexpected exceptions are reported per test; the
+    remaining tests still run.
+
+    Args:
+        tests (list): Test functions taking no arguments
+    """
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__} FAILED: {e}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ {test.__name__} ERROR: {type(e).__name__}: {e}")
+            traceback.print_exc()
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,32 @@
+"""
+Archive path names, kept free of third-party imports so the CLI can route
+archives before deciding whether it needs numpy, PIL or torch at all.
+"""
+import re
+
+
+ARCHIVE_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz", ".zip")
+
+_BRACE_RANGE = re.compile(r"\{(\d+)\.\.(\d+)\}")
+
+
+def is_archive(name):
+    """Whether a path (or shard pattern) names a supported archive."""
+    return name.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def expand_shards(pattern):
+    """
+    Expand WebDataset-style brace ranges: `data-{000..002}.tar` gives
+    data-000.tar, data-001.tar and data-002.tar (zero padding is kept).
+    """
+    match = _BRACE_RANGE.search(pattern)
+    if not match:
+        return [pattern]
+    first, last = match.groups()
+    width = len(first)
+    paths = []
+    for number in range(int(first), int(last) + 1):
+        shard = pattern[:match.start()] + str(number).zfill(width) + pattern[match.end():]
+        paths.extend(expand_shards(shard))
+    return paths
@@ -0,0 +1,238 @@
+"""
+Streaming inference over tar/zip archives without extracting them.
+
+Archives (tar, tar.gz/bz2/xz, zip and WebDataset-style shard sets such as
+`train-{000000..000099}.tar`) are read member by member in archive order.
+Image members are decoded and center-cropped in worker processes with a
+bounded number of chunks in flight, so neither the archive nor its decoded
+images are ever held in memory as a whole, and the decoded uint8 crops are
+batched straight into the model. Results are keyed `<archive>:<member>`.
+"""
+import io
+import multiprocessing
+import os
+import tarfile
+import time
+import zipfile
+from collections import deque
+
+import numpy as np
+from PIL import Image
+
+
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif", ".tif", ".tiff")
+
+
+def iter_archive_members(source, name=None):
+    """
+    Yield image members of an archive in archive order.
+
+    Tar archives are read as a stream (mode "r|*"), so compressed tars and
+    pipes work and every member is read exactly once.
+
+    Args:
+        source (str or file object): Archive path or open binary file
+                                     (a zip file object must be seekable)
+        name (str, optional): Archive name used to detect the format when
+                              source is a file object
+
+    Yields:
+        tuple: (member name, bytes)
+    """
+    name = name or source
+    if name.lower().endswith(".zip"):
+        with zipfile.ZipFile(source) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and info.filename.lower().endswith(IMAGE_SUFFIXES):
+                    yield info.filename, archive.read(info)
+        return
+
+    if isinstance(source, str):
+        archive = tarfile.open(source, mode="r|*")
+    else:
+        archive = tarfile.open(fileobj=source, mode="r|*")
+    with archive:
+        for member in archive:
+            if member.isfile() and member.name.lower().endswith(IMAGE_SUFFIXES):
+                yield member.name, archive.extractfile(member).read()
+
+
+def _decode_members(chunk):
+    """Decode a chunk of (name, bytes) members (worker process)."""
+    from utils.image_processor import decode_uint8
+
+    decoded = []
+    for name, data in chunk:
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                decoded.append((name, decode_uint8(image), list(image.size), None))
+        except Exception as e:
+            decoded.append((name, None, None, str(e)))
+    return decoded
+
+
+class ArchiveDecoder:
+    """
+    Decodes archive members in a process pool, in order, with bounded memory.
+
+    Args:
+        workers (int, optional): Decode processes (default: CPU count, at
+                                 most 8); 0 decodes in the calling process
+        chunk_size (int): Members per task
+        max_pending (int, optional): Chunks in flight (default: 2 per worker)
+        start_method (str, optional): multiprocessing start method ("spawn"
+                                      is safer in threaded servers)
+        initializer (callable, optional): Run with `initargs` in each worker
+                                          process (e.g. to apply settings a
+                                          spawned process does not inherit)
+        initargs (tuple): Arguments for `initializer`
+    """
+
+    def __init__(self, workers=None, chunk_size=16, max_pending=None, start_method=None,
+                 initializer=None, initargs=()):
+        if workers is None:
+            workers = min(os.cpu_count() or 1, 8)
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.max_pending = max_pending or 2 * max(workers, 1)
+        self.pool = None
+        if workers:
+            self.pool = multiprocessing.get_context(start_method).Pool(
+                workers, initializer=initializer, initargs=initargs
+            )
+
+    def _chunks(self, members):
+        chunk = []
+        for member in members:
+            chunk.append(member)
+            if len(chunk) == self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def decode(self, members):
+        """
+        Decode (name, bytes) members.
+
+        Yields:
+            tuple: (name, uint8 3 x 224 x 224 array or None, [width, height]
+                   or None, error message or None), in member order
+        """
+        if self.pool is None:
+            for chunk in self._chunks(members):
+                yield from _decode_members(chunk)
+            return
+
+        pending = deque()
+        for chunk in self._chunks(members):
+            pending.append(self.pool.apply_async(_decode_members, (chunk,)))
+            if len(pending) >= self.max_pending:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def classify_members(model, members, decoder, top_k=5, threshold=0.0, batch_size=32,
+                     prefix="", device=None):
+    """
+    Classify (name, bytes) image members, decoded by `decoder`, in batches.
+
+    Args:
+        model (callable): Maps a normalized N x 3 x 224 x 224 batch to logits
+                          (a model, or e.g. a scheduler's run)
+        members (iterable): (name, bytes) pairs
+        decoder (ArchiveDecoder): Member decoder
+        top_k (int): Number of top predictions
+        threshold (float): Minimum confidence threshold (0-1)
+        batch_size (int): Images per forward pass
+        prefix (str): Prepended to member names to form "image"
+        device (torch.device, optional): Device for the input batches
+
+    Yields:
+        dict: Per member, in order: image, member, image_size, ranked
+              predictions and inference_time_ms; or image, member and error
+    """
+    # torch is imported here so inference.py can recognize archives cheaply
+    import torch
+    from utils.image_processor import get_top_predictions, normalize_uint8
+
+    pending, decoded = [], 0
+
+    def run_batch():
+        start_time = time.time()
+        ok = [entry for entry in pending if entry[3] is None]
+        probabilities = iter(())
+        if ok:
+            batch = normalize_uint8(torch.from_numpy(np.stack([entry[1] for entry in ok])),
+                                    device=device)
+            with torch.no_grad():
+                probabilities = iter(torch.softmax(model(batch).float(), dim=1))
+        per_image_ms = (time.time() - start_time) * 1000 / max(len(ok), 1)
+        for member, _, size, error in pending:
+            if error is not None:
+                yield {"image": f"{prefix}{member}", "member": member, "error": error}
+                continue
+            predictions = get_top_predictions(next(probabilities), top_k=top_k,
+                                              threshold=threshold, return_indices=True)
+            yield {
+                "image": f"{prefix}{member}",
+                "member": member,
+                "image_size": size,
+                "predictions": [
+                    {"rank": i + 1, "class": class_name, "class_index": class_idx,
+                     "confidence": float(confidence)}
+                    for i, (class_idx, class_name, confidence) in enumerate(predictions)
+                ],
+                "inference_time_ms": per_image_ms
+            }
+        pending.clear()
+
+    # Failed members stay in place so results come out in member order
+    for entry in decoder.decode(members):
+        pending.append(entry)
+        decoded += entry[3] is None
+        if decoded == batch_size:
+            yield from run_batch()
+            decoded = 0
+    if pending:
+        yield from run_batch()
+
+
+def classify_archive(model, source, decoder, top_k=5, threshold=0.0, batch_size=32,
+                     name=None, device=None):
+    """
+    Classify every image member of an archive.
+
+    Args:
+        model (callable): Maps a normalized N x 3 x 224 x 224 batch to logits
+                          (a model, or e.g. a scheduler's run)
+        source (str or file object): Archive path or open binary file
+        decoder (ArchiveDecoder): Member decoder
+        top_k (int): Number of top predictions
+        threshold (float): Minimum confidence threshold (0-1)
+        batch_size (int): Images per forward pass
+        name (str, optional): Archive name (required for file objects)
+        device (torch.device, optional): Device for the input batches
+
+    Yields:
+        dict: Per member, in archive order: image ("<archive>:<member>"),
+              member, image_size, ranked predictions and inference_time_ms;
+              or image, member and error
+    """
+    name = name or source
+    yield from classify_members(model, iter_archive_members(source, name), decoder,
+                                top_k=top_k, threshold=threshold, batch_size=batch_size,
+                                prefix=f"{name}:", device=device)
@@ -0,0 +1,227 @@
+"""
+Parallel, resumable asset downloads, verified against manifest checksums.
+
+Assets are described by a JSON manifest:
+
+    {
+      "base_url": "https://example.com/assets/",
+      "assets": [
+        {"name": "a.JPEG", "sha256": "...", "size": 12345},
+        {"name": "b.JPEG", "url": "https://mirror/b.JPEG"}
+      ]
+    }
+
+`url` defaults to base_url + name. An asset without a `sha256` is refused
+unless the fetcher is created with require_checksum=False (e.g. to record
+digests for a new manifest); a download that does not match the `sha256` or
+`size` in the manifest is rejected. Files are
+written to `<name>.part` and only renamed into place once verified, so an
+interrupted run resumes with an HTTP Range request instead of starting over
+and never leaves a truncated or HTML error page behind under the real name.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+CHUNK_SIZE = 64 * 1024
+
+FetchResult = namedtuple("FetchResult", ["name", "path", "status", "bytes", "sha256", "error"])
+
+
+class ChecksumMismatch(Exception):
+    """Raised when downloaded content does not match the manifest."""
+
+
+def load_manifest(path):
+    """Load a manifest and resolve each asset's URL."""
+    with open(path, "r") as f:
+        manifest = json.load(f)
+    base_url = manifest.get("base_url", "")
+    for asset in manifest["assets"]:
+        asset.setdefault("url", base_url + asset["name"])
+    return manifest
+
+
+def save_manifest(manifest, path):
+    """Write a manifest back, omitting URLs that are derived from base_url."""
+    base_url = manifest.get("base_url", "")
+    assets = []
+    for asset in manifest["assets"]:
+        asset = dict(asset)
+        if asset.get("url") == base_url + asset["name"]:
+            del asset["url"]
+        assets.append(asset)
+    with open(path, "w") as f:
+        json.dump({**manifest, "assets": assets}, f, indent=2)
+        f.write("\n")
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_session(pool_size=8, retries=3):
+    """HTTP session with a connection pool sized for the worker count and retries."""
+    session = requests.Session()
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET", "HEAD")
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class AssetFetcher:
+    """
+    Downloads manifest assets concurrently into a directory.
+
+    Args:
+        output_dir (str): Destination directory
+        workers (int): Concurrent downloads (and connection pool size)
+        timeout (float): Per-request connect/read timeout in seconds
+        validate (callable, optional): validate(path) raises if a downloaded
+                                       file is unusable (e.g. not an image)
+        session (requests.Session, optional): Session to reuse
+        require_checksum (bool): Fail assets that have no sha256 in the
+                                 manifest instead of trusting them
+    """
+
+    def __init__(self, output_dir, workers=8, timeout=30.0, validate=None, session=None,
+                 require_checksum=True):
+        self.output_dir = output_dir
+        self.require_checksum = require_checksum
+        self.workers = workers
+        self.timeout = timeout
+        self.validate = validate
+        self.session = session or make_session(pool_size=workers)
+        self._print_lock = threading.Lock()
+
+    def is_up_to_date(self, asset, path):
+        """Whether an existing file already satisfies the manifest entry."""
+        if not os.path.exists(path):
+            return False
+        if asset.get("size") is not None and os.path.getsize(path) != asset["size"]:
+            return False
+        if asset.get("sha256"):
+            return file_sha256(path) == asset["sha256"]
+        # Without a checksum we can only trust a file that passes validation
+        if self.validate is not None:
+            try:
+                self.validate(path)
+            except Exception:
+                return False
+        return True
+
+    def _download(self, asset, part_path):
+        """Download (or resume) into part_path and return the content sha256."""
+        digest = hashlib.sha256()
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+        with self.session.get(asset["url"], headers=headers, stream=True,
+                              timeout=self.timeout) as response:
+            if response.status_code == 416 and offset:
+                # The partial file is already complete
+                return file_sha256(part_path)
+            response.raise_for_status()
+            content_type = response.headers.get("Content-Type", "")
+            if content_type.startswith("text/html") and not asset["name"].endswith(".html"):
+                raise ChecksumMismatch(f"server returned an HTML page ({response.status_code})")
+
+            if offset and response.status_code == 206:
+                with open(part_path, "rb") as f:
+                    for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                        digest.update(chunk)
+                mode = "ab"
+            else:
+                # Server ignored the Range header: start over
+                mode = "wb"
+
+            with open(part_path, mode) as f:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    if chunk:
+                        f.write(chunk)
+                        digest.update(chunk)
+        return digest.hexdigest()
+
+    def _verify(self, asset, part_path, sha256):
+        if asset.get("sha256") and sha256 != asset["sha256"]:
+            raise ChecksumMismatch(f"sha256 {sha256[:12]}... != manifest {asset['sha256'][:12]}...")
+        if asset.get("size") is not None and os.path.getsize(part_path) != asset["size"]:
+            raise ChecksumMismatch(
+                f"size {os.path.getsize(part_path)} != manifest {asset['size']}"
+            )
+        if self.validate is not None:
+            self.validate(part_path)
+
+    def fetch(self, asset):
+        """Fetch one asset; never raises, failures are reported in the result."""
+        path = os.path.join(self.output_dir, asset["name"])
+        part_path = path + ".part"
+
+        if self.require_checksum and not asset.get("sha256"):
+            return FetchResult(asset["name"], path, "failed", 0, None,
+                               "no sha256 in the manifest (record one with --update_manifest)")
+        if self.is_up_to_date(asset, path):
+            return FetchResult(asset["name"], path, "skipped", 0, asset.get("sha256"), None)
+
+        # A resumed download that fails verification is retried once from scratch
+        while True:
+            resumed = os.path.exists(part_path)
+            try:
+                sha256 = self._download(asset, part_path)
+                self._verify(asset, part_path, sha256)
+            except requests.RequestException as e:
+                # Keep the partial file so the next run can resume it
+                return FetchResult(asset["name"], path, "failed", 0, None, str(e))
+            except Exception as e:
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+                if resumed:
+                    continue
+                return FetchResult(asset["name"], path, "failed", 0, None, str(e))
+
+            size = os.path.getsize(part_path)
+            os.replace(part_path, path)
+            return FetchResult(asset["name"], path, "downloaded", size, sha256, None)
+
+    def fetch_all(self, assets, progress=None):
+        """
+        Fetch assets concurrently.
+
+        Args:
+            assets (list): Manifest asset entries
+            progress (callable, optional): Called with each FetchResult as it completes
+
+        Returns:
+            list: FetchResult per asset, in manifest order
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        results = [None] * len(assets)
+
+        def run(index):
+            result = self.fetch(assets[index])
+            results[index] = result
+            if progress is not None:
+                with self._print_lock:
+                    progress(result)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            list(pool.map(run, range(len(assets))))
+        return results
@@ -0,0 +1,298 @@
+"""
+Pluggable inference backends.
+
+A backend turns the eager model into something that runs batches:
+
+    backend = BACKENDS["torchscript"]().load(model)
+    backend.warmup((1, 8))
+    logits = backend.run_batch(batch)      # or backend(batch)
+    backend.describe()
+
+Eager fp32 is the reference implementation; the other backends wrap the
+execution modes in utils/optimization.py. Any backend can run at reduced
+precision (bf16, or fp16 on GPU) under autocast; its logits are then checked
+against eager fp32 with a correspondingly looser tolerance. Backends are nn.Modules whose
+`model` attribute holds real parameters, so they drop in wherever the app,
+inference.py or the scheduler called the model directly.
+
+`select_backend` micro-benchmarks every available backend on this host and
+returns the fastest one whose logits match eager fp32. New backends are added
+with the `register_backend` decorator.
+"""
+import contextlib
+import copy
+import time
+
+import torch
+import torch.nn as nn
+
+from utils.optimization import (
+    CompiledModel,
+    compare_logits,
+    compile_for_inference,
+    logits_match,
+    measure_latency,
+    optimize_for_inference,
+    sample_inputs,
+    script_for_inference
+)
+
+
+BACKENDS = {}
+AUTO = "auto"
+
+PRECISION_DTYPES = {"fp32": None, "bf16": torch.bfloat16, "fp16": torch.float16}
+# Parity tolerance per precision (relative to the largest logit)
+PRECISION_RTOL = {"fp32": 1e-3, "bf16": 5e-2, "fp16": 1e-2}
+
+
+def register_backend(cls):
+    """Class decorator adding a backend to BACKENDS under its name."""
+    BACKENDS[cls.name] = cls
+    return cls
+
+
+class BackendUnavailable(Exception):
+    """Raised when a backend cannot be built on this host."""
+
+
+class InferenceBackend(nn.Module):
+    """
+    Base class: subclasses set `name` and `description` and implement build().
+
+    Args:
+        precision (str): "fp32", "bf16" or "fp16" (autocast around the runner)
+
+    Attributes:
+        model (torch.nn.Module): Module holding the parameters (for device
+                                 and parameter counts)
+        runner (callable): What run_batch() calls (not registered, it may
+                           share parameters with `model`)
+    """
+
+    name = None
+    description = ""
+
+    def __init__(self, precision="fp32"):
+        super().__init__()
+        if precision not in PRECISION_DTYPES:
+            raise ValueError(f"Unknown precision '{precision}' "
+                             f"(available: {', '.join(PRECISION_DTYPES)})")
+        self.precision = precision
+        self.model = None
+        self.__dict__["runner"] = None
+        self.load_s = 0.0
+        self.warmup_s = 0.0
+        self.warmed_up = ()
+
+    def build(self, model):
+        """Return the runner for an eager model (raise BackendUnavailable if unsupported)."""
+        raise NotImplementedError
+
+    def load(self, model):
+        """
+        Build the backend from an eager model in evaluation mode.
+
+        Returns:
+            InferenceBackend: self
+        """
+        start = time.perf_counter()
+        runner = self.build(model)
+        self.__dict__["runner"] = runner
+        has_parameters = isinstance(runner, nn.Module) and any(True for _ in runner.parameters())
+        self.model = runner if has_parameters else model
+        if self.precision == "fp16" and self.device.type == "cpu":
+            raise BackendUnavailable("fp16 autocast needs a GPU")
+        self.load_s = time.perf_counter() - start
+        return self.eval()
+
+    @property
+    def device(self):
+        return next(self.model.parameters()).device
+
+    def warmup(self, batch_sizes=(1, 8)):
+        """Run each batch size once so later calls see warm kernels and caches."""
+        start = time.perf_counter()
+        for batch_size in batch_sizes:
+            self.run_batch(sample_inputs(batch_size, device=self.device, seed=batch_size))
+        self.warmup_s = time.perf_counter() - start
+        self.warmed_up = tuple(batch_sizes)
+        return self
+
+    def autocast(self):
+        """Autocast context for the backend's precision (a no-op for fp32)."""
+        if PRECISION_DTYPES[self.precision] is None:
+            return contextlib.nullcontext()
+        return torch.autocast(self.device.type, dtype=PRECISION_DTYPES[self.precision])
+
+    def run_batch(self, batch):
+        """fp32 logits for a normalized N x 3 x 224 x 224 batch."""
+        with torch.no_grad(), self.autocast():
+            return self.runner(batch).float()
+
+    def forward(self, x):
+        return self.run_batch(x)
+
+    def describe(self):
+        """
+        Returns:
+            dict: name, description, precision, device, load_s, warmup_s and
+                  the batch sizes warmed up
+        """
+        return {
+            "name": self.name,
+            "description": self.description,
+            "precision": self.precision,
+            "device": str(self.device),
+            "load_s": self.load_s,
+            "warmup_s": self.warmup_s,
+            "warmed_up": list(self.warmed_up)
+        }
+
+
+@register_backend
+class EagerBackend(InferenceBackend):
+    name = "eager"
+    description = "Eager PyTorch, fp32 (reference)"
+
+    def build(self, model):
+        return model
+
+
+@register_backend
+class OptimizedEagerBackend(InferenceBackend):
+    name = "optimized_eager"
+    description = "Eager with BatchNorm folding, channels_last and inference_mode"
+
+    def build(self, model):
+        return optimize_for_inference(copy.deepcopy(model), verify=False)
+
+
+@register_backend
+class TorchScriptBackend(InferenceBackend):
+    name = "torchscript"
+    description = "TorchScript, frozen and optimized for inference"
+
+    def build(self, model):
+        try:
+            return script_for_inference(model)
+        except Exception as e:
+            raise BackendUnavailable(str(e))
+
+
+@register_backend
+class CompiledBackend(InferenceBackend):
+    name = "compiled"
+    description = "torch.compile (Inductor) on static batch sizes, with an on-disk cache"
+
+    def build(self, model):
+        compiled = compile_for_inference(copy.deepcopy(model))
+        if not isinstance(compiled, CompiledModel):
+            raise BackendUnavailable("torch.compile is not available")
+        return compiled
+
+
+def check_parity(backend, model, rtol=1e-3):
+    """
+    Compare a backend's logits with the eager model on sample inputs.
+
+    The tolerance is at least PRECISION_RTOL for the backend's precision.
+
+    Returns:
+        dict: compare_logits() stats plus "ok"
+    """
+    inputs = sample_inputs(device=backend.device)
+    with torch.no_grad():
+        stats = compare_logits(model(inputs), backend.run_batch(inputs))
+    return {**stats, "ok": logits_match(stats, max(rtol, PRECISION_RTOL[backend.precision]))}
+
+
+def create_backend(name, model, batch_sizes=(1, 8), rtol=1e-3, precision="fp32"):
+    """
+    Build, check and warm up a backend by name ("auto" runs select_backend).
+
+    A backend that cannot be built or whose logits do not match eager fp32
+    is replaced by the eager fp32 backend with a warning.
+
+    Returns:
+        InferenceBackend: Loaded, warmed-up backend
+    """
+    if name == AUTO:
+        return select_backend(model, batch_sizes=batch_sizes, rtol=rtol, precision=precision)
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}' (available: {', '.join(BACKENDS)}, {AUTO})")
+
+    try:
+        backend = BACKENDS[name](precision).load(model)
+        reference = name == EagerBackend.name and precision == "fp32"
+        parity = {"ok": True} if reference else check_parity(backend, model, rtol)
+        if not parity["ok"]:
+            raise BackendUnavailable(f"logits diverge from eager fp32 (max relative diff "
+                                     f"{parity['max_rel_diff']:.2e})")
+    except BackendUnavailable as e:
+        print(f"Warning: {name} backend ({precision}) unavailable ({e}), using eager fp32")
+        backend = EagerBackend().load(model)
+    return backend.warmup(batch_sizes)
+
+
+def select_backend(model, names=None, batch_sizes=(1, 8), iters=5, rtol=1e-3, precision="fp32"):
+    """
+    Pick the fastest backend on this host whose logits match eager fp32.
+
+    Every candidate is built, warmed up, parity-checked against the eager
+    model and timed at each batch size; candidates are compared by mean
+    per-image latency over the batch sizes. Only the current best is kept
+    in memory while the others are measured.
+
+    Args:
+        model (torch.nn.Module): Eager model in evaluation mode
+        names (list, optional): Candidate backends (default: all registered)
+        batch_sizes (tuple): Batch sizes to warm up and time
+        iters (int): Timed iterations per batch size
+        rtol (float): Maximum logit difference relative to the largest logit
+        precision (str): Precision every candidate runs at
+
+    Returns:
+        InferenceBackend: The chosen backend; its `selection` attribute holds
+                          the per-backend report
+    """
+    report = []
+    best, best_ms = None, None
+    for name in names or list(BACKENDS):
+        entry = {"name": name}
+        report.append(entry)
+        try:
+            backend = BACKENDS[name](precision).load(model).warmup(batch_sizes)
+        except Exception as e:
+            entry["error"] = str(e)
+            continue
+        entry["parity"] = check_parity(backend, model, rtol)
+        entry["latency"] = {
+            batch_size: measure_latency(backend, sample_inputs(batch_size, device=backend.device,
+                                                               seed=batch_size),
+                                        warmup=1, iters=iters)
+            for batch_size in batch_sizes
+        }
+        entry["per_image_ms"] = sum(
+            latency["mean_ms"] / batch_size for batch_size, latency in entry["latency"].items()
+        ) / len(batch_sizes)
+        entry["load_s"] = backend.load_s + backend.warmup_s
+        if entry["parity"]["ok"] and (best is None or entry["per_image_ms"] < best_ms):
+            best, best_ms = backend, entry["per_image_ms"]
+        del backend
+
+    if best is None:
+        best = EagerBackend().load(model).warmup(batch_sizes)
+    best.selection = report
+
+    print(f"Backend selection ({precision}, batch sizes {list(batch_sizes)}):")
+    for entry in report:
+        if "error" in entry:
+            print(f"  ⚪ {entry['name']:16s} unavailable: {entry['error']}")
+            continue
+        marker = "✅" if entry["name"] == best.name else ("  " if entry["parity"]["ok"] else "❌")
+        print(f"  {marker} {entry['name']:16s} {entry['per_image_ms']:8.2f} ms/image  "
+              f"parity max abs diff {entry['parity']['max_abs_diff']:.1e}  "
+              f"ready in {entry['load_s']:.1f}s")
+    print(f"Using the {best.name} backend")
+    return best
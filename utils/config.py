@@ -0,0 +1,268 @@
+"""
+Validated application configuration and performance profiles (config.yaml).
+
+config.yaml is read and validated once per process. Top-level keys describe
+the model and its preprocessing (img_size, resize_size, mean, std) and the
+app defaults (default_model_path, default_top_k, ...). `profiles` holds
+named performance profiles; each one only lists what it changes from
+PROFILE_DEFAULTS:
+
+    profiles:
+      latency:
+        backend: torchscript
+        batch_size: 4
+
+The active profile is, in order: an explicit name (inference.py
+--perf_profile), $IMAGENET_PROFILE, then `default_profile`. $IMAGENET_CONFIG
+points at another config file.
+
+This module does not import torch, so inference.py can read it cheaply.
+"""
+import os
+from collections import namedtuple
+from functools import lru_cache
+
+import yaml
+
+
+CONFIG_ENV = "IMAGENET_CONFIG"
+PROFILE_ENV = "IMAGENET_PROFILE"
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                   "config.yaml")
+
+BACKEND_NAMES = ("eager", "optimized_eager", "torchscript", "compiled", "auto")
+PRECISIONS = ("fp32", "bf16", "fp16")
+
+Config = namedtuple("Config", [
+    "path", "model_name", "num_classes", "img_size", "resize_size", "mean", "std",
+    "default_model_path", "default_top_k", "default_confidence_threshold",
+    "max_upload_size_mb", "default_profile", "profiles"
+])
+
+Profile = namedtuple("Profile", [
+    "name", "backend", "precision", "batch_size", "num_threads", "decode_workers",
+    "preview_cache_entries", "max_image_pixels", "slo_p95_ms", "slo_queue_depth"
+])
+
+
+class ConfigError(ValueError):
+    """Raised for a missing or invalid configuration."""
+
+
+def _integer(minimum, optional=False):
+    def check(value):
+        if value is None and optional:
+            return
+        if isinstance(value, bool) or not isinstance(value, int) or value < minimum:
+            raise ValueError(f"expected an integer >= {minimum}" + (" or null" if optional else ""))
+    return check
+
+
+def _number(minimum, maximum, optional=False):
+    def check(value):
+        if value is None and optional:
+            return
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or \
+                not minimum <= value <= maximum:
+            raise ValueError(f"expected a number between {minimum} and {maximum}"
+                             + (" or null" if optional else ""))
+    return check
+
+
+def _one_of(choices):
+    def check(value):
+        if value not in choices:
+            raise ValueError(f"expected one of {', '.join(choices)}")
+    return check
+
+
+def _text(optional=False):
+    def check(value):
+        if value is None and optional:
+            return
+        if not isinstance(value, str) or not value:
+            raise ValueError("expected a non-empty string" + (" or null" if optional else ""))
+    return check
+
+
+def _channels(value):
+    if not isinstance(value, list) or len(value) != 3 or not all(
+            isinstance(v, (int, float)) and not isinstance(v, bool) for v in value):
+        raise ValueError("expected a list of 3 numbers")
+
+
+# key: (default, validator)
+SETTINGS = {
+    "model_name": ("resnet50", _text()),
+    "num_classes": (1000, _integer(1)),
+    "img_size": (224, _integer(1)),
+    "resize_size": (256, _integer(1)),
+    "mean": ([0.485, 0.456, 0.406], _channels),
+    "std": ([0.229, 0.224, 0.225], _channels),
+    "default_model_path": (None, _text(optional=True)),
+    "default_top_k": (5, _integer(1)),
+    "default_confidence_threshold": (0.0, _number(0.0, 1.0)),
+    "max_upload_size_mb": (200, _integer(1)),
+    "default_profile": ("default", _text())
+}
+
+PROFILE_DEFAULTS = {
+    "backend": ("eager", _one_of(BACKEND_NAMES)),
+    "precision": ("fp32", _one_of(PRECISIONS)),
+    "batch_size": (8, _integer(1)),
+    "num_threads": (None, _integer(1, optional=True)),
+    "decode_workers": (4, _integer(0)),
+    "preview_cache_entries": (1000, _integer(1)),
+    "max_image_pixels": (89478485, _integer(1, optional=True)),
+    "slo_p95_ms": (None, _number(1, 3600000, optional=True)),
+    "slo_queue_depth": (32, _integer(1, optional=True))
+}
+
+
+def _validate(values, schema, where):
+    """Apply defaults and validators; unknown keys are errors (they are usually typos)."""
+    unknown = sorted(set(values) - set(schema))
+    if unknown:
+        raise ConfigError(f"{where}: unknown setting(s) {', '.join(unknown)} "
+                          f"(known: {', '.join(schema)})")
+    validated = {}
+    for key, (default, check) in schema.items():
+        value = values.get(key, default)
+        try:
+            check(value)
+        except ValueError as e:
+            raise ConfigError(f"{where}: {key}={value!r}: {e}")
+        validated[key] = value
+    return validated
+
+
+def parse_config(data, path=None):
+    """
+    Validate a parsed config.yaml mapping.
+
+    Args:
+        data (dict): Parsed YAML (None for an empty file)
+        path (str, optional): File the data came from (for messages)
+
+    Returns:
+        Config: Validated configuration; `profiles` maps names to Profile
+
+    Raises:
+        ConfigError: If a setting is unknown or invalid
+    """
+    where = path or "config"
+    if data is not None and not isinstance(data, dict):
+        raise ConfigError(f"{where}: expected a mapping at the top level")
+    data = dict(data or {})
+    raw_profiles = data.pop("profiles", None) or {}
+    if not isinstance(raw_profiles, dict):
+        raise ConfigError(f"{where}: profiles must be a mapping of name to settings")
+
+    settings = _validate(data, SETTINGS, where)
+    if settings["resize_size"] < settings["img_size"]:
+        raise ConfigError(f"{where}: resize_size ({settings['resize_size']}) is smaller than "
+                          f"img_size ({settings['img_size']})")
+    if any(value <= 0 for value in settings["std"]):
+        raise ConfigError(f"{where}: std values must be positive")
+
+    profiles = {"default": Profile(name="default", **_validate({}, PROFILE_DEFAULTS, where))}
+    for name, values in raw_profiles.items():
+        if not isinstance(values, dict):
+            raise ConfigError(f"{where}: profile {name!r} must be a mapping")
+        profiles[name] = Profile(name=name, **_validate(values, PROFILE_DEFAULTS,
+                                                         f"{where}: profile {name!r}"))
+    if settings["default_profile"] not in profiles:
+        raise ConfigError(f"{where}: default_profile {settings['default_profile']!r} is not "
+                          f"defined (profiles: {', '.join(profiles)})")
+    return Config(path=path, profiles=profiles, **settings)
+
+
+def load_config(path=None):
+    """
+    Read and validate a config file.
+
+    Args:
+        path (str, optional): Config file (default: $IMAGENET_CONFIG, then
+                              config.yaml at the repository root; a missing
+                              default file means built-in defaults)
+
+    Returns:
+        Config: Validated configuration
+
+    Raises:
+        ConfigError: If the file is missing (when given explicitly),
+                     unreadable or invalid
+    """
+    explicit = path or os.environ.get(CONFIG_ENV)
+    path = explicit or DEFAULT_CONFIG_PATH
+    if not os.path.exists(path):
+        if explicit:
+            raise ConfigError(f"Config file not found: {path}")
+        return parse_config({})
+    try:
+        with open(path) as f:
+            data = yaml.safe_load(f)
+    except (OSError, yaml.YAMLError) as e:
+        raise ConfigError(f"Could not read {path}: {e}")
+    return parse_config(data, path)
+
+
+@lru_cache(maxsize=None)
+def get_config():
+    """The process-wide configuration, loaded on first use."""
+    return load_config()
+
+
+def select_profile(config, name=None):
+    """
+    Resolve the active performance profile.
+
+    Args:
+        config (Config): Validated configuration
+        name (str, optional): Requested profile (default: $IMAGENET_PROFILE,
+                              then the config's default_profile)
+
+    Returns:
+        Profile: The selected profile
+
+    Raises:
+        ConfigError: If the profile is not defined
+    """
+    name = name or os.environ.get(PROFILE_ENV) or config.default_profile
+    if name not in config.profiles:
+        raise ConfigError(f"Unknown performance profile {name!r} "
+                          f"(available: {', '.join(config.profiles)})")
+    return config.profiles[name]
+
+
+def apply_profile(profile):
+    """
+    Apply the process-wide parts of a profile: torch intra-op threads and
+    PIL's decompression-bomb pixel limit.
+    """
+    import torch
+
+    if profile.num_threads:
+        torch.set_num_threads(profile.num_threads)
+    apply_image_limits(profile.max_image_pixels)
+
+
+def apply_image_limits(max_image_pixels):
+    """
+    Set PIL's decompression-bomb pixel limit (None: no limit).
+
+    Also used as the initializer of spawned decode processes, which do not
+    inherit the limit apply_profile() set in the parent.
+    """
+    from PIL import Image
+
+    Image.MAX_IMAGE_PIXELS = max_image_pixels
+
+
+def describe_profile(profile):
+    """One-line summary of a profile."""
+    threads = profile.num_threads or "all"
+    return (f"{profile.name}: {profile.backend} backend, {profile.precision}, "
+            f"batch {profile.batch_size}, {threads} threads, "
+            f"{profile.decode_workers} decode workers"
+            + (f", p95 SLO {profile.slo_p95_ms:g}ms" if profile.slo_p95_ms else ""))
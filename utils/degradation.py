@@ -0,0 +1,192 @@
+"""
+Load-adaptive degradation for latency SLOs.
+
+The controller watches the end-to-end latency (queue wait plus forward
+pass) of recent scheduler requests and the queue depth. When the p95
+latency approaches the SLO or the queue grows past its limit it steps down
+one level to a cheaper mode, and when both have been comfortably low for a
+while it steps back up:
+
+    full               configured batch size, 224px, configured precision
+    batched            4x larger batches, waiting briefly to fill them
+    reduced_resolution 192px center crops
+    reduced_precision  192px under bf16/fp16 autocast (only where supported)
+    minimal            160px (under reduced precision where supported)
+
+Steps down react within `down_cooldown_s`, steps up only after
+`up_cooldown_s`, and latency samples from before a mode change are dropped,
+so the controller does not oscillate between two levels.
+"""
+import threading
+import time
+from collections import deque, namedtuple
+
+import numpy as np
+import torch
+
+
+Mode = namedtuple("Mode", ["name", "max_batch_size", "batch_wait_ms", "resolution", "precision"])
+
+
+def reduced_precision():
+    """
+    The reduced precision that is faster on this host, if any.
+
+    Returns:
+        str: "bf16" (CPUs with AVX512-BF16/AMX, or GPUs supporting it),
+             "fp16" (other GPUs) or None
+    """
+    if torch.cuda.is_available():
+        return "bf16" if torch.cuda.is_bf16_supported() else "fp16"
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+    except OSError:
+        return None
+    return "bf16" if ("avx512_bf16" in flags or "amx_bf16" in flags) else None
+
+
+def default_modes(batch_size=8, precision="fp32", resolution=224):
+    """
+    The degradation ladder, cheapest last.
+
+    Args:
+        batch_size (int): Batch size of the full mode
+        precision (str): Precision of the full mode
+        resolution (int): Input resolution of the full mode
+
+    Returns:
+        list: Mode tuples
+    """
+    cheaper = reduced_precision() if precision == "fp32" else None
+    large_batch = batch_size * 4
+    modes = [
+        Mode("full", batch_size, 0, resolution, precision),
+        Mode("batched", large_batch, 10, resolution, precision),
+        Mode("reduced_resolution", large_batch, 20, round(resolution * 6 / 7), precision)
+    ]
+    if cheaper:
+        modes.append(Mode("reduced_precision", large_batch, 20, round(resolution * 6 / 7), cheaper))
+    modes.append(Mode("minimal", large_batch, 20, round(resolution * 5 / 7), cheaper or precision))
+    return modes
+
+
+class DegradationController:
+    """
+    Chooses the inference mode from recent latency and queue depth.
+
+    Args:
+        modes (list): Mode tuples from most to least expensive
+        slo_p95_ms (float): Target p95 end-to-end latency
+        slo_queue_depth (int, optional): Queue depth that counts as a breach
+        threshold (float): Step down once p95 exceeds this fraction of the SLO
+        recover_ratio (float): Step up once p95 is below this fraction of the
+                               SLO and the queue is short
+        window_s (float): Latency samples older than this are ignored
+        min_samples (int): Samples needed before p95 is trusted
+        down_cooldown_s (float): Minimum time between steps down
+        up_cooldown_s (float): Minimum time after any change before a step up
+    """
+
+    def __init__(self, modes, slo_p95_ms, slo_queue_depth=None, threshold=0.9,
+                 recover_ratio=0.5, window_s=30.0, min_samples=8, down_cooldown_s=2.0,
+                 up_cooldown_s=15.0):
+        self.modes = list(modes)
+        self.slo_p95_ms = slo_p95_ms
+        self.slo_queue_depth = slo_queue_depth
+        self.threshold = threshold
+        self.recover_ratio = recover_ratio
+        self.window_s = window_s
+        self.min_samples = min_samples
+        self.down_cooldown_s = down_cooldown_s
+        self.up_cooldown_s = up_cooldown_s
+
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=1000)
+        self._level = 0
+        self._changed_at = time.monotonic()
+        self._transitions = deque(maxlen=50)
+
+    @property
+    def mode(self):
+        return self.modes[self._level]
+
+    @property
+    def level(self):
+        return self._level
+
+    def record(self, latency_ms, now=None):
+        """Add the end-to-end latency of one request."""
+        with self._lock:
+            self._samples.append((time.monotonic() if now is None else now, latency_ms))
+
+    def _p95(self, now):
+        while self._samples and now - self._samples[0][0] > self.window_s:
+            self._samples.popleft()
+        if len(self._samples) < self.min_samples:
+            return None
+        return float(np.percentile([latency for _, latency in self._samples], 95))
+
+    def update(self, queue_depth, now=None):
+        """
+        Re-evaluate the mode.
+
+        Args:
+            queue_depth (int): Requests currently waiting
+            now (float, optional): time.monotonic() value (for tests)
+
+        Returns:
+            Mode: The mode to use from now on
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            p95 = self._p95(now)
+            queue_breach = self.slo_queue_depth is not None and queue_depth > self.slo_queue_depth
+            latency_breach = p95 is not None and p95 > self.slo_p95_ms * self.threshold
+            since_change = now - self._changed_at
+
+            if (queue_breach or latency_breach) and self._level < len(self.modes) - 1:
+                if since_change >= self.down_cooldown_s:
+                    reason = "queue depth" if queue_breach else "p95 latency"
+                    self._change(self._level + 1, now, p95, queue_depth, reason)
+            elif self._level > 0 and since_change >= self.up_cooldown_s:
+                queue_calm = self.slo_queue_depth is None or queue_depth <= self.slo_queue_depth // 4
+                latency_calm = p95 is None or p95 < self.slo_p95_ms * self.recover_ratio
+                if queue_calm and latency_calm:
+                    self._change(self._level - 1, now, p95, queue_depth, "load subsided")
+            return self.modes[self._level]
+
+    def _change(self, level, now, p95, queue_depth, reason):
+        previous = self.modes[self._level].name
+        self._level = level
+        self._changed_at = now
+        # Latencies measured in the previous mode say little about this one
+        self._samples.clear()
+        self._transitions.append({
+            "time": time.time(),
+            "from": previous,
+            "to": self.modes[level].name,
+            "reason": reason,
+            "p95_ms": p95,
+            "queue_depth": queue_depth
+        })
+        p95_text = f"{p95:.0f}ms" if p95 is not None else "-"
+        print(f"🚦 Inference mode {previous} -> {self.modes[level].name} ({reason}: "
+              f"p95 {p95_text} vs SLO {self.slo_p95_ms:.0f}ms, queue {queue_depth})")
+
+    def stats(self):
+        """
+        Returns:
+            dict: mode, level, levels, p95_ms (None until enough samples),
+                  slo_p95_ms, slo_queue_depth and recent transitions
+        """
+        with self._lock:
+            return {
+                "mode": self.modes[self._level].name,
+                "level": self._level,
+                "levels": len(self.modes),
+                "p95_ms": self._p95(time.monotonic()),
+                "slo_p95_ms": self.slo_p95_ms,
+                "slo_queue_depth": self.slo_queue_depth,
+                "transitions": list(self._transitions)
+            }
@@ -0,0 +1,347 @@
+"""
+Incremental classification of a watched folder.
+
+A SQLite index next to the results records, per image, its path, size,
+mtime, SHA-256 and the checkpoint that classified it, together with the
+result. A pass stats the folder and only reads, hashes and classifies files
+that are new or whose size or mtime changed:
+
+- a changed file whose content hash is unchanged (e.g. touched, or copied
+  over with the same bytes) only gets its stat updated,
+- a new file whose hash is already in the index for the same checkpoint
+  (a rename, move or duplicate) reuses that result, unless it was a decode
+  error,
+- everything else is decoded and classified in batches,
+- entries of deleted files are removed.
+
+The cost of a pass beyond the directory listing is therefore proportional
+to what changed. Changing the checkpoint (path or file), top_k or threshold
+reclassifies everything once.
+"""
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from utils.archives import IMAGE_SUFFIXES
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    checkpoint TEXT,
+    classified_at REAL NOT NULL,
+    result TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_sha256 ON files (sha256, checkpoint);
+"""
+
+NEW = "new"
+CHANGED = "changed"
+REUSED = "reused"
+DELETED = "deleted"
+
+
+def checkpoint_id(checkpoint):
+    """Identity of a checkpoint: path, size and mtime (a rewritten file counts as new)."""
+    if not checkpoint or not os.path.exists(checkpoint):
+        return "pretrained"
+    stat = os.stat(checkpoint)
+    return f"{os.path.abspath(checkpoint)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def scan_folder(root, known, checkpoint, min_age_s=2.0):
+    """
+    Compare a folder with the index using stat only.
+
+    Args:
+        root (str): Folder to scan (recursively)
+        known (dict): path -> (size, mtime_ns, checkpoint) from the index
+        checkpoint (str): Current checkpoint_id()
+        min_age_s (float): Files modified more recently are left for the
+                           next pass (they may still be being written)
+
+    Returns:
+        tuple: ([(path, size, mtime_ns)] to check, [deleted paths],
+                number unchanged, number still settling)
+    """
+    candidates, seen = [], set()
+    unchanged = settling = 0
+    now_ns = time.time_ns()
+    for directory, _, files in os.walk(root):
+        for name in sorted(files):
+            if not name.lower().endswith(IMAGE_SUFFIXES):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entry = known.get(path)
+            if entry is not None:
+                seen.add(path)
+            if entry == (stat.st_size, stat.st_mtime_ns, checkpoint):
+                unchanged += 1
+            elif now_ns - stat.st_mtime_ns < min_age_s * 1e9:
+                settling += 1
+            else:
+                candidates.append((path, stat.st_size, stat.st_mtime_ns))
+    deleted = sorted(set(known) - seen)
+    return candidates, deleted, unchanged, settling
+
+
+class FolderIndex:
+    """
+    Persistent index and results store for one watched folder.
+
+    Args:
+        db_path (str): SQLite database file (created if missing)
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Write transaction that takes the database lock up front."""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def settings(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'settings'").fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_settings(self, settings):
+        """
+        Store the classification settings (top_k, threshold).
+
+        If they differ from the stored ones every entry is marked stale so the
+        next pass reclassifies it.
+
+        Returns:
+            bool: True if existing entries were invalidated
+        """
+        previous = self.settings()
+        with self.transaction():
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('settings', ?)",
+                              (json.dumps(settings, sort_keys=True),))
+            if previous is not None and previous != settings:
+                self.conn.execute("UPDATE files SET checkpoint = NULL")
+                return True
+        return False
+
+    def known(self):
+        """path -> (size, mtime_ns, checkpoint) for every indexed file."""
+        return {path: (size, mtime_ns, checkpoint) for path, size, mtime_ns, checkpoint
+                in self.conn.execute("SELECT path, size, mtime_ns, checkpoint FROM files")}
+
+    def lookup(self, path):
+        """(sha256, checkpoint) of an indexed file, or None."""
+        return self.conn.execute("SELECT sha256, checkpoint FROM files WHERE path = ?",
+                                 (path,)).fetchone()
+
+    def find_result(self, sha256, checkpoint):
+        """
+        A stored result for the same content and checkpoint, or None.
+
+        Decode errors are never reused, so a copy or rename of a file that
+        failed is retried.
+        """
+        for (result,) in self.conn.execute(
+            "SELECT result FROM files WHERE sha256 = ? AND checkpoint = ?", (sha256, checkpoint)
+        ):
+            result = json.loads(result)
+            if "error" not in result:
+                return result
+        return None
+
+    def touch(self, path, size, mtime_ns):
+        """Record a new stat for a file whose content did not change."""
+        self.conn.execute("UPDATE files SET size = ?, mtime_ns = ? WHERE path = ?",
+                          (size, mtime_ns, path))
+
+    def put(self, path, size, mtime_ns, sha256, checkpoint, result):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO files (path, size, mtime_ns, sha256, checkpoint, "
+            "classified_at, result) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (path, size, mtime_ns, sha256, checkpoint, time.time(), json.dumps(result))
+        )
+
+    def remove(self, paths):
+        self.conn.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in paths])
+
+    def results(self):
+        """Yield every stored result, by path."""
+        for (result,) in self.conn.execute("SELECT result FROM files ORDER BY path"):
+            yield json.loads(result)
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+
+class FolderWatcher:
+    """
+    Runs incremental classification passes over a folder.
+
+    Args:
+        root (str): Folder to watch
+        index (FolderIndex): Index and results store
+        load_model (callable): Returns the model; only called once a pass
+                               has something to classify
+        decoder (ArchiveDecoder): Image decoder (worker processes or in-process)
+        checkpoint (str, optional): Checkpoint path recorded with each result
+        top_k (int): Number of top predictions
+        threshold (float): Minimum confidence threshold (0-1)
+        batch_size (int): Images per forward pass (and per index commit)
+        min_age_s (float): Leave files modified this recently for the next pass
+    """
+
+    def __init__(self, root, index, load_model, decoder, checkpoint=None, top_k=5,
+                 threshold=0.0, batch_size=32, min_age_s=2.0):
+        self.root = root
+        self.index = index
+        self.load_model = load_model
+        self.decoder = decoder
+        self.checkpoint = checkpoint
+        self.top_k = top_k
+        self.threshold = threshold
+        self.batch_size = batch_size
+        self.min_age_s = min_age_s
+        self.model = None
+        self.last_pass = None
+        self.invalidated = index.set_settings({"top_k": top_k, "threshold": threshold})
+
+    def run_pass(self):
+        """
+        Bring the index up to date with the folder.
+
+        Yields:
+            dict: Results of new or changed files (with "status" new,
+                  changed or reused) and {"image", "status": "deleted"} for
+                  removed files; self.last_pass holds the pass statistics
+        """
+        from utils.archives import classify_members
+
+        start_time = time.time()
+        checkpoint = checkpoint_id(self.checkpoint)
+        candidates, deleted, unchanged, settling = scan_folder(
+            self.root, self.index.known(), checkpoint, self.min_age_s
+        )
+        stats = {"new": 0, "changed": 0, "reused": 0, "touched": 0, "deleted": len(deleted),
+                 "classified": 0, "unchanged": unchanged, "settling": settling}
+
+        pending = {}
+
+        def members():
+            """Hash candidates; yield only those that need inference."""
+            for path, size, mtime_ns in candidates:
+                try:
+                    with open(path, "rb") as f:
+                        data = f.read()
+                except OSError:
+                    continue
+                sha256 = hashlib.sha256(data).hexdigest()
+                previous = self.index.lookup(path)
+                status = NEW if previous is None else CHANGED
+                if previous == (sha256, checkpoint):
+                    self.index.touch(path, size, mtime_ns)
+                    stats["touched"] += 1
+                    continue
+                result = self.index.find_result(sha256, checkpoint)
+                if result is not None:
+                    result["image"] = path
+                    self.index.put(path, size, mtime_ns, sha256, checkpoint, result)
+                    stats[REUSED] += 1
+                    reused.append({**result, "status": REUSED})
+                    continue
+                stats[status] += 1
+                pending[path] = (size, mtime_ns, sha256, status)
+                yield path, data
+
+        reused, batch = [], []
+        conn = self.index.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for result in self._classify(classify_members, members()):
+                size, mtime_ns, sha256, status = pending.pop(result["image"])
+                del result["member"]
+                self.index.put(result["image"], size, mtime_ns, sha256, checkpoint, result)
+                stats["classified"] += 1
+                batch.append({**result, "status": status})
+                if len(batch) == self.batch_size:
+                    # Commit per batch so an interrupted pass keeps its progress,
+                    # and never hold the lock while the caller handles results
+                    conn.execute("COMMIT")
+                    yield from reused
+                    yield from batch
+                    reused.clear()
+                    batch.clear()
+                    conn.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        yield from reused
+        yield from batch
+
+        # Removed last so renamed and moved files can reuse their old entries
+        if deleted:
+            with self.index.transaction():
+                self.index.remove(deleted)
+            for path in deleted:
+                yield {"image": path, "status": DELETED}
+
+        stats["indexed"] = self.index.count()
+        stats["pass_s"] = time.time() - start_time
+        self.last_pass = stats
+
+    def _classify(self, classify_members, members):
+        """Classify members, loading the model only if there is at least one."""
+        members = iter(members)
+        first = next(members, None)
+        if first is None:
+            return
+        if self.model is None:
+            self.model = self.load_model()
+
+        def all_members():
+            yield first
+            yield from members
+
+        yield from classify_members(
+            self.model, all_members(), self.decoder, top_k=self.top_k, threshold=self.threshold,
+            batch_size=self.batch_size, device=next(self.model.parameters()).device
+        )
+
+
+def format_pass(stats):
+    """One-line summary of a pass."""
+    return (f"{stats['new']} new, {stats['changed']} changed, {stats['deleted']} deleted, "
+            f"{stats['reused']} reused, {stats['touched']} touched, "
+            f"{stats['unchanged']} unchanged"
+            + (f", {stats['settling']} still being written" if stats['settling'] else "")
+            + f" • {stats['classified']} classified in {stats['pass_s']:.2f}s "
+              f"• {stats['indexed']} indexed")
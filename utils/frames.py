@@ -0,0 +1,170 @@
+"""
+Multi-frame inputs: animated GIF/WebP, multi-page TIFF and frame directories.
+
+Frames are decoded lazily one at a time (PIL decodes a frame on seek), so a
+long sequence never sits in memory; only one batch of preprocessed frames
+exists at a time. Each frame gets its own predictions plus temporally
+smoothed predictions (exponential moving average of the probabilities).
+"""
+import os
+import re
+
+import numpy as np
+import torch
+from PIL import Image
+
+from utils.image_processor import get_transform, load_class_labels
+
+
+FRAME_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp', '.tif', '.tiff')
+
+
+def _natural_key(name):
+    """Sort key that orders frame_2 before frame_10."""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r'(\d+)', name)]
+
+
+def count_frames(source):
+    """Number of frames in a multi-frame image or frame directory."""
+    if os.path.isdir(source):
+        return len(list_frame_files(source))
+    with Image.open(source) as image:
+        return getattr(image, "n_frames", 1)
+
+
+def is_multiframe(source):
+    """Whether a path is a frame directory or an image with more than one frame."""
+    return os.path.isdir(source) or count_frames(source) > 1
+
+
+def list_frame_files(directory):
+    """Image files of a frame directory in natural (numbered) order."""
+    names = [name for name in os.listdir(directory) if name.lower().endswith(FRAME_EXTENSIONS)]
+    return [os.path.join(directory, name) for name in sorted(names, key=_natural_key)]
+
+
+def iter_frames(source, stride=1, skip=0, max_frames=None):
+    """
+    Lazily yield frames of a sequence.
+
+    Args:
+        source (str or PIL.Image): Animated GIF/WebP, multi-page TIFF, an
+                                   opened PIL image, or a directory of
+                                   numbered frame images
+        stride (int): Yield every `stride`-th frame
+        skip (int): Number of leading frames to skip
+        max_frames (int, optional): Stop after this many yielded frames
+
+    Yields:
+        tuple: (frame_index, PIL.Image in RGB)
+    """
+    stride = max(1, stride)
+    yielded = 0
+
+    if isinstance(source, str) and os.path.isdir(source):
+        for index, path in enumerate(list_frame_files(source)):
+            if index < skip or (index - skip) % stride:
+                continue
+            with Image.open(path) as frame:
+                yield index, frame.convert('RGB')
+            yielded += 1
+            if max_frames is not None and yielded >= max_frames:
+                return
+        return
+
+    image = Image.open(source) if isinstance(source, str) else source
+    try:
+        total = getattr(image, "n_frames", 1)
+        for index in range(skip, total, stride):
+            image.seek(index)
+            yield index, image.convert('RGB')
+            yielded += 1
+            if max_frames is not None and yielded >= max_frames:
+                return
+    finally:
+        if isinstance(source, str):
+            image.close()
+
+
+class FrameClassifier:
+    """
+    Batches frames into the model and emits per-frame and smoothed predictions.
+
+    Args:
+        model: Callable mapping an N x 3 x 224 x 224 batch to N x C logits
+        top_k (int): Number of predictions per frame
+        threshold (float): Minimum confidence (0-1)
+        batch_size (int): Frames per forward pass
+        smoothing (float): EMA weight of the previous smoothed probabilities
+                           (0 disables smoothing)
+        device (torch.device, optional): Device for the input batches
+    """
+
+    def __init__(self, model, top_k=5, threshold=0.0, batch_size=16, smoothing=0.7, device=None):
+        self.model = model
+        self.top_k = top_k
+        self.threshold = threshold
+        self.batch_size = batch_size
+        self.smoothing = smoothing
+        self.device = device
+        self.transform = get_transform()
+        self.class_labels = load_class_labels()
+        self.frames_seen = 0
+        self._smoothed = None
+        self._probability_sum = None
+
+    def _top(self, probabilities):
+        top = np.argsort(-probabilities)[:self.top_k]
+        return [
+            (self.class_labels.get(int(idx), f"Unknown (class {int(idx)})"), float(probabilities[idx]))
+            for idx in top if probabilities[idx] >= self.threshold
+        ]
+
+    def _run_batch(self, indices, tensors):
+        batch = torch.stack(tensors)
+        if self.device is not None:
+            batch = batch.to(self.device)
+        with torch.no_grad():
+            probabilities = torch.softmax(self.model(batch).float(), dim=1).cpu().numpy()
+
+        for index, frame_probabilities in zip(indices, probabilities):
+            if self._smoothed is None:
+                self._smoothed = frame_probabilities.copy()
+                self._probability_sum = np.zeros_like(frame_probabilities, dtype=np.float64)
+            else:
+                self._smoothed *= self.smoothing
+                self._smoothed += (1 - self.smoothing) * frame_probabilities
+            self._probability_sum += frame_probabilities
+            self.frames_seen += 1
+            yield {
+                "frame": index,
+                "predictions": self._top(frame_probabilities),
+                "smoothed_predictions": self._top(self._smoothed)
+            }
+
+    def classify(self, frames):
+        """
+        Classify a stream of frames.
+
+        Args:
+            frames (iterable): (frame_index, PIL.Image) pairs, e.g. from iter_frames()
+
+        Yields:
+            dict: frame, predictions and smoothed_predictions (lists of
+                  (class_name, confidence)), in frame order
+        """
+        indices, tensors = [], []
+        for index, frame in frames:
+            indices.append(index)
+            tensors.append(self.transform(frame))
+            if len(tensors) == self.batch_size:
+                yield from self._run_batch(indices, tensors)
+                indices, tensors = [], []
+        if tensors:
+            yield from self._run_batch(indices, tensors)
+
+    def summary(self):
+        """Top predictions of the mean probability over all frames seen."""
+        if not self.frames_seen:
+            return []
+        return self._top(self._probability_sum / self.frames_seen)
@@ -1,41 +1,54 @@
+import numpy as np
 import torch
 from torchvision import transforms
 from PIL import Image
 import json
 import os
+import time
 
+from utils.config import get_config
 
-# ImageNet normalization parameters
-IMAGENET_MEAN = [0.485, 0.456, 0.406]
-IMAGENET_STD = [0.229, 0.224, 0.225]
 
+# ImageNet normalization parameters and input size (config.yaml, must match training)
+IMAGENET_MEAN = get_config().mean
+IMAGENET_STD = get_config().std
+RESIZE_SIZE = get_config().resize_size
+CROP_SIZE = get_config().img_size
 
-def get_transform():
+
+def get_transform(crop_size=None):
     """
     Get the standard ImageNet preprocessing transform.
     
+    Args:
+        crop_size (int, optional): Smaller center crop for cheaper inference
+                                   (the resize keeps the standard ratio);
+                                   default CROP_SIZE
+    
     Returns:
         torchvision.transforms.Compose: Transform pipeline
     """
+    crop_size = crop_size or CROP_SIZE
     return transforms.Compose([
-        transforms.Resize(256),
-        transforms.CenterCrop(224),
+        transforms.Resize(round(crop_size * RESIZE_SIZE / CROP_SIZE)),
+        transforms.CenterCrop(crop_size),
         transforms.ToTensor(),
         transforms.Normalize(mean=IMAGENET_MEAN, std=IMAGENET_STD)
     ])
 
 
-def preprocess_image(image):
+def preprocess_image(image, crop_size=None):
     """
     Preprocess an image for model inference.
     
     Args:
         image (PIL.Image): Input image
+        crop_size (int, optional): Input resolution (default CROP_SIZE)
     
     Returns:
         torch.Tensor: Preprocessed image tensor with batch dimension
     """
-    transform = get_transform()
+    transform = get_transform(crop_size)
     image_tensor = transform(image)
     # Add batch dimension
     image_tensor = image_tensor.unsqueeze(0)
@@ -47,9 +60,93 @@ def preprocess_image(image):
     return image_tensor
 
 
+def resize_crop(image, crop_size=None):
+    """
+    Resize and center-crop in one PIL call, like get_transform()'s Resize and
+    CenterCrop but without the intermediate resized image.
+    
+    Only the source region that ends up in the crop is resampled, on the
+    same output grid as resizing the whole image first; pixels match that
+    path to within rounding (at most 1/255).
+    
+    Args:
+        image (PIL.Image): RGB input image
+        crop_size (int, optional): Output resolution (default CROP_SIZE)
+    
+    Returns:
+        PIL.Image: crop_size x crop_size image
+    """
+    crop_size = crop_size or CROP_SIZE
+    resize = round(crop_size * RESIZE_SIZE / CROP_SIZE)
+    width, height = image.size
+    # Same output size rounding as transforms.Resize(int)
+    if width <= height:
+        new_width, new_height = resize, int(resize * height / width)
+    else:
+        new_width, new_height = int(resize * width / height), resize
+    if new_width < crop_size or new_height < crop_size:
+        return transforms.CenterCrop(crop_size)(image.resize((new_width, new_height),
+                                                             Image.Resampling.BILINEAR))
+    # Same offsets as transforms.CenterCrop
+    left = int(round((new_width - crop_size) / 2.0))
+    top = int(round((new_height - crop_size) / 2.0))
+    scale_x, scale_y = width / new_width, height / new_height
+    box = (left * scale_x, top * scale_y, (left + crop_size) * scale_x, (top + crop_size) * scale_y)
+    return image.resize((crop_size, crop_size), Image.Resampling.BILINEAR, box=box)
+
+
+def decode_uint8(image):
+    """
+    Resize and center-crop an image without normalizing it.
+    
+    Args:
+        image (PIL.Image): Input image
+    
+    Returns:
+        numpy.ndarray: uint8 array of shape 3 x 224 x 224
+    """
+    crop = transforms.CenterCrop(CROP_SIZE)(transforms.Resize(RESIZE_SIZE)(image.convert('RGB')))
+    return np.asarray(crop, dtype=np.uint8).transpose(2, 0, 1)
+
+
+def normalize_uint8(batch, device=None):
+    """
+    Normalize a uint8 N x 3 x 224 x 224 batch exactly like get_transform().
+    
+    The batch is moved to the device before it is expanded to float, so a
+    GPU transfer carries a quarter of the bytes.
+    
+    Args:
+        batch (torch.Tensor): uint8 batch
+        device (torch.device, optional): Target device
+    
+    Returns:
+        torch.Tensor: float32 normalized batch
+    """
+    if device is not None:
+        batch = batch.to(device, non_blocking=True)
+    mean = torch.tensor(IMAGENET_MEAN, device=batch.device).view(1, 3, 1, 1)
+    std = torch.tensor(IMAGENET_STD, device=batch.device).view(1, 3, 1, 1)
+    return batch.float().div_(255).sub_(mean).div_(std)
+
+
+LABELS_URL = "https://raw.githubusercontent.com/anishathalye/imagenet-simple-labels/master/imagenet-simple-labels.json"
+# Seconds to wait for the label download, and before retrying a failed one
+LABELS_TIMEOUT_S = 5
+LABELS_RETRY_S = 300
+
+# Successfully loaded labels by labels_path. A failed download is not cached,
+# so long-running processes pick up the real names once the network is back
+_class_labels = {}
+_labels_failed_at = None
+
+
 def load_class_labels(labels_path=None):
     """
     Load ImageNet class labels.
+    Cached once loaded, so the labels are fetched once per process, not once
+    per prediction. While the download fails, generic class_N names are
+    returned and the download is retried every LABELS_RETRY_S seconds.
     
     Args:
         labels_path (str, optional): Path to custom labels JSON file
@@ -57,26 +154,34 @@ def load_class_labels(labels_path=None):
     Returns:
         dict: Dictionary mapping class indices to class names
     """
+    global _labels_failed_at
+    
+    labels = _class_labels.get(labels_path)
+    if labels is not None:
+        return labels
+    
     if labels_path and os.path.exists(labels_path):
         with open(labels_path, 'r') as f:
-            return json.load(f)
-    
-    # Default ImageNet class names (simplified version)
-    # In production, you should include all 1000 classes
-    # This is a placeholder - you can load from a file or use imagenet_classes
-    try:
-        # Try to load from a standard location
-        import urllib.request
-        url = "https://raw.githubusercontent.com/anishathalye/imagenet-simple-labels/master/imagenet-simple-labels.json"
-        with urllib.request.urlopen(url) as response:
-            labels = json.loads(response.read().decode())
-            return {i: label for i, label in enumerate(labels)}
-    except:
-        # Fallback to generic labels
-        return {i: f"class_{i}" for i in range(1000)}
+            labels = _class_labels[labels_path] = json.load(f)
+            return labels
+    
+    # Default ImageNet class names, downloaded from a standard location
+    if _labels_failed_at is None or time.monotonic() - _labels_failed_at >= LABELS_RETRY_S:
+        try:
+            import urllib.request
+            with urllib.request.urlopen(LABELS_URL, timeout=LABELS_TIMEOUT_S) as response:
+                labels = json.loads(response.read().decode())
+            labels = _class_labels[labels_path] = {i: label for i, label in enumerate(labels)}
+            _labels_failed_at = None
+            return labels
+        except Exception:
+            _labels_failed_at = time.monotonic()
+    
+    # Fallback to generic labels (not cached)
+    return {i: f"class_{i}" for i in range(get_config().num_classes)}
 
 
-def get_top_predictions(probabilities, top_k=5, threshold=0.0):
+def get_top_predictions(probabilities, top_k=5, threshold=0.0, return_indices=False):
     """
     Get top K predictions from model output.
     
@@ -84,9 +189,11 @@ def get_top_predictions(probabilities, top_k=5, threshold=0.0):
         probabilities (torch.Tensor): Softmax probabilities from model
         top_k (int): Number of top predictions to return
         threshold (float): Minimum confidence threshold (0-1)
+        return_indices (bool): Also return each class index
     
     Returns:
-        list: List of tuples (class_name, confidence)
+        list: List of tuples (class_name, confidence), or
+              (class_index, class_name, confidence) with return_indices
     """
     # Load class labels
     class_labels = load_class_labels()
@@ -100,7 +207,10 @@ def get_top_predictions(probabilities, top_k=5, threshold=0.0):
         if prob_value >= threshold:
             class_idx = idx.item()
             class_name = class_labels.get(class_idx, f"Unknown (class {class_idx})")
-            predictions.append((class_name, prob_value))
+            if return_indices:
+                predictions.append((class_idx, class_name, prob_value))
+            else:
+                predictions.append((class_name, prob_value))
     
     return predictions
 
@@ -0,0 +1,185 @@
+"""
+Thin client for the local inference daemon.
+
+Only depends on the standard library so that `inference.py` can forward
+requests to a running daemon without paying the torch import cost.
+"""
+import json
+import os
+import socket
+import tempfile
+import threading
+
+
+DEFAULT_SOCKET_PATH = os.environ.get(
+    "IMAGENET_INFERENCE_SOCKET",
+    os.path.join(tempfile.gettempdir(), f"imagenet-inference-{os.getuid()}.sock")
+)
+
+
+class DaemonUnavailable(Exception):
+    """Raised when no compatible daemon is listening on the socket."""
+
+
+def normalize_checkpoint(checkpoint):
+    """Return the absolute checkpoint path (or None for the pretrained model)."""
+    return os.path.abspath(checkpoint) if checkpoint else None
+
+
+def normalize_options(options=None):
+    """
+    Fill in the defaults of load_model execution options, so that two option
+    sets compare equal exactly when they select the same execution mode.
+
+    Args:
+        options (dict, optional): optimize, compile_model, backend, precision
+
+    Returns:
+        dict: All four options
+    """
+    options = options or {}
+    return {
+        "optimize": bool(options.get("optimize", False)),
+        "compile_model": bool(options.get("compile_model", False)),
+        "backend": options.get("backend"),
+        "precision": options.get("precision") or "fp32"
+    }
+
+
+class InferenceClient:
+    """
+    JSONL client for the inference daemon.
+
+    Each request is one JSON object per line; the daemon answers every
+    request with exactly one JSON line, in order.
+    """
+
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH, timeout=None):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._sock = None
+        self._reader = None
+        self._writer = None
+
+    def connect(self):
+        if not os.path.exists(self.socket_path):
+            raise DaemonUnavailable(f"No daemon socket at {self.socket_path}")
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError as e:
+            sock.close()
+            raise DaemonUnavailable(f"Cannot connect to {self.socket_path}: {e}")
+        self._sock = sock
+        self._reader = sock.makefile("r", encoding="utf-8")
+        self._writer = sock.makefile("w", encoding="utf-8")
+        return self
+
+    def close(self):
+        for f in (self._reader, self._writer, self._sock):
+            if f is not None:
+                try:
+                    f.close()
+                except OSError:
+                    pass
+        self._sock = self._reader = self._writer = None
+
+    def __enter__(self):
+        return self.connect()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _send(self, payload):
+        self._writer.write(json.dumps(payload) + "\n")
+        self._writer.flush()
+
+    def _receive(self):
+        line = self._reader.readline()
+        if not line:
+            raise DaemonUnavailable("Daemon closed the connection")
+        return json.loads(line)
+
+    def request(self, payload):
+        """Send a single request and wait for its response."""
+        try:
+            self._send(payload)
+            return self._receive()
+        except OSError as e:
+            raise DaemonUnavailable(str(e))
+
+    def ping(self, checkpoint=None, options=None):
+        """
+        Check that the daemon serves the given checkpoint and execution mode.
+
+        Args:
+            checkpoint (str, optional): Checkpoint path (None for pretrained)
+            options (dict, optional): load_model execution options (backend,
+                                      precision, optimize, compile_model);
+                                      not checked if None
+
+        Raises:
+            DaemonUnavailable: If the daemon serves a different checkpoint or
+                               was started with different options
+        """
+        payload = {"op": "ping"}
+        if options is not None:
+            payload["options"] = normalize_options(options)
+        response = self.request(payload)
+        if response.get("checkpoint") != normalize_checkpoint(checkpoint):
+            raise DaemonUnavailable(
+                f"Daemon serves {response.get('checkpoint') or 'pretrained'}, "
+                f"not {checkpoint or 'pretrained'}"
+            )
+        if "error" in response:
+            raise DaemonUnavailable(response["error"])
+        return response
+
+    def shutdown(self):
+        return self.request({"op": "shutdown"})
+
+    def classify_stream(self, image_paths, top_k=5, threshold=0.0):
+        """
+        Stream classification requests and yield responses as they arrive.
+
+        Requests are written from a background thread so the daemon can
+        work on the next image while earlier results are being consumed.
+
+        Args:
+            image_paths (iterable): Image paths, consumed lazily
+            top_k (int): Number of top predictions
+            threshold (float): Minimum confidence threshold (0-1)
+
+        Yields:
+            dict: One response per image, in request order
+        """
+        done = threading.Event()
+
+        def writer():
+            try:
+                for path in image_paths:
+                    self._send({
+                        "op": "classify",
+                        "image": os.path.abspath(path),
+                        "top_k": top_k,
+                        "threshold": threshold
+                    })
+                self._send({"op": "end"})
+            except OSError:
+                pass
+            finally:
+                done.set()
+
+        thread = threading.Thread(target=writer, daemon=True)
+        thread.start()
+        try:
+            while True:
+                response = self._receive()
+                if response.get("op") == "end":
+                    break
+                yield response
+        except OSError as e:
+            raise DaemonUnavailable(str(e))
+        finally:
+            done.wait(timeout=1.0)
@@ -0,0 +1,195 @@
+"""
+Long-lived local inference daemon.
+
+Loads the model once and serves JSONL classification requests over a Unix
+socket, so that repeated `inference.py` calls only pay for a forward pass.
+See `utils/inference_client.py` for the wire protocol.
+"""
+import json
+import os
+import socketserver
+import threading
+import time
+
+import torch
+from PIL import Image
+
+from utils.backends import InferenceBackend
+from utils.model_loader import load_model
+from utils.optimization import CompiledModel
+from utils.image_processor import preprocess_image, get_top_predictions
+from utils.inference_client import normalize_checkpoint, normalize_options
+from utils.profiling import (
+    FORWARD_LABEL,
+    POSTPROCESS_LABEL,
+    PREPROCESS_LABEL,
+    record_function
+)
+
+
+def classify_path(model, image_path, top_k=5, threshold=0.0, lock=None):
+    """
+    Classify a single image file.
+
+    Args:
+        model: Loaded model in evaluation mode
+        image_path (str): Path to the image
+        top_k (int): Number of top predictions
+        threshold (float): Minimum confidence threshold (0-1)
+        lock (threading.Lock, optional): Serializes forward passes
+
+    Returns:
+        dict: Result with image size, ranked predictions and timing
+    """
+    image = Image.open(image_path).convert('RGB')
+
+    start_time = time.time()
+    with record_function(PREPROCESS_LABEL):
+        input_tensor = preprocess_image(image)
+
+    with torch.no_grad():
+        with record_function(FORWARD_LABEL):
+            if lock is not None:
+                with lock:
+                    output = model(input_tensor)
+            else:
+                output = model(input_tensor)
+        with record_function(POSTPROCESS_LABEL):
+            probabilities = torch.nn.functional.softmax(output[0], dim=0)
+            predictions = get_top_predictions(probabilities, top_k=top_k, threshold=threshold,
+                                              return_indices=True)
+
+    inference_time = time.time() - start_time
+
+    return {
+        "image": image_path,
+        "image_size": list(image.size),
+        "predictions": [
+            {"rank": i + 1, "class": class_name, "class_index": class_idx,
+             "confidence": float(confidence)}
+            for i, (class_idx, class_name, confidence) in enumerate(predictions)
+        ],
+        "inference_time_ms": inference_time * 1000
+    }
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Answers one JSON line per request line until the client disconnects."""
+
+    def handle(self):
+        daemon = self.server.inference_daemon
+        for line in self.rfile:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                response = daemon.handle_request(json.loads(line))
+            except Exception as e:
+                response = {"error": str(e)}
+            self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+            self.wfile.flush()
+            if response.get("op") == "shutdown":
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class InferenceDaemon:
+    """
+    Serves classification requests for one checkpoint over a Unix socket.
+
+    Args:
+        model_path (str, optional): Checkpoint path (None for pretrained)
+        socket_path (str): Unix socket to listen on
+        optimize (bool): Serve the optimized eager model
+        compile_model (bool): Serve the torch.compile'd model
+        backend (str, optional): Serve this inference backend ("auto" picks
+                                 the fastest on this host)
+        precision (str): Backend precision ("fp32", "bf16" or "fp16")
+        model (torch.nn.Module, optional): Already loaded model to serve
+                                           instead of loading model_path
+    """
+
+    def __init__(self, model_path=None, socket_path=None, optimize=False, compile_model=False,
+                 backend=None, precision="fp32", model=None):
+        self.model_path = normalize_checkpoint(model_path)
+        self.socket_path = socket_path
+        self.optimize = optimize
+        # As requested: clients asking for other options are turned away even
+        # if this daemon fell back to the same execution mode
+        self.options = normalize_options({"optimize": optimize, "compile_model": compile_model,
+                                          "backend": backend, "precision": precision})
+        self.model = model if model is not None else load_model(
+            model_path, optimize=optimize, compile_model=compile_model,
+            backend=backend, precision=precision
+        )
+        # False when torch.compile fell back to eager
+        self.compiled = isinstance(self.model, CompiledModel)
+        # Backend actually in use (a requested one may fall back to eager)
+        self.backend = self.model.name if isinstance(self.model, InferenceBackend) else None
+        self.precision = self.model.precision if isinstance(self.model, InferenceBackend) else "fp32"
+        self.lock = threading.Lock()
+        self.requests_served = 0
+        self.started_at = time.time()
+
+    def handle_request(self, request):
+        op = request.get("op", "classify")
+
+        if op == "ping":
+            response = {
+                "op": "ping",
+                "pid": os.getpid(),
+                "checkpoint": self.model_path,
+                "optimized": self.optimize,
+                "compiled": self.compiled,
+                "backend": self.backend,
+                "precision": self.precision,
+                "requests_served": self.requests_served,
+                "uptime_s": time.time() - self.started_at,
+                "options": self.options
+            }
+            requested = request.get("options")
+            if requested is not None and normalize_options(requested) != self.options:
+                response["error"] = (f"Daemon runs with {self.options}, "
+                                     f"not {normalize_options(requested)}")
+            return response
+        if op in ("end", "shutdown"):
+            return {"op": op}
+        if op != "classify":
+            return {"error": f"Unknown op: {op}"}
+
+        try:
+            result = classify_path(
+                self.model,
+                request["image"],
+                top_k=int(request.get("top_k", 5)),
+                threshold=float(request.get("threshold", 0.0)),
+                lock=self.lock
+            )
+        except Exception as e:
+            result = {"image": request.get("image"), "error": str(e)}
+        # Requests are handled on one thread per connection
+        with self.lock:
+            self.requests_served += 1
+        return result
+
+    def serve_forever(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+        server = _UnixServer(self.socket_path, _RequestHandler)
+        server.inference_daemon = self
+        os.chmod(self.socket_path, 0o600)
+        print(f"Inference daemon listening on {self.socket_path} (pid {os.getpid()})", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            print("Inference daemon stopped", flush=True)
@@ -1,11 +1,171 @@
 import torch
 import torch.nn as nn
 from torchvision import models
+import inspect
 import os
 import sys
 
+from utils.backends import InferenceBackend, create_backend
+from utils.optimization import (
+    CompiledModel,
+    OptimizedModel,
+    compile_for_inference,
+    optimize_for_inference
+)
 
-def load_model(model_path=None):
+
+def supports_mmap_load():
+    """Whether torch.load can memory-map checkpoints (torch >= 2.1)."""
+    return "mmap" in inspect.signature(torch.load).parameters
+
+
+def load_checkpoint(model_path):
+    """
+    Load a checkpoint onto the CPU.
+    
+    With torch >= 2.1 the file is memory-mapped, so tensors are only read from
+    disk when they are copied into the model and entries the model does not
+    need (EMA weights, optimizer states) are never materialized. Older torch
+    versions and legacy (non-zip) checkpoints fall back to a regular load.
+    
+    Args:
+        model_path (str): Path to the checkpoint
+    
+    Returns:
+        The deserialized checkpoint object
+    """
+    if supports_mmap_load():
+        try:
+            return torch.load(model_path, map_location="cpu", mmap=True)
+        except RuntimeError:
+            # Legacy serialization format cannot be memory-mapped
+            pass
+    return torch.load(model_path, map_location="cpu")
+
+
+def checkpoint_format(checkpoint):
+    """
+    Identify the checkpoint layout.
+    
+    Returns:
+        str: "lightning", "model_state_dict" or "state_dict"
+    """
+    if isinstance(checkpoint, dict) and 'state_dict' in checkpoint:
+        return "lightning"
+    if isinstance(checkpoint, dict) and 'model_state_dict' in checkpoint:
+        return "model_state_dict"
+    return "state_dict"
+
+
+def strip_lightning_prefix(key):
+    """
+    Map a Lightning checkpoint key to a ResNet50 key.
+    
+    Handles: 'model._orig_mod.xxx', 'model.xxx', or 'xxx'.
+    Returns None for keys that should be skipped (EMA weights).
+    """
+    # Skip EMA keys if present (from EMA callback)
+    if key.startswith('ema_model.'):
+        return None
+    # Remove 'model._orig_mod.' prefix (from compiled models)
+    if key.startswith('model._orig_mod.'):
+        return key[16:]
+    # Remove 'model.' prefix (from non-compiled models)
+    if key.startswith('model.'):
+        return key[6:]
+    return key
+
+
+def build_resnet50(num_classes=1000):
+    """
+    Build an uninitialized ResNet50 on the meta device.
+    
+    No memory is allocated for the weights; stream_state_dict() assigns the
+    checkpoint tensors to it directly.
+    """
+    with torch.device("meta"):
+        model = models.resnet50(weights=None)
+        # Modify final layer if needed
+        if num_classes != 1000:
+            model.fc = nn.Linear(model.fc.in_features, num_classes)
+    return model
+
+
+def _assign_tensor(model, key, value):
+    """Make `value` the parameter or buffer `key` of the model, without copying."""
+    module_path, _, name = key.rpartition('.')
+    module = model.get_submodule(module_path)
+    if name in module._parameters:
+        old = module._parameters[name]
+        module._parameters[name] = nn.Parameter(value, requires_grad=old.requires_grad)
+    else:
+        module._buffers[name] = value
+
+
+def stream_state_dict(model, state_dict, rename=None, strict=True):
+    """
+    Move a state dict into a model one tensor at a time.
+    
+    Checkpoint tensors become the model's parameters and buffers directly
+    (no copy), and every entry is popped from `state_dict` as it is handled,
+    so skipped entries are released immediately and no renamed or filtered
+    copy of the dict is ever built. Keys are renamed on the fly.
+    
+    Entries the model does not have are skipped; model tensors missing from
+    the checkpoint keep torchvision's default initialization.
+    
+    Args:
+        model (torch.nn.Module): Target model, typically from build_resnet50()
+        state_dict (dict): Source tensors (emptied by this call)
+        rename (callable, optional): Maps a source key to a model key, or to
+                                     None to skip the entry
+        strict (bool): Raise on missing or unexpected keys, like load_state_dict
+    
+    Returns:
+        tuple: (missing_keys, unexpected_keys)
+    """
+    targets = {key: (tensor.shape, tensor.dtype) for key, tensor in model.state_dict().items()}
+    loaded = set()
+    unexpected_keys = []
+    
+    for key in list(state_dict.keys()):
+        value = state_dict.pop(key)
+        new_key = rename(key) if rename is not None else key
+        if new_key is None:
+            continue
+        if new_key not in targets:
+            unexpected_keys.append(key)
+            continue
+        shape, dtype = targets[new_key]
+        if value.shape != shape:
+            raise RuntimeError(
+                f"size mismatch for {new_key}: copying a param with shape "
+                f"{tuple(value.shape)}, the shape in current model is {tuple(shape)}"
+            )
+        _assign_tensor(model, new_key, value.to(dtype))
+        loaded.add(new_key)
+    
+    missing_keys = [key for key in targets if key not in loaded]
+    if strict and (missing_keys or unexpected_keys):
+        raise RuntimeError(
+            f"Error(s) in loading state_dict for {type(model).__name__}: "
+            f"missing keys {missing_keys[:5]}, unexpected keys {unexpected_keys[:5]}"
+        )
+    
+    # Materialize anything the checkpoint did not provide with default init
+    if missing_keys and any(model.state_dict()[key].is_meta for key in missing_keys):
+        reference = models.resnet50(weights=None)
+        if model.fc.out_features != reference.fc.out_features:
+            reference.fc = nn.Linear(reference.fc.in_features, model.fc.out_features)
+        reference_state = reference.state_dict()
+        for key in missing_keys:
+            _assign_tensor(model, key, reference_state[key])
+    
+    return missing_keys, unexpected_keys
+
+
+def load_model(model_path=None, optimize=False, compile_model=False, backend=None,
+               precision="fp32"):
     """
     Load a trained ImageNet model.
     Supports both PyTorch Lightning checkpoints and standard PyTorch checkpoints.
@@ -13,20 +173,42 @@ def load_model(model_path=None):
     Args:
         model_path (str, optional): Path to a saved model checkpoint.
                                    If None, loads a pretrained ResNet50.
+        optimize (bool): Return the "optimized eager" model: BatchNorm folded
+                         into convolutions, channels_last memory format and
+                         inference_mode (see utils/optimization.py)
+        compile_model (bool): Compile with torch.compile for the static batch
+                              sizes in COMPILE_BATCH_SIZES, with an on-disk
+                              compile cache; falls back to eager on failure
+        backend (str, optional): Inference backend name from
+                                 utils.backends.BACKENDS, or "auto" to pick
+                                 the fastest one with matching logits on this
+                                 host (not combinable with optimize or
+                                 compile_model)
+        precision (str): "fp32", "bf16" or "fp16"; reduced precision runs
+                         the backend (eager if none is given) under
+                         autocast
     
     Returns:
-        torch.nn.Module: Loaded model in evaluation mode
+        torch.nn.Module: Loaded model in evaluation mode (an InferenceBackend
+                         when backend is given)
     """
+    if precision != "fp32" and backend is None:
+        backend = "eager"
+    if backend is not None and (optimize or compile_model):
+        raise ValueError("backend and precision cannot be combined with optimize or compile_model")
+    
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     
     if model_path and os.path.exists(model_path):
         print(f"Loading model from {model_path}")
         
-        # Try to load the checkpoint
-        checkpoint = torch.load(model_path, map_location=device)
+        # Load the checkpoint (memory-mapped when supported, always on CPU:
+        # tensors are copied into the model and the model is moved afterwards)
+        checkpoint = load_checkpoint(model_path)
+        checkpoint_type = checkpoint_format(checkpoint)
         
         # Check if this is a Lightning checkpoint
-        if isinstance(checkpoint, dict) and 'state_dict' in checkpoint:
+        if checkpoint_type == "lightning":
             # This is a Lightning checkpoint
             print("Detected PyTorch Lightning checkpoint")
             
@@ -36,36 +218,21 @@ def load_model(model_path=None):
                 num_classes = checkpoint['hyper_parameters'].get('num_classes', 1000)
                 print(f"Number of classes: {num_classes}")
             
-            # Initialize ResNet50 model
-            model = models.resnet50(weights=None)
-            
-            # Modify final layer if needed
-            if num_classes != 1000:
-                model.fc = nn.Linear(model.fc.in_features, num_classes)
-            
-            # Load state dict - Lightning wraps model in 'model' attribute
-            state_dict = checkpoint['state_dict']
+            # Keep only the state dict; optimizer states, loops and callbacks
+            # are released before the model allocates its own weights
+            state_dict = checkpoint.pop('state_dict')
+            del checkpoint
             
-            # Remove EMA keys if present (from EMA callback)
-            state_dict = {k: v for k, v in state_dict.items() if not k.startswith('ema_model.')}
-            
-            # Remove Lightning and torch.compile prefixes from keys
-            # Handles: 'model._orig_mod.xxx', 'model.xxx', or 'xxx'
-            new_state_dict = {}
-            for key, value in state_dict.items():
-                new_key = key
-                
-                # Remove 'model._orig_mod.' prefix (from compiled models)
-                if new_key.startswith('model._orig_mod.'):
-                    new_key = new_key[16:]  # Remove 'model._orig_mod.' prefix
-                # Remove 'model.' prefix (from non-compiled models)
-                elif new_key.startswith('model.'):
-                    new_key = new_key[6:]  # Remove 'model.' prefix
-                
-                new_state_dict[new_key] = value
+            # Initialize ResNet50 model (weights come from the checkpoint)
+            model = build_resnet50(num_classes)
             
+            # Load state dict - Lightning wraps model in 'model' attribute.
+            # EMA keys (from the EMA callback) are dropped and the Lightning /
+            # torch.compile prefixes removed as tensors are streamed in.
             # Load with strict=False to handle any missing/unexpected keys
-            missing_keys, unexpected_keys = model.load_state_dict(new_state_dict, strict=False)
+            missing_keys, unexpected_keys = stream_state_dict(
+                model, state_dict, rename=strip_lightning_prefix, strict=False
+            )
             
             if missing_keys:
                 print(f"Warning: Missing keys: {len(missing_keys)}")
@@ -74,17 +241,20 @@ def load_model(model_path=None):
             
             print(f"Successfully loaded Lightning checkpoint")
             
-        elif isinstance(checkpoint, dict) and 'model_state_dict' in checkpoint:
+        elif checkpoint_type == "model_state_dict":
             # Standard PyTorch checkpoint format
             print("Detected standard PyTorch checkpoint")
-            model = models.resnet50(weights=None)
-            model.load_state_dict(checkpoint['model_state_dict'])
+            state_dict = checkpoint.pop('model_state_dict')
+            del checkpoint
+            model = build_resnet50()
+            stream_state_dict(model, state_dict)
             
         else:
             # Direct state dict
             print("Detected direct state dict")
-            model = models.resnet50(weights=None)
-            model.load_state_dict(checkpoint)
+            model = build_resnet50()
+            stream_state_dict(model, checkpoint)
+            del checkpoint
         
         print(f"Model loaded successfully from {model_path}")
     else:
@@ -98,6 +268,13 @@ def load_model(model_path=None):
     model.to(device)
     model.eval()
     
+    if optimize:
+        model = optimize_for_inference(model)
+    if compile_model:
+        model = compile_for_inference(model)
+    if backend is not None:
+        model = create_backend(backend, model, precision=precision)
+    
     return model
 
 
@@ -114,9 +291,24 @@ def get_model_info(model):
     total_params = sum(p.numel() for p in model.parameters())
     trainable_params = sum(p.numel() for p in model.parameters() if p.requires_grad)
     
+    model_type = type(model).__name__
+    notes = []
+    backend = None
+    if isinstance(model, InferenceBackend):
+        backend = model.name if model.precision == "fp32" else f"{model.name} {model.precision}"
+        model = model.model
+    if isinstance(model, CompiledModel):
+        model, notes = model.model, ["compiled"]
+    if isinstance(model, OptimizedModel):
+        model, notes = model.model, ["optimized"] + notes
+    if backend is not None:
+        notes = [f"{backend} backend"]
+    if notes:
+        model_type = f"{type(model).__name__} ({', '.join(notes)})"
+    
     return {
         "total_parameters": total_params,
         "trainable_parameters": trainable_params,
         "device": next(model.parameters()).device,
-        "model_type": type(model).__name__
+        "model_type": model_type
     }
@@ -0,0 +1,103 @@
+"""
+PyTorch profiler integration for the inference path.
+
+Each profiled run is written to its own directory containing a Chrome trace
+(open in chrome://tracing or https://ui.perfetto.dev), operator tables sorted
+by self CPU time and by memory, and a metadata file with the checkpoint and
+settings the run used.
+"""
+import json
+import os
+import platform
+import time
+from datetime import datetime
+
+import torch
+from torch.profiler import ProfilerActivity, profile, record_function
+
+
+DEFAULT_PROFILE_DIR = "profiles"
+
+# Labels used with record_function() so preprocessing and the forward pass
+# show up as separate ranges in the trace
+PREPROCESS_LABEL = "preprocess"
+FORWARD_LABEL = "forward"
+POSTPROCESS_LABEL = "postprocess"
+
+
+class ProfileRun:
+    """
+    Context manager that profiles everything executed inside it.
+
+    Args:
+        output_dir (str): Parent directory for profile runs
+        name (str): Short label included in the run directory name
+        metadata (dict, optional): Checkpoint, settings etc. stored with the run
+        row_limit (int): Number of operators in the summary tables
+
+    Example:
+        with ProfileRun(metadata={"checkpoint": path}) as run:
+            process_single_image(image, model, 5, 0.0)
+        print(run.run_dir)
+    """
+
+    def __init__(self, output_dir=DEFAULT_PROFILE_DIR, name="inference", metadata=None, row_limit=25):
+        self.output_dir = output_dir
+        self.name = name
+        self.metadata = dict(metadata or {})
+        self.row_limit = row_limit
+        self.run_dir = None
+        self.cpu_table = None
+        self.memory_table = None
+        self._profiler = None
+        self._start_time = None
+
+    def __enter__(self):
+        activities = [ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(ProfilerActivity.CUDA)
+
+        self._profiler = profile(
+            activities=activities,
+            record_shapes=True,
+            profile_memory=True,
+            with_stack=False
+        )
+        self._start_time = time.time()
+        self._profiler.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._profiler.__exit__(exc_type, exc, tb)
+        wall_time = time.time() - self._start_time
+        if exc_type is None:
+            self._save(wall_time)
+        return False
+
+    def _save(self, wall_time):
+        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        self.run_dir = os.path.join(self.output_dir, f"{timestamp}-{self.name}")
+        os.makedirs(self.run_dir, exist_ok=True)
+
+        self._profiler.export_chrome_trace(os.path.join(self.run_dir, "trace.json"))
+
+        averages = self._profiler.key_averages()
+        self.cpu_table = averages.table(sort_by="self_cpu_time_total", row_limit=self.row_limit)
+        self.memory_table = averages.table(sort_by="self_cpu_memory_usage", row_limit=self.row_limit)
+
+        with open(os.path.join(self.run_dir, "ops_by_self_cpu.txt"), "w") as f:
+            f.write(self.cpu_table)
+        with open(os.path.join(self.run_dir, "ops_by_memory.txt"), "w") as f:
+            f.write(self.memory_table)
+
+        metadata = {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "wall_time_s": wall_time,
+            "torch_version": torch.__version__,
+            "num_threads": torch.get_num_threads(),
+            "device": "cuda" if torch.cuda.is_available() else "cpu",
+            "host": platform.node(),
+            **self.metadata
+        }
+        with open(os.path.join(self.run_dir, "metadata.json"), "w") as f:
+            json.dump(metadata, f, indent=2, default=str)
@@ -0,0 +1,294 @@
+"""
+Compact on-disk storage and streaming aggregates for large classification runs.
+
+Results are appended in chunks to flat binary files instead of being kept as
+Python objects:
+
+    images.txt             one image path per row
+    topk_indices.i16       int16  rows x top_k class indices (-1 = none)
+    topk_confidences.f16   float16 rows x top_k confidences
+    meta.json              row count, top_k and dtypes
+    summary.json           aggregates (see ResultSink.summary)
+
+Aggregates (per-class top-1 counts, confidence histograms and low-confidence
+tallies) are updated as results arrive, so memory stays flat however many
+images are processed and the summary is available without re-reading the
+results.
+"""
+import json
+import os
+
+import numpy as np
+
+from utils.image_processor import load_class_labels
+
+
+INDICES_FILE = "topk_indices.i16"
+CONFIDENCES_FILE = "topk_confidences.f16"
+IMAGES_FILE = "images.txt"
+META_FILE = "meta.json"
+SUMMARY_FILE = "summary.json"
+
+# Class indices are stored as int16
+MAX_CLASSES = np.iinfo(np.int16).max
+
+
+class ResultSink:
+    """
+    Append-only writer for classification results.
+
+    Args:
+        output_dir (str): Directory for the result files (existing results
+                          there are replaced)
+        top_k (int): Predictions stored per image
+        num_classes (int): Number of model classes (the model's output size,
+                           at most MAX_CLASSES)
+        chunk_size (int): Rows buffered before they are written
+        low_confidence (float): Top-1 confidence below which an image counts
+                                as low-confidence
+        bins (int): Confidence histogram bins over [0, 1]
+    """
+
+    def __init__(self, output_dir, top_k=5, num_classes=1000, chunk_size=4096,
+                 low_confidence=0.5, bins=20):
+        if not 1 <= num_classes <= MAX_CLASSES:
+            raise ValueError(f"num_classes must be between 1 and {MAX_CLASSES} "
+                             f"(class indices are stored as int16), got {num_classes}")
+        self.output_dir = output_dir
+        self.top_k = top_k
+        self.num_classes = num_classes
+        self.low_confidence = low_confidence
+        self.bins = bins
+        os.makedirs(output_dir, exist_ok=True)
+
+        self._indices = np.full((chunk_size, top_k), -1, dtype=np.int16)
+        self._confidences = np.zeros((chunk_size, top_k), dtype=np.float16)
+        self._top1 = np.zeros(chunk_size, dtype=np.float32)
+        self._buffered = 0
+        self._files = {
+            name: open(os.path.join(output_dir, name), mode)
+            for name, mode in ((INDICES_FILE, "wb"), (CONFIDENCES_FILE, "wb"), (IMAGES_FILE, "w"))
+        }
+
+        self.rows = 0
+        self.errors = 0
+        self.class_counts = np.zeros(num_classes, dtype=np.int64)
+        self.class_confidence_sum = np.zeros(num_classes, dtype=np.float64)
+        self.low_confidence_counts = np.zeros(num_classes, dtype=np.int64)
+        self.histogram = np.zeros(bins, dtype=np.int64)
+        self.class_histograms = np.zeros((num_classes, bins), dtype=np.int64)
+
+    def add(self, image, predictions):
+        """
+        Append one result.
+
+        Args:
+            image (str): Image path
+            predictions (list): (class_index, confidence) pairs, best first;
+                                None or empty for an image that failed
+        """
+        row = self._buffered
+        self._indices[row] = -1
+        self._confidences[row] = 0
+        self._top1[row] = 0
+        if predictions:
+            predictions = predictions[:self.top_k]
+            self._check_indices([idx for idx, _ in predictions])
+            self._indices[row, :len(predictions)] = [idx for idx, _ in predictions]
+            self._confidences[row, :len(predictions)] = [conf for _, conf in predictions]
+            self._top1[row] = predictions[0][1]
+        elif predictions is None:
+            self.errors += 1
+        self._files[IMAGES_FILE].write(image.replace("\n", " ") + "\n")
+
+        self._buffered += 1
+        self.rows += 1
+        if self._buffered == len(self._indices):
+            self.flush()
+
+    def add_batch(self, images, indices, confidences):
+        """
+        Append a batch of results from arrays (e.g. torch.topk output).
+
+        Args:
+            images (list): Image paths
+            indices (array-like): N x k class indices
+            confidences (array-like): N x k confidences
+        """
+        indices = np.asarray(indices)[:, :self.top_k]
+        confidences = np.asarray(confidences)[:, :self.top_k]
+        self._check_indices(indices)
+        k = indices.shape[1]
+        start = 0
+        while start < len(images):
+            row = self._buffered
+            count = min(len(images) - start, len(self._indices) - row)
+            self._indices[row:row + count] = -1
+            self._confidences[row:row + count] = 0
+            self._indices[row:row + count, :k] = indices[start:start + count]
+            self._confidences[row:row + count, :k] = confidences[start:start + count]
+            self._top1[row:row + count] = confidences[start:start + count, 0]
+            self._files[IMAGES_FILE].write(
+                "".join(image.replace("\n", " ") + "\n" for image in images[start:start + count])
+            )
+            self._buffered += count
+            self.rows += count
+            start += count
+            if self._buffered == len(self._indices):
+                self.flush()
+
+    def _check_indices(self, indices):
+        indices = np.asarray(indices)
+        if indices.size and indices.max() >= self.num_classes:
+            raise ValueError(f"Class index {int(indices.max())} out of range for "
+                             f"num_classes={self.num_classes}; the model has more classes "
+                             f"(set num_classes in config.yaml)")
+
+    def _aggregate(self, indices, top1):
+        """Fold buffered rows with a prediction into the aggregates."""
+        has_prediction = indices[:, 0] >= 0
+        classes = indices[has_prediction, 0].astype(np.int64)
+        confidences = top1[has_prediction]
+        bins = np.minimum((confidences * self.bins).astype(np.int64), self.bins - 1)
+
+        np.add.at(self.class_counts, classes, 1)
+        np.add.at(self.class_confidence_sum, classes, confidences)
+        np.add.at(self.histogram, bins, 1)
+        np.add.at(self.class_histograms, (classes, bins), 1)
+        np.add.at(self.low_confidence_counts, classes[confidences < self.low_confidence], 1)
+
+    def flush(self):
+        """Write buffered rows and update the aggregates."""
+        count = self._buffered
+        if count:
+            self._aggregate(self._indices[:count], self._top1[:count])
+            self._files[INDICES_FILE].write(self._indices[:count].tobytes())
+            self._files[CONFIDENCES_FILE].write(self._confidences[:count].tobytes())
+            self._buffered = 0
+        for f in self._files.values():
+            f.flush()
+
+    def summary(self, top_classes=10):
+        """
+        Aggregates over everything added so far.
+
+        Returns:
+            dict: images, errors, low_confidence (count and threshold),
+                  histogram (counts per confidence bin), top_classes
+                  (most frequent top-1 classes with mean confidence and
+                  low-confidence count) and per-class arrays
+        """
+        self.flush()
+        labels = load_class_labels()
+        order = np.argsort(-self.class_counts, kind="stable")[:top_classes]
+        return {
+            "images": self.rows,
+            "errors": self.errors,
+            "low_confidence_threshold": self.low_confidence,
+            "low_confidence": int(self.low_confidence_counts.sum()),
+            "histogram_bins": self.bins,
+            "histogram": self.histogram.tolist(),
+            "top_classes": [
+                {
+                    "class_index": int(idx),
+                    "class": labels.get(int(idx), f"Unknown (class {int(idx)})"),
+                    "count": int(self.class_counts[idx]),
+                    "mean_confidence": float(self.class_confidence_sum[idx] / self.class_counts[idx]),
+                    "low_confidence": int(self.low_confidence_counts[idx])
+                }
+                for idx in order if self.class_counts[idx]
+            ],
+            "class_counts": self.class_counts.tolist(),
+            "low_confidence_counts": self.low_confidence_counts.tolist(),
+            "class_histograms": self.class_histograms.tolist()
+        }
+
+    def close(self):
+        """Flush and write meta.json and summary.json."""
+        summary = self.summary()
+        for f in self._files.values():
+            f.close()
+        with open(os.path.join(self.output_dir, META_FILE), "w") as f:
+            json.dump({"rows": self.rows, "top_k": self.top_k, "num_classes": self.num_classes,
+                       "indices_dtype": "int16", "confidences_dtype": "float16"}, f, indent=2)
+        with open(os.path.join(self.output_dir, SUMMARY_FILE), "w") as f:
+            json.dump(summary, f)
+        return summary
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def format_summary(summary):
+    """Human readable lines for a summary() dict."""
+    images = summary["images"]
+    lines = [
+        f"Images: {images}  Errors: {summary['errors']}  "
+        f"Low confidence (< {summary['low_confidence_threshold']:.0%}): {summary['low_confidence']}",
+        "Top-1 confidence histogram:"
+    ]
+    bins = summary["histogram_bins"]
+    peak = max(summary["histogram"]) or 1
+    for i, count in enumerate(summary["histogram"]):
+        lines.append(f"  {i / bins:4.0%}-{(i + 1) / bins:4.0%} {count:10d} {'█' * round(30 * count / peak)}")
+    lines.append("Most frequent top-1 classes:")
+    for entry in summary["top_classes"]:
+        lines.append(f"  {entry['class'][:36]:36s} {entry['count']:10d}  "
+                     f"mean {entry['mean_confidence']:6.2%}  low {entry['low_confidence']}")
+    return lines
+
+
+class ResultStore:
+    """
+    Read access to results written by ResultSink (memory-mapped).
+
+    Args:
+        output_dir (str): Result directory
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        with open(os.path.join(output_dir, META_FILE), "r") as f:
+            meta = json.load(f)
+        self.rows = meta["rows"]
+        self.top_k = meta["top_k"]
+        shape = (self.rows, self.top_k)
+        if self.rows:
+            self.indices = np.memmap(os.path.join(output_dir, INDICES_FILE), dtype=np.int16,
+                                     mode="r", shape=shape)
+            self.confidences = np.memmap(os.path.join(output_dir, CONFIDENCES_FILE),
+                                         dtype=np.float16, mode="r", shape=shape)
+        else:
+            self.indices = np.zeros(shape, dtype=np.int16)
+            self.confidences = np.zeros(shape, dtype=np.float16)
+
+    def __len__(self):
+        return self.rows
+
+    def summary(self):
+        with open(os.path.join(self.output_dir, SUMMARY_FILE), "r") as f:
+            return json.load(f)
+
+    def iter_results(self):
+        """
+        Yield results row by row in the inference.py JSON layout.
+
+        Yields:
+            dict: image and ranked predictions
+        """
+        labels = load_class_labels()
+        with open(os.path.join(self.output_dir, IMAGES_FILE), "r") as f:
+            for row, line in enumerate(f):
+                yield {
+                    "image": line.rstrip("\n"),
+                    "predictions": [
+                        {"rank": rank, "class": labels.get(int(idx), f"Unknown (class {int(idx)})"),
+                         "class_index": int(idx), "confidence": float(conf)}
+                        for rank, (idx, conf) in enumerate(
+                            zip(self.indices[row], self.confidences[row]), 1)
+                        if idx >= 0
+                    ]
+                }
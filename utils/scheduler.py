@@ -0,0 +1,336 @@
+"""
+Process-wide inference scheduler for a shared model.
+
+Every Streamlit session runs its script in its own thread against the same
+cached model. Without coordination, simultaneous forward passes fight over
+the CPU's intra-op threads and everyone's latency spikes. The scheduler puts
+a bounded number of worker threads in front of the model:
+
+- at most `max_concurrent` forward passes run at once,
+- queued requests are served round-robin across sessions, so one session
+  uploading 200 images cannot starve another uploading one,
+- requests queued from different sessions are merged into one batch
+  (up to `max_batch_size` images), which raises throughput exactly when
+  the queue is long,
+- requests can be tagged with a session generation (see
+  SessionGenerations); once a newer generation of the session starts, the
+  older requests are dropped instead of being run and new ones are refused,
+  so a superseded Streamlit run stops at its next batch,
+- with a DegradationController (utils/degradation.py) the batch size,
+  batching wait and precision follow the controller's current mode, and
+  every request's end-to-end latency is fed back to it.
+"""
+import contextlib
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import Future
+
+import numpy as np
+import torch
+
+
+ScheduledResult = namedtuple("ScheduledResult", ["output", "queue_wait_s", "batch_size", "mode"])
+
+
+class SchedulerBusy(Exception):
+    """Raised when the queue is full and a request is rejected."""
+
+
+class Superseded(Exception):
+    """Raised for requests of a session generation that has been replaced."""
+
+
+class SessionGenerations:
+    """
+    Per-session run counters shared by every scheduler in the process.
+
+    Each Streamlit script run of a session calls begin(); requests tagged
+    with an older generation are stale. Streamlit does not report closed
+    sessions, so only the `max_sessions` most recently active sessions are
+    tracked; requests of a forgotten session are never treated as stale.
+
+    Args:
+        max_sessions (int): Sessions tracked before the least recently
+                            active one is forgotten
+    """
+
+    def __init__(self, max_sessions=4096):
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._current = OrderedDict()
+
+    def begin(self, session_id):
+        """Start a new generation for the session and return it."""
+        with self._lock:
+            generation = self._current.pop(session_id, 0) + 1
+            self._current[session_id] = generation
+            while len(self._current) > self.max_sessions:
+                self._current.popitem(last=False)
+            return generation
+
+    def is_current(self, session_id, generation):
+        with self._lock:
+            return generation is None or self._current.get(session_id, generation) == generation
+
+    def check(self, session_id, generation):
+        """Raise Superseded if a newer generation of the session has started."""
+        if not self.is_current(session_id, generation):
+            raise Superseded(f"Run {generation} of session {session_id} was superseded")
+
+    def end(self, session_id):
+        """Forget a closed session."""
+        with self._lock:
+            self._current.pop(session_id, None)
+
+
+session_generations = SessionGenerations()
+
+
+class _Request:
+    __slots__ = ("session_id", "generation", "tensor", "future", "enqueued_at")
+
+    def __init__(self, session_id, tensor, generation=None):
+        self.session_id = session_id
+        self.generation = generation
+        self.tensor = tensor
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class InferenceScheduler:
+    """
+    Bounded, fair scheduler in front of a model.
+
+    Args:
+        model (torch.nn.Module): Model in evaluation mode
+        max_concurrent (int): Maximum number of forward passes in flight
+        max_batch_size (int): Maximum images merged into one forward pass
+        max_queue_depth (int): Requests beyond this many queued are rejected
+        stats_window (int): Number of recent requests kept for wait statistics
+        generations (SessionGenerations, optional): Generation registry
+                                                    (default: process-wide)
+        controller (DegradationController, optional): Adapts batch size,
+                                                      batching wait and
+                                                      precision to the load
+    """
+
+    def __init__(self, model, max_concurrent=1, max_batch_size=8, max_queue_depth=256,
+                 stats_window=500, generations=None, controller=None):
+        self.model = model
+        self.controller = controller
+        self.generations = generations if generations is not None else session_generations
+        self.max_concurrent = max_concurrent
+        self.max_batch_size = max_batch_size
+        self.max_queue_depth = max_queue_depth
+
+        self._cond = threading.Condition()
+        self._queues = OrderedDict()
+        self._depth = 0
+        self._active = 0
+        self._closed = False
+        self._served = 0
+        self._superseded = 0
+        self._batches = 0
+        self._waits = deque(maxlen=stats_window)
+        self._batch_sizes = deque(maxlen=stats_window)
+
+        self._workers = [
+            threading.Thread(target=self._worker, name=f"inference-worker-{i}", daemon=True)
+            for i in range(max_concurrent)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, tensor, session_id=None, generation=None):
+        """
+        Queue a preprocessed batch (N x 3 x H x W) for inference.
+
+        Args:
+            tensor (torch.Tensor): Input batch
+            session_id: Session the request belongs to (for fair queueing)
+            generation (int, optional): Session generation; the request is
+                                        dropped if a newer one starts first
+
+        Returns:
+            concurrent.futures.Future: Resolves to a ScheduledResult, or
+                                       fails with Superseded
+
+        Raises:
+            SchedulerBusy: If the queue is full
+            Superseded: If the generation is already stale
+        """
+        self.generations.check(session_id, generation)
+        if self.controller is not None:
+            self.controller.update(self._depth)
+        request = _Request(session_id, tensor, generation)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Scheduler is closed")
+            if self._depth >= self.max_queue_depth:
+                raise SchedulerBusy(
+                    f"Inference queue is full ({self._depth} requests waiting)"
+                )
+            self._queues.setdefault(session_id, deque()).append(request)
+            self._depth += 1
+            self._cond.notify()
+        return request.future
+
+    def run(self, tensor, session_id=None, timeout=None, generation=None):
+        """Submit and wait for the result (see submit)."""
+        return self.submit(tensor, session_id, generation).result(timeout=timeout)
+
+    def _drop_superseded(self, session_id, queue):
+        """Fail queued requests of stale generations at the head of a session queue."""
+        while queue and not self.generations.is_current(session_id, queue[0].generation):
+            request = queue.popleft()
+            self._depth -= 1
+            self._superseded += 1
+            request.future.set_exception(
+                Superseded(f"Run {request.generation} of session {session_id} was superseded")
+            )
+        if not queue:
+            del self._queues[session_id]
+
+    def current_mode(self):
+        """The controller's mode, or None without a controller."""
+        return self.controller.mode if self.controller is not None else None
+
+    def _batch_limit(self):
+        mode = self.current_mode()
+        return mode.max_batch_size if mode is not None else self.max_batch_size
+
+    def _wait_for_batch(self):
+        """In modes with a batching wait, give the queue a moment to fill a batch."""
+        mode = self.current_mode()
+        if mode is None or not mode.batch_wait_ms:
+            return
+        deadline = time.perf_counter() + mode.batch_wait_ms / 1000
+        while self._depth < mode.max_batch_size and not self._closed:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            self._cond.wait(remaining)
+
+    def _next_batch(self):
+        """Take up to the batch limit of images, one request per session per round."""
+        batch, images = [], 0
+        limit = self._batch_limit()
+        while self._queues and images < limit:
+            session_id, queue = next(iter(self._queues.items()))
+            self._drop_superseded(session_id, queue)
+            if not queue:
+                continue
+            request = queue[0]
+            size = request.tensor.shape[0]
+            if batch and images + size > limit:
+                break
+            if batch and request.tensor.shape[1:] != batch[0].tensor.shape[1:]:
+                # Different input resolution (e.g. queued before a mode change)
+                break
+            queue.popleft()
+            self._depth -= 1
+            # Rotate the session to the back of the line
+            del self._queues[session_id]
+            if queue:
+                self._queues[session_id] = queue
+            batch.append(request)
+            images += size
+        return batch
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._depth and not self._closed:
+                    self._cond.wait()
+                if self._closed and not self._depth:
+                    return
+                self._wait_for_batch()
+                batch = self._next_batch()
+                if not batch:
+                    continue
+                self._active += 1
+
+            started = time.perf_counter()
+            mode = self.current_mode()
+            try:
+                inputs = batch[0].tensor if len(batch) == 1 else torch.cat(
+                    [request.tensor for request in batch]
+                )
+                with torch.no_grad(), self._autocast(mode, inputs.device):
+                    outputs = self.model(inputs).float()
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                outputs = None
+
+            batch_size = sum(request.tensor.shape[0] for request in batch)
+            finished = time.perf_counter()
+            if self.controller is not None:
+                for request in batch:
+                    self.controller.record((finished - request.enqueued_at) * 1000)
+                self.controller.update(self._depth)
+            with self._cond:
+                self._active -= 1
+                self._batches += 1
+                self._batch_sizes.append(batch_size)
+                for request in batch:
+                    self._waits.append(started - request.enqueued_at)
+                self._served += len(batch)
+
+            if outputs is None:
+                continue
+            offset = 0
+            for request in batch:
+                size = request.tensor.shape[0]
+                request.future.set_result(ScheduledResult(
+                    output=outputs[offset:offset + size],
+                    queue_wait_s=started - request.enqueued_at,
+                    batch_size=batch_size,
+                    mode=mode.name if mode is not None else None
+                ))
+                offset += size
+
+    @staticmethod
+    def _autocast(mode, device):
+        if mode is None or mode.precision == "fp32":
+            return contextlib.nullcontext()
+        dtype = torch.bfloat16 if mode.precision == "bf16" else torch.float16
+        return torch.autocast(device.type, dtype=dtype)
+
+    def stats(self):
+        """
+        Snapshot of queue and wait statistics.
+
+        Returns:
+            dict: queue_depth, active, sessions_waiting, served, superseded,
+                  batches, mean_batch_size, wait_p50_ms, wait_p95_ms, and
+                  "degradation" (controller stats) when there is a controller
+        """
+        degradation = None
+        if self.controller is not None:
+            self.controller.update(self._depth)
+            degradation = self.controller.stats()
+        with self._cond:
+            waits = np.asarray(self._waits) * 1000
+            batch_sizes = list(self._batch_sizes)
+            return {
+                **({"degradation": degradation} if degradation is not None else {}),
+                "queue_depth": self._depth,
+                "active": self._active,
+                "sessions_waiting": len(self._queues),
+                "served": self._served,
+                "superseded": self._superseded,
+                "batches": self._batches,
+                "mean_batch_size": float(np.mean(batch_sizes)) if batch_sizes else 0.0,
+                "wait_p50_ms": float(np.percentile(waits, 50)) if len(waits) else 0.0,
+                "wait_p95_ms": float(np.percentile(waits, 95)) if len(waits) else 0.0
+            }
+
+    def close(self):
+        """Finish queued work and stop the workers."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for worker in self._workers:
+            worker.join()
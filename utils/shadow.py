@@ -0,0 +1,221 @@
+"""
+Shadow comparison of a candidate checkpoint against the current one.
+
+Each batch is decoded and preprocessed once and run through both models;
+ShadowComparison streams the agreement statistics: top-1 agreement rate,
+the list of top-1 flips and per-class disagreement (keyed by the current
+model's class).
+"""
+import os
+
+import numpy as np
+import torch
+from PIL import Image
+
+from utils.image_processor import decode_uint8, load_class_labels, normalize_uint8
+
+
+class ShadowComparison:
+    """
+    Running agreement statistics between a baseline and a candidate model.
+
+    Args:
+        num_classes (int, optional): Number of model classes (default: the
+                                     logits' size in the first batch)
+        max_flips (int): Flips kept for reporting (the most confident
+                         disagreements are kept)
+    """
+
+    def __init__(self, num_classes=None, max_flips=1000):
+        self.num_classes = None
+        self.max_flips = max_flips
+        self.images = 0
+        self.agreements = 0
+        self.class_totals = self.class_disagreements = None
+        if num_classes is not None:
+            self._allocate(num_classes)
+        self.flips = []
+        self.confidence_delta_sum = 0.0
+        self.labels = load_class_labels()
+
+    def _allocate(self, num_classes):
+        self.num_classes = num_classes
+        self.class_totals = np.zeros(num_classes, dtype=np.int64)
+        self.class_disagreements = np.zeros(num_classes, dtype=np.int64)
+
+    def label(self, idx):
+        return self.labels.get(int(idx), f"Unknown (class {int(idx)})")
+
+    def update(self, images, baseline_logits, candidate_logits):
+        """
+        Add one batch of logits from both models.
+
+        Returns:
+            list: Per-image dicts with image, baseline and candidate top-1
+                  (class_index, class, confidence) and agree
+
+        Raises:
+            ValueError: If the models' class counts differ from each other
+                        or from num_classes
+        """
+        if self.num_classes is None:
+            self._allocate(baseline_logits.shape[1])
+        if baseline_logits.shape[1] != self.num_classes or \
+                candidate_logits.shape[1] != self.num_classes:
+            raise ValueError(f"Cannot compare models with {baseline_logits.shape[1]} and "
+                             f"{candidate_logits.shape[1]} classes (expected {self.num_classes})")
+        baseline = torch.softmax(baseline_logits.float(), dim=1)
+        candidate = torch.softmax(candidate_logits.float(), dim=1)
+        baseline_conf, baseline_idx = baseline.max(dim=1)
+        candidate_conf, candidate_idx = candidate.max(dim=1)
+        agree = (baseline_idx == candidate_idx).cpu().numpy()
+        baseline_idx = baseline_idx.cpu().numpy()
+        candidate_idx = candidate_idx.cpu().numpy()
+        baseline_conf = baseline_conf.cpu().numpy()
+        candidate_conf = candidate_conf.cpu().numpy()
+        # Candidate probability for the baseline's class: how far it moved away
+        kept_conf = candidate.gather(1, torch.as_tensor(baseline_idx).view(-1, 1).to(candidate.device))
+        self.confidence_delta_sum += float((kept_conf.view(-1).cpu().numpy() - baseline_conf).sum())
+
+        self.images += len(agree)
+        self.agreements += int(agree.sum())
+        np.add.at(self.class_totals, baseline_idx, 1)
+        np.add.at(self.class_disagreements, baseline_idx[~agree], 1)
+
+        rows = []
+        for i, image in enumerate(images):
+            row = {
+                "image": image,
+                "baseline": {"class_index": int(baseline_idx[i]), "class": self.label(baseline_idx[i]),
+                             "confidence": float(baseline_conf[i])},
+                "candidate": {"class_index": int(candidate_idx[i]), "class": self.label(candidate_idx[i]),
+                              "confidence": float(candidate_conf[i])},
+                "agree": bool(agree[i])
+            }
+            rows.append(row)
+            if not agree[i]:
+                self._add_flip(row)
+        return rows
+
+    def _add_flip(self, row):
+        self.flips.append(row)
+        if len(self.flips) > 2 * self.max_flips:
+            self._trim_flips()
+
+    def _trim_flips(self):
+        self.flips.sort(key=lambda row: -max(row["baseline"]["confidence"],
+                                             row["candidate"]["confidence"]))
+        del self.flips[self.max_flips:]
+
+    @property
+    def agreement_rate(self):
+        return self.agreements / self.images if self.images else 1.0
+
+    def summary(self, top_classes=10, top_flips=10):
+        """
+        Statistics over everything compared so far.
+
+        Args:
+            top_classes (int): Classes to list in disagreement_by_class
+            top_flips (int): Flipped images to list in top_flips
+
+        Returns:
+            dict: images, agreement_rate, flips (count), mean_confidence_shift
+                  (candidate minus baseline probability of the baseline's
+                  class), top_flips and classes with the most disagreements
+        """
+        self._trim_flips()
+        disagreements = self.class_disagreements if self.class_disagreements is not None \
+            else np.zeros(0, dtype=np.int64)
+        order = np.argsort(-disagreements, kind="stable")[:top_classes]
+        return {
+            "images": self.images,
+            "agreement_rate": self.agreement_rate,
+            "flips": self.images - self.agreements,
+            "mean_confidence_shift": self.confidence_delta_sum / self.images if self.images else 0.0,
+            "top_flips": self.flips[:top_flips],
+            "disagreement_by_class": [
+                {
+                    "class_index": int(idx),
+                    "class": self.label(idx),
+                    "images": int(self.class_totals[idx]),
+                    "disagreements": int(self.class_disagreements[idx]),
+                    "disagreement_rate": float(self.class_disagreements[idx] / self.class_totals[idx])
+                }
+                for idx in order if self.class_disagreements[idx]
+            ]
+        }
+
+
+def compare_images(baseline_model, candidate_model, images, comparison, batch_size=32,
+                   device=None):
+    """
+    Classify images with both models, decoding and preprocessing each once.
+
+    Args:
+        baseline_model: Current model, or a callable mapping a batch to logits
+        candidate_model: Model being evaluated (same)
+        images (iterable): (name, path or PIL.Image) pairs
+        comparison (ShadowComparison): Statistics to update
+        batch_size (int): Images per forward pass
+        device: Device for the batches (default: the baseline model's, or CPU
+                for callables)
+
+    Yields:
+        dict: Per-image rows from ShadowComparison.update, or
+              {"image": name, "error": message} for images that fail to load
+
+    Raises:
+        ValueError: If the models' class counts differ
+    """
+    if device is None:
+        device = next(baseline_model.parameters()).device \
+            if isinstance(baseline_model, torch.nn.Module) else torch.device("cpu")
+    names, arrays = [], []
+
+    def run_batch():
+        batch = normalize_uint8(torch.from_numpy(np.stack(arrays)), device=device)
+        with torch.no_grad():
+            baseline_logits = baseline_model(batch)
+            candidate_logits = candidate_model(batch)
+        rows = comparison.update(names[:], baseline_logits, candidate_logits)
+        names.clear()
+        arrays.clear()
+        return rows
+
+    for name, source in images:
+        try:
+            if isinstance(source, Image.Image):
+                arrays.append(decode_uint8(source))
+            else:
+                with Image.open(source) as image:
+                    arrays.append(decode_uint8(image))
+        except Exception as e:
+            yield {"image": name, "error": str(e)}
+            continue
+        names.append(name)
+        if len(names) == batch_size:
+            yield from run_batch()
+    if names:
+        yield from run_batch()
+
+
+def format_comparison(summary):
+    """Human readable lines for a ShadowComparison.summary() dict."""
+    lines = [
+        f"Images: {summary['images']}  Agreement: {summary['agreement_rate']:.2%}  "
+        f"Top-1 flips: {summary['flips']}",
+        f"Mean change in the current top-1 class probability: {summary['mean_confidence_shift']:+.2%}"
+    ]
+    if summary["disagreement_by_class"]:
+        lines.append("Classes with the most flips (current model's top-1):")
+        for entry in summary["disagreement_by_class"]:
+            lines.append(f"  {entry['class'][:36]:36s} {entry['disagreements']:6d} of {entry['images']:6d}"
+                         f"  ({entry['disagreement_rate']:6.2%})")
+    if summary["top_flips"]:
+        lines.append("Most confident flips:")
+        for row in summary["top_flips"]:
+            lines.append(f"  {os.path.basename(row['image'])[:30]:30s} "
+                         f"{row['baseline']['class'][:24]} ({row['baseline']['confidence']:.0%}) -> "
+                         f"{row['candidate']['class'][:24]} ({row['candidate']['confidence']:.0%})")
+    return lines
@@ -0,0 +1,180 @@
+"""
+Memory-mapped cache of pre-decoded images.
+
+An image set is decoded, resized and center-cropped once into a uint8
+N x 3 x 224 x 224 array (`tensors.npy`) with an index file (`index.json`)
+recording each source path, its size and mtime. Later runs map the array
+instead of decoding JPEGs: batches are zero-copy views of the file and only
+the normalization to float happens per run, so evaluating another checkpoint
+on the same images is bound by the model rather than the decoder.
+"""
+import json
+import multiprocessing
+import os
+
+import numpy as np
+import torch
+from PIL import Image
+
+from utils.image_processor import CROP_SIZE, RESIZE_SIZE, decode_uint8, normalize_uint8
+
+
+INDEX_FILE = "index.json"
+TENSORS_FILE = "tensors.npy"
+CACHE_VERSION = 1
+
+
+def _source_entry(path):
+    stat = os.stat(path)
+    return {"path": path, "size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def _decode_rows(task):
+    """Decode a contiguous range of images into the shared array (worker process)."""
+    tensors_path, start, paths = task
+    array = np.load(tensors_path, mmap_mode="r+")
+    failed = []
+    for offset, path in enumerate(paths):
+        try:
+            with Image.open(path) as image:
+                array[start + offset] = decode_uint8(image)
+        except Exception as e:
+            failed.append((start + offset, str(e)))
+    array.flush()
+    return failed
+
+
+def _is_current(cache_dir, paths):
+    """Whether an existing cache holds exactly these unchanged files at the current crop."""
+    try:
+        with open(os.path.join(cache_dir, INDEX_FILE), "r") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if index.get("version") != CACHE_VERSION or len(index["items"]) != len(paths):
+        return False
+    # Rows were cropped with the config of the run that built them
+    if (index.get("resize"), index.get("crop")) != (RESIZE_SIZE, CROP_SIZE):
+        return False
+    for item, path in zip(index["items"], paths):
+        if item["path"] != path:
+            return False
+        try:
+            current = _source_entry(path)
+        except OSError:
+            return False
+        if (item["size"], item["mtime"]) != (current["size"], current["mtime"]):
+            return False
+    return True
+
+
+def build_tensor_cache(paths, cache_dir, workers=None, force=False, chunk_size=256):
+    """
+    Decode images into a memory-mapped cache (skipped if it is up to date).
+
+    Args:
+        paths (list): Image paths; row i of the cache holds paths[i]
+        cache_dir (str): Output directory
+        workers (int, optional): Decode processes (default: CPU count)
+        force (bool): Rebuild even if the cache is current
+        chunk_size (int): Images per decode task
+
+    Returns:
+        TensorCache: The opened cache
+    """
+    if not force and _is_current(cache_dir, paths):
+        print(f"Tensor cache {cache_dir} is up to date ({len(paths)} images)")
+        return TensorCache(cache_dir)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    index_path = os.path.join(cache_dir, INDEX_FILE)
+    if os.path.exists(index_path):
+        # Invalidate first so an interrupted rebuild is never mistaken for a cache
+        os.remove(index_path)
+
+    tensors_path = os.path.join(cache_dir, TENSORS_FILE)
+    array = np.lib.format.open_memmap(tensors_path, mode="w+", dtype=np.uint8,
+                                      shape=(len(paths), 3, CROP_SIZE, CROP_SIZE))
+    del array
+
+    items = []
+    for path in paths:
+        try:
+            items.append({**_source_entry(path), "ok": True})
+        except OSError:
+            items.append({"path": path, "size": None, "mtime": None, "ok": False})
+
+    tasks = [(tensors_path, start, paths[start:start + chunk_size])
+             for start in range(0, len(paths), chunk_size)]
+    with multiprocessing.Pool(workers or os.cpu_count()) as pool:
+        for failed in pool.imap_unordered(_decode_rows, tasks):
+            for row, error in failed:
+                items[row]["ok"] = False
+                items[row]["error"] = error
+
+    with open(index_path + ".part", "w") as f:
+        json.dump({
+            "version": CACHE_VERSION,
+            "shape": [len(paths), 3, CROP_SIZE, CROP_SIZE],
+            "resize": RESIZE_SIZE,
+            "crop": CROP_SIZE,
+            "items": items
+        }, f)
+    os.replace(index_path + ".part", index_path)
+    return TensorCache(cache_dir)
+
+
+class TensorCache:
+    """
+    Read access to a cache built by build_tensor_cache().
+
+    Args:
+        cache_dir (str): Cache directory
+    """
+
+    def __init__(self, cache_dir):
+        with open(os.path.join(cache_dir, INDEX_FILE), "r") as f:
+            index = json.load(f)
+        self.cache_dir = cache_dir
+        self.items = index["items"]
+        self.paths = [item["path"] for item in self.items]
+        self.ok = np.array([item["ok"] for item in self.items], dtype=bool)
+        # Copy-on-write mapping: torch can wrap it without copying (a
+        # read-only mapping would be copied) and the file is never modified
+        self.array = np.load(os.path.join(cache_dir, TENSORS_FILE), mmap_mode="c")
+        self._rows = {path: row for row, path in enumerate(self.paths)}
+
+    def __len__(self):
+        return len(self.paths)
+
+    def row(self, path):
+        """Row of a source path, or None if it is not cached (or failed to decode)."""
+        row = self._rows.get(path)
+        return row if row is not None and self.ok[row] else None
+
+    def uint8_batch(self, rows):
+        """
+        uint8 N x 3 x 224 x 224 tensor for a range or list of rows.
+
+        Consecutive rows (the usual case) are a zero-copy view of the mapped
+        file; other row lists are gathered into a new tensor.
+        """
+        rows = list(rows)
+        if rows and rows == list(range(rows[0], rows[-1] + 1)):
+            return torch.from_numpy(self.array[rows[0]:rows[-1] + 1])
+        return torch.from_numpy(self.array[np.asarray(rows, dtype=np.int64)])
+
+    def batch(self, rows, device=None):
+        """Normalized float batch for rows (see uint8_batch)."""
+        return normalize_uint8(self.uint8_batch(rows), device=device)
+
+    def iter_batches(self, batch_size=32, device=None):
+        """
+        Yield normalized batches over the whole cache in row order.
+
+        Yields:
+            tuple: (range of rows, float32 batch)
+        """
+        for start in range(0, len(self), batch_size):
+            rows = range(start, min(start + batch_size, len(self)))
+            yield rows, self.batch(rows, device=device)
@@ -0,0 +1,125 @@
+"""
+Single-decode path from an uploaded file to the model input and its preview.
+
+Previously every upload was decoded more than once (for inference, for
+st.image and for the grid preview) and copied at full size along the way:
+getvalue() copied the file, .convert('RGB') copied the decoded image even
+when it already was RGB, and Resize, CenterCrop, ToTensor and Normalize each
+allocated a new image or tensor.
+
+Here an upload is decoded once, straight from the UploadedFile's buffer, and
+only converted when it is not RGB already. The center crop is resampled in
+one PIL call, copied into a slot of a preallocated uint8 batch buffer and
+normalized in place into the matching slot of a preallocated float32 buffer,
+so the model input is a view of memory that is reused for every upload.
+Previews for display are downscaled from the same decoded image.
+"""
+import contextlib
+import threading
+
+import numpy as np
+import torch
+from PIL import Image
+
+from utils.image_processor import CROP_SIZE, IMAGENET_MEAN, IMAGENET_STD, resize_crop
+
+
+def open_upload(uploaded_file):
+    """
+    Open an upload without copying its bytes.
+
+    Args:
+        uploaded_file: Streamlit UploadedFile (or any seekable binary file)
+
+    Returns:
+        PIL.Image: Lazily decoded image
+    """
+    uploaded_file.seek(0)
+    return Image.open(uploaded_file)
+
+
+def as_rgb(image):
+    """Decode an image as RGB, converting (and copying) only if it is in another mode."""
+    image.load()
+    return image if image.mode == "RGB" else image.convert("RGB")
+
+
+def preview_image(image, max_size):
+    """
+    Downscaled copy of a decoded image for display.
+
+    Args:
+        image (PIL.Image): Decoded RGB image
+        max_size (int): Longest side of the preview
+
+    Returns:
+        PIL.Image: The preview (the image itself if it is already small enough)
+    """
+    width, height = image.size
+    scale = max_size / max(width, height)
+    if scale >= 1:
+        return image
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return image.resize(size, Image.Resampling.BICUBIC, reducing_gap=2.0)
+
+
+class UploadBuffer:
+    """
+    Preallocated model-input batch that uploads are decoded into.
+
+    Each in-flight upload reserves one slot until its forward pass is done
+    (the scheduler may hold the tensor while it is queued). When more
+    uploads are in flight than there are slots, a one-off buffer is used.
+
+    Args:
+        slots (int): Number of images that can be in flight at once
+        crop_size (int, optional): Input resolution (default CROP_SIZE)
+        device (torch.device, optional): Device of the normalized inputs
+                                         (default: CUDA if available)
+    """
+
+    def __init__(self, slots=8, crop_size=None, device=None):
+        self.crop_size = crop_size or CROP_SIZE
+        self.device = device or torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.pixels, self.inputs = self._allocate(slots)
+        self.mean = torch.tensor(IMAGENET_MEAN, device=self.device).view(1, 3, 1, 1)
+        self.std = torch.tensor(IMAGENET_STD, device=self.device).view(1, 3, 1, 1)
+        self.overflows = 0
+        self._free = list(range(slots))
+        self._lock = threading.Lock()
+
+    def _allocate(self, slots):
+        # Pixels are kept H x W x C, PIL's layout, so a crop is copied in without reordering
+        pixels = torch.empty((slots, self.crop_size, self.crop_size, 3), dtype=torch.uint8)
+        inputs = torch.empty((slots, 3, self.crop_size, self.crop_size), dtype=torch.float32,
+                             device=self.device)
+        return pixels, inputs
+
+    @contextlib.contextmanager
+    def reserve(self):
+        """
+        Reserve a slot for one image.
+
+        Yields:
+            callable: fill(image) -> 1 x 3 x crop x crop normalized input,
+                      valid until the context exits
+        """
+        with self._lock:
+            index = self._free.pop() if self._free else None
+        if index is None:
+            self.overflows += 1
+            pixels, inputs = self._allocate(1)
+            yield lambda image: self._fill(image, pixels[0], inputs[0:1])
+            return
+        try:
+            yield lambda image: self._fill(image, self.pixels[index], self.inputs[index:index + 1])
+        finally:
+            with self._lock:
+                self._free.append(index)
+
+    def _fill(self, image, pixels, inputs):
+        # numpy() is a buffer-protocol view of the slot: the crop is written in place
+        np.copyto(pixels.numpy(), np.asarray(resize_crop(image, self.crop_size)))
+        # Same arithmetic as ToTensor + Normalize, without new tensors
+        inputs[0].copy_(pixels.permute(2, 0, 1))
+        return inputs.div_(255).sub_(self.mean).div_(self.std)
@@ -0,0 +1,206 @@
+"""
+SQLite work queue for sharded batch jobs.
+
+A job is an ordered list of inputs split into fixed-size shards. Workers in
+any number of processes claim one shard at a time with a lease; a claimed
+shard whose worker stops heartbeating (or whose process is gone, for workers
+on this host) is handed out again, so a crashed or restarted job resumes with
+the shards that are not done yet. The database can live on a shared
+filesystem for workers on several hosts, as long as it supports file locks.
+"""
+import contextlib
+import json
+import os
+import socket
+import sqlite3
+import time
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS items (idx INTEGER PRIMARY KEY, path TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS shards (
+    id INTEGER PRIMARY KEY,
+    start_idx INTEGER NOT NULL,
+    end_idx INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    heartbeat REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+"""
+
+PENDING = "pending"
+CLAIMED = "claimed"
+DONE = "done"
+FAILED = "failed"
+
+
+def default_worker_id():
+    """host:pid, which lets workers on the same host detect dead peers."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _worker_alive(worker):
+    """False only if the worker ran on this host and its process is gone."""
+    host, _, pid = (worker or "").rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class ShardQueue:
+    """
+    Shard bookkeeping for one job.
+
+    Args:
+        db_path (str): SQLite database file (created by create())
+        lease_s (float): A claimed shard without a heartbeat for this long is
+                         handed to another worker
+        max_attempts (int): Claims after which a shard is marked failed
+    """
+
+    def __init__(self, db_path, lease_s=300.0, max_attempts=3):
+        self.db_path = db_path
+        self.lease_s = lease_s
+        self.max_attempts = max_attempts
+        self.created = False
+        # Default rollback journal: WAL needs shared memory, which rules out
+        # workers on other hosts
+        self.conn = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @classmethod
+    def create(cls, db_path, paths, shard_size, metadata=None, **kwargs):
+        """
+        Create the queue for a job, or open it unchanged if it already exists.
+
+        Args:
+            db_path (str): SQLite database file
+            paths (list): Inputs in their final output order
+            shard_size (int): Inputs per shard
+            metadata (dict, optional): Job settings stored with the queue
+
+        Returns:
+            ShardQueue: The queue; `created` is False when resuming
+        """
+        queue = cls(db_path, **kwargs)
+        with queue._transaction():
+            if queue.conn.execute("SELECT COUNT(*) FROM shards").fetchone()[0]:
+                return queue
+            queue.conn.executemany("INSERT INTO items (idx, path) VALUES (?, ?)",
+                                   enumerate(paths))
+            queue.conn.executemany(
+                "INSERT INTO shards (id, start_idx, end_idx) VALUES (?, ?, ?)",
+                [(shard_id, start, min(start + shard_size, len(paths)))
+                 for shard_id, start in enumerate(range(0, len(paths), shard_size))]
+            )
+            queue.conn.execute("INSERT INTO meta (key, value) VALUES ('job', ?)",
+                               (json.dumps(metadata or {}),))
+            queue.created = True
+        return queue
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """Write transaction that takes the database lock up front."""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def metadata(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'job'").fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def claim(self, worker):
+        """
+        Claim the lowest pending (or abandoned) shard.
+
+        Returns:
+            tuple: (shard_id, [(idx, path), ...]) or None when nothing is left to claim
+        """
+        now = time.time()
+        with self._transaction():
+            rows = self.conn.execute(
+                "SELECT id, status, worker, heartbeat, attempts FROM shards "
+                "WHERE status IN (?, ?) ORDER BY id", (PENDING, CLAIMED)
+            ).fetchall()
+            for shard_id, status, owner, heartbeat, attempts in rows:
+                if status == CLAIMED and (now - heartbeat < self.lease_s and _worker_alive(owner)):
+                    continue
+                if attempts >= self.max_attempts:
+                    self.conn.execute(
+                        "UPDATE shards SET status = ?, error = ? WHERE id = ?",
+                        (FAILED, f"abandoned after {attempts} attempts", shard_id)
+                    )
+                    continue
+                self.conn.execute(
+                    "UPDATE shards SET status = ?, worker = ?, heartbeat = ?, "
+                    "attempts = attempts + 1 WHERE id = ?",
+                    (CLAIMED, worker, now, shard_id)
+                )
+                items = self.conn.execute(
+                    "SELECT idx, path FROM items WHERE idx >= "
+                    "(SELECT start_idx FROM shards WHERE id = ?) AND idx < "
+                    "(SELECT end_idx FROM shards WHERE id = ?) ORDER BY idx",
+                    (shard_id, shard_id)
+                ).fetchall()
+                return shard_id, items
+        return None
+
+    def heartbeat(self, shard_id, worker):
+        """Extend the lease; returns False if the shard was handed to someone else."""
+        cursor = self.conn.execute(
+            "UPDATE shards SET heartbeat = ? WHERE id = ? AND worker = ? AND status = ?",
+            (time.time(), shard_id, worker, CLAIMED)
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, shard_id, worker):
+        """Mark a shard done (its output must already be in place)."""
+        cursor = self.conn.execute(
+            "UPDATE shards SET status = ?, heartbeat = ?, error = NULL "
+            "WHERE id = ? AND worker = ? AND status = ?",
+            (DONE, time.time(), shard_id, worker, CLAIMED)
+        )
+        return cursor.rowcount == 1
+
+    def release(self, shard_id, worker, error):
+        """Give a shard back after a failure so it can be retried."""
+        self.conn.execute(
+            "UPDATE shards SET status = ?, worker = NULL, error = ? "
+            "WHERE id = ? AND worker = ? AND status = ?",
+            (PENDING, error, shard_id, worker, CLAIMED)
+        )
+
+    def status(self):
+        """Shard counts by status plus the total number of shards and items."""
+        counts = dict(self.conn.execute("SELECT status, COUNT(*) FROM shards GROUP BY status"))
+        return {
+            "shards": sum(counts.values()),
+            "items": self.conn.execute("SELECT COUNT(*) FROM items").fetchone()[0],
+            **{state: counts.get(state, 0) for state in (PENDING, CLAIMED, DONE, FAILED)}
+        }
+
+    def shards(self):
+        """(shard_id, status, error) for every shard, in order."""
+        return self.conn.execute("SELECT id, status, error FROM shards ORDER BY id").fetchall()